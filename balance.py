@@ -0,0 +1,240 @@
+'''
+           BALANCE.PY
+=====================================
+Build-balance reports, for tuning equipment costs & the skill list.  Streams builds (every legal build, or a uniform random sample), fights each one against a gauntlet of random opponents, and aggregates win rate, fight length & crowd favor per item, per skill & per attribute level.
+
+Everything streams: builds are read, fought & reported a chunk at a time, and the per-feature statistics are running (Welford/Chan) means & variances, so memory stays flat however many builds go through.  Per-build results can be written as they're produced, as CSV or JSON lines.
+
+    python balance.py                              #every legal build, report to stdout as CSV
+    python balance.py --sample 100000 --format json --out report.jsonl --builds-out builds.jsonl
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] ONLINE STATISTICS
+    [2] OUTPUT
+    [3] PIPELINE
+    [4] MAIN
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import argparse
+import csv
+import json
+import sys
+from itertools import islice
+
+import numpy as np
+
+import builds as bd
+import combat
+import stats as st
+
+CHUNK = 4096        #builds encoded & fought at a time
+GAUNTLET = 256      #opponents in the gauntlet
+GAMES = 16          #duels per build
+METRICS = ('win_rate', 'rounds', 'favor')
+
+
+###############################################################################
+#[1] ONLINE STATISTICS
+
+class RunningStats:
+    '''
+    Running count, mean & variance of several metrics for several groups (features), updated a chunk at a time in constant memory.  Chunks are combined with Chan et al.'s parallel form of Welford's algorithm, which stays accurate over millions of updates.
+        count: (groups,)
+        mean, m2: (groups, metrics); m2 is the sum of squared deviations from the mean
+    '''
+    def __init__(self, groups, metrics):
+        self.count = np.zeros(groups)
+        self.mean = np.zeros((groups, metrics))
+        self.m2 = np.zeros((groups, metrics))
+
+    def update(self, members, values):
+        '''
+        members: (n, groups) bool, which groups each row counts towards
+        values: (n, metrics) float
+        '''
+        members = members.astype(np.float64)
+        count = members.sum(axis=0)
+        seen = count > 0
+        if not seen.any():
+            return
+        mean = np.divide(members.T @ values, count[:, None], out=np.zeros_like(self.mean), where=seen[:, None])
+        #the chunk's own m2 from deviations about each group's chunk mean (two passes), not sum(x**2) - n*mean**2, which cancels catastrophically
+        m2 = np.empty_like(mean)
+        for k in range(values.shape[1]):
+            deviations = values[:, k, None] - mean[:, k] #(n, groups)
+            m2[:, k] = (members * deviations ** 2).sum(axis=0)
+
+        total = self.count + count
+        delta = mean - self.mean
+        weight = np.divide(count, total, out=np.zeros_like(total), where=total > 0)[:, None]
+        self.mean += delta * weight
+        self.m2 += m2 + delta ** 2 * self.count[:, None] * weight
+        self.count = total
+
+    def std(self):
+        return np.sqrt(np.divide(self.m2, self.count[:, None] - 1, out=np.zeros_like(self.m2), where=self.count[:, None] > 1))
+
+
+###############################################################################
+#[2] OUTPUT
+
+class LineWriter:
+    '''
+    Writes one row at a time, as CSV (with a header row) or JSON lines, flushing as it goes so a long run can be watched or piped.
+    '''
+    def __init__(self, stream, fields, format='csv'):
+        self.stream = stream
+        self.fields = fields
+        self.format = format
+        if format == 'csv':
+            self.csv = csv.writer(stream)
+            self.csv.writerow(fields)
+
+    def write(self, row):
+        if self.format == 'csv':
+            self.csv.writerow(row)
+        else:
+            self.stream.write(json.dumps(dict(zip(self.fields, row))) + '\n')
+
+    def flush(self):
+        self.stream.flush()
+
+
+###############################################################################
+#[3] PIPELINE
+
+def feature_names(rules):
+    #One feature per attribute level, item & skill, in the column order of features().
+    low, high = rules['attribute_range']
+    return ([f'{a}={level}' for a in combat.ATTRIBUTES for level in range(low, high + 1)]
+            + [f'item:{name}' for name in rules['equipment']]
+            + [f'skill:{name}' for name in rules['skills']])
+
+def features(fighters, rules):
+    '''
+    (n, features) bool: which attribute levels, items & skills each fighter has.
+    '''
+    low, high = rules['attribute_range']
+    levels = np.arange(low, high + 1)
+    att = (fighters.attributes[:, :, None] == levels).reshape(len(fighters), -1)
+    eqp = combat._bits(fighters.equipment, len(rules['equipment']))
+    skl = combat._bits(fighters.skills, len(rules['skills']))
+    return np.concatenate([att, eqp, skl], axis=1)
+
+def simulate(source, gauntlet, games=GAMES, seed=0, chunk=CHUNK, tables=None):
+    '''
+    Fights every build from the source iterable `games` times against opponents drawn from the gauntlet (a Fighters batch), a chunk of builds at a time.
+    Yields (builds, fighters, results) per chunk, where results is (n, 3) float: each build's win rate, mean rounds & mean favor.
+    Each chunk rolls from its own stream of the master seed, so a run is reproducible.
+    '''
+    tables = tables or st.tables()
+    seeds = np.random.SeedSequence(seed)
+    source = iter(source)
+    while True:
+        batch = list(islice(source, chunk))
+        if not batch:
+            return
+        rng = np.random.default_rng(seeds.spawn(1)[0])
+        fighters = combat.encode_fighters(batch, tables)
+        n = len(fighters)
+        own = np.repeat(np.arange(n), games)
+        foes = rng.integers(0, len(gauntlet), n * games)
+        result = combat.resolve_duels(fighters.take(own), gauntlet.take(foes), rng)
+
+        wins = np.bincount(own, weights=result['winner'] == 0, minlength=n)
+        rounds = np.bincount(own, weights=result['rounds'], minlength=n)
+        favor = np.bincount(own, weights=result['favor'][:, 0], minlength=n)
+        yield batch, fighters, np.stack([wins, rounds, favor], axis=1) / games
+
+def balance_report(source, rules=None, games=GAMES, gauntlet=GAUNTLET, seed=0, chunk=CHUNK, builds_out=None, progress=None):
+    '''
+    Runs the pipeline over the source builds and returns (feature names, RunningStats).
+        builds_out: LineWriter for a row per build, written as each chunk finishes
+        progress: called with the number of builds done after each chunk
+    '''
+    rules = rules or bd.build_rules()
+    tables = st.tables()
+    opponents = combat.encode_fighters(bd.sample_builds(gauntlet, seed, rules), tables)
+    names = feature_names(rules)
+    stats = RunningStats(len(names), len(METRICS))
+
+    done = 0
+    for batch, fighters, results in simulate(source, opponents, games, seed, chunk, tables):
+        stats.update(features(fighters, rules), results)
+        if builds_out is not None:
+            for (att, inventory, skills), row in zip(batch, results.tolist()):
+                builds_out.write([' '.join(str(att[a]) for a in combat.ATTRIBUTES), ' '.join(inventory), ' '.join(skills)] + row)
+            builds_out.flush()
+        done += len(batch)
+        if progress:
+            progress(done)
+    return names, stats
+
+def report_rows(names, stats):
+    #(feature, builds, mean & sd of each metric) per feature with at least one build
+    std = stats.std()
+    for i, name in enumerate(names):
+        if stats.count[i]:
+            row = [name, int(stats.count[i])]
+            for m in range(len(METRICS)):
+                row += [round(float(stats.mean[i, m]), 4), round(float(std[i, m]), 4)]
+            yield row
+
+REPORT_FIELDS = ['feature', 'builds'] + [f'{m}{suffix}' for m in METRICS for suffix in ('', '_sd')]
+BUILD_FIELDS = ['attributes', 'equipment', 'skills'] + list(METRICS)
+
+
+###############################################################################
+#[4] MAIN
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Win rate, fight length & crowd favor per item, skill & attribute level.')
+    parser.add_argument('--sample', type=int, default=None, help='fight this many uniformly random builds (default: every legal build)')
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many builds')
+    parser.add_argument('--games', type=int, default=GAMES, help='duels per build')
+    parser.add_argument('--gauntlet', type=int, default=GAUNTLET, help='random opponents to draw from')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk', type=int, default=CHUNK)
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+    parser.add_argument('--out', default='-', help='feature report (default: stdout)')
+    parser.add_argument('--builds-out', default=None, help='also write a row per build here')
+    args = parser.parse_args(argv)
+
+    rules = bd.build_rules()
+    if args.sample is not None:
+        source = bd.sample_builds(args.sample, args.seed, rules)
+        total = args.sample
+    else:
+        source = bd.enumerate_builds(rules)
+        total = bd.count_builds(rules)['total']
+    if args.limit is not None:
+        source = islice(source, args.limit)
+        total = min(total, args.limit)
+
+    def progress(done):
+        print(f'\r{done:,}/{total:,} builds', end='', file=sys.stderr, flush=True)
+
+    builds_file = open(args.builds_out, 'w', newline='') if args.builds_out else None
+    try:
+        builds_out = LineWriter(builds_file, BUILD_FIELDS, args.format) if builds_file else None
+        names, stats = balance_report(source, rules, args.games, args.gauntlet, args.seed, args.chunk, builds_out, progress)
+    finally:
+        if builds_file:
+            builds_file.close()
+    print(file=sys.stderr)
+
+    out = sys.stdout if args.out == '-' else open(args.out, 'w', newline='')
+    try:
+        writer = LineWriter(out, REPORT_FIELDS, args.format)
+        for row in report_rows(names, stats):
+            writer.write(row)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,777 @@
+'''
+           BENCHMARK.PY
+=====================================
+Benchmarks for the display & game code.  Run from the repo directory:
+    python benchmark.py                                 #everything
+    python benchmark.py bench_micro bench_combat        #just these
+    python benchmark.py bench_micro --save              #microbenchmarks, saved as the baseline (BASELINE_PATH)
+    python benchmark.py bench_micro --compare           #microbenchmarks against the saved baseline
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] UTILITY FUNCTIONS
+    [2] DISPLAY BENCHMARKS
+    [3] STARTUP BENCHMARKS
+    [4] CHARACTER GENERATION BENCHMARKS
+    [5] MICROBENCHMARKS & BASELINES: ops/sec & allocations of the display & chargen building blocks, saved & compared run to run
+    [6] MAIN
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import display as dsp
+import resources as rs
+
+
+###############################################################################
+#[1] UTILITY FUNCTIONS
+
+def headless_display(backend=None):
+    '''
+    Points display.py at a headless backend (default: NullBackend) instead of the real TTY.  Returns the backend.
+    '''
+    backend = backend if backend is not None else dsp.NullBackend()
+    dsp.set_backend(backend)
+    return backend
+
+def scripted_keypresses():
+    '''
+    Returns a list of zero-arg callables, each of which draws what one chargen keypress draws: walking the cursor down every list on the three screens.
+    '''
+    att = rs.class_init_ATT(rs.attributes_read_only)
+    eqp = rs.class_init_EQP(rs.equipment_read_only)
+    skl = rs.class_init_SKL(rs.skills_read_only)
+    tabs = ['ATTRIBUTES', 'EQUIPMENT', 'SKILLS']
+
+    frames = []
+    for tab, (func, options, points) in enumerate([
+            (dsp.attributes_display, att, 5),
+            (dsp.equipment_display, eqp, 7),
+            (dsp.skill_display, skl, 1)]):
+        for cursor in range(len(options)):
+            def frame(func=func, cursor=cursor, options=options, points=points, tab=tab):
+                with dsp.screen.batch():
+                    func(cursor, options, points)
+                    dsp.tab_header(list(tabs), tab)
+            frames.append(frame)
+    return frames
+
+def report(name, rows):
+    #Prints one benchmark table.  rows: list of (label, value) tuples.
+    print(f'\n{name}')
+    print('-' * len(name))
+    for label, value in rows:
+        print(f'    {label:<48}{value}')
+
+
+###############################################################################
+#[2] DISPLAY BENCHMARKS
+
+def bench_keypress_render(repeats=20, fork_clear=True):
+    '''
+    Bytes emitted and latency per chargen keypress, before and after the differential ScreenBuffer.
+    "before" repaints every cell on every keypress (what clear + reprinting DISPLAY_FRAME + the body amounted to); the old code additionally paid a fork+exec of `clear`, which is timed separately when fork_clear=True.
+    '''
+    backend = headless_display()
+    screen = dsp.screen
+    frames = scripted_keypresses()
+    results = []
+
+    for label, full in [('before (full repaint)', True), ('after (diffed)', False)]:
+        screen.front = None
+        frames[0]()
+        backend.bytes_written = 0
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for frame in frames:
+                if full:
+                    #forget what is painted: clear + repaint of the whole grid, as the old code did
+                    screen.front = None
+                frame()
+        elapsed = time.perf_counter() - start
+
+        presses = repeats * len(frames)
+        results.append((f'{label} bytes/keypress', f'{backend.bytes_written / presses:,.0f}'))
+        results.append((f'{label} ms/keypress', f'{elapsed / presses * 1000:.3f}'))
+
+    if fork_clear:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            os.system('clear > /dev/null')
+        results.append(('os.system(\'clear\') ms (old, per keypress)', f'{(time.perf_counter() - start) / repeats * 1000:.3f}'))
+
+    report('KEYPRESS RENDER', results)
+
+def bench_layout_cache(repeats=50):
+    '''
+    Per-keypress time with a cold layout cache vs warm, and the cache's hit/miss counters after a scripted session.
+    '''
+    headless_display()
+    frames = scripted_keypresses()
+    results = []
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        dsp.layout_cache_clear()
+        for frame in frames:
+            frame()
+    cold = time.perf_counter() - start
+
+    dsp.layout_cache_clear()
+    for frame in frames:
+        frame()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for frame in frames:
+            frame()
+    warm = time.perf_counter() - start
+
+    presses = repeats * len(frames)
+    info = dsp.layout_cache_info()
+    results.append(('cold cache ms/keypress', f'{cold / presses * 1000:.3f}'))
+    results.append(('warm cache ms/keypress', f'{warm / presses * 1000:.3f}'))
+    results.append(('hits / misses (warm run)', f'{info.hits:,} / {info.misses:,}'))
+    report('LAYOUT CACHE', results)
+
+def bench_wrap_text(sizes=(100, 1000, 10000, 100000)):
+    '''
+    wrap_pages on lore-length text (uncached) at growing sizes; time per word should stay flat.
+    '''
+    words = 'It\'ll stop an arrow but it won\'t stop your father\'s disappointment. Pneumonoultramicroscopicsilicovolcanoconiosis!'.split()
+    results = []
+    for size in sizes:
+        text = ' '.join(words[i % len(words)] for i in range(size))
+        dsp.layout_cache_clear()
+        start = time.perf_counter()
+        pages = dsp.wrap_pages(text, dsp.HALF_BODY_MAX)
+        elapsed = time.perf_counter() - start
+        results.append((f'{size:,} words ({len(pages):,} pages) us/word', f'{elapsed / size * 1e6:.2f}'))
+    report('WRAP TEXT', results)
+
+def bench_headless_throughput(seconds=2.0):
+    '''
+    Chargen screens rendered per second against each headless backend.
+    '''
+    results = []
+    for backend in [dsp.NullBackend(), dsp.BufferBackend()]:
+        headless_display(backend)
+        frames = scripted_keypresses()
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            for frame in frames:
+                frame()
+            count += len(frames)
+        elapsed = time.perf_counter() - start
+        results.append((f'{type(backend).__name__} screens/sec', f'{count / elapsed:,.0f}'))
+    report('HEADLESS THROUGHPUT', results)
+
+
+###############################################################################
+#[3] STARTUP BENCHMARKS
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def bench_startup(runs=5, modules=('main', 'chargen', 'display', 'resources', 'character', 'blessed')):
+    '''
+    `python -X importtime -c "import main"` run from a scratch directory (so it also checks nothing depends on the CWD).  Reports the best-of-runs wall time and cumulative import time of each game module.
+    '''
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    best_wall = None
+    best = {}
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(runs):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                                  cwd=cwd, env=env, capture_output=True, text=True, check=True)
+            wall = time.perf_counter() - start
+            best_wall = wall if best_wall is None else min(best_wall, wall)
+            
+            #lines look like:  import time:       self [us] | cumulative | imported package
+            for line in proc.stderr.splitlines():
+                if not line.startswith('import time:') or '|' not in line:
+                    continue
+                self_us, cumulative, package = line[len('import time:'):].split('|')
+                package = package.strip()
+                if package in modules and cumulative.strip().isdigit():
+                    us = int(cumulative)
+                    best[package] = min(best.get(package, us), us)
+    
+    results = [('python -c "import main" wall ms', f'{best_wall * 1000:.1f}')]
+    results += [(f'import {m} cumulative ms', f'{best[m] / 1000:.1f}') for m in modules if m in best]
+    report('STARTUP', results)
+
+
+###############################################################################
+#[4] CHARACTER GENERATION BENCHMARKS
+
+def _legacy_class_init(struc, value=None):
+    #The old class_init_* shape, for comparison: a fresh __dict__ class declared on every call.
+    class Record:
+        def __init__(self, name, desc, value, selected):
+            self.name = name
+            self.desc = desc
+            self.value = value
+            self.selected = selected
+    return [Record(d['name'], d['desc'], d.get('value', value), False) for d in struc]
+
+def bench_catalog_load(items=5000):
+    '''
+    Reading, validating & indexing a generated equipment catalog of `items` entries (from the source, then from the precompiled cache), then looking every entry up by name.
+    '''
+    import json
+    with tempfile.TemporaryDirectory() as content_dir:
+        path = os.path.join(content_dir, 'equipment.json')
+        with open(path, 'w') as f:
+            json.dump({'equipment': [{'name': f'item_{i}', 'category': f'cat_{i % 12}', 'value': i % 4 + 1,
+                                      'desc': 'stabby stabby boi ' * 4} for i in range(items)]}, f)
+        
+        start = time.perf_counter()
+        catalog = rs.load_catalog('equipment', path, use_cache=False)
+        loaded = time.perf_counter() - start
+        
+        rs.load_catalog('equipment', path) #writes the precompiled cache
+        start = time.perf_counter()
+        rs.load_catalog('equipment', path)
+        cached = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for i in range(items):
+        catalog.by_name[f'item_{i}']
+    lookups = time.perf_counter() - start
+    
+    report('CATALOG LOAD', [
+        (f'load {items:,} items ms (parse & validate)', f'{loaded * 1000:.2f}'),
+        (f'load {items:,} items ms (precompiled cache)', f'{cached * 1000:.2f}'),
+        ('lookup by name us', f'{lookups / items * 1e6:.3f}'),
+    ])
+
+def bench_build_enumeration(limit=200000, catalog_items=500):
+    '''
+    Builds streamed per second by builds.enumerate_builds, and the time for the DP counter on the real catalogs and on a generated catalog of `catalog_items` items.
+    '''
+    import builds
+    rules = builds.build_rules()
+    start = time.perf_counter()
+    streamed = 0
+    for build in builds.enumerate_builds(rules):
+        streamed += 1
+        if streamed == limit:
+            break
+    elapsed = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    counts = builds.count_builds(rules)
+    counted = time.perf_counter() - start
+    
+    big = dict(rules, equipment=[f'item_{i}' for i in range(catalog_items)], equipment_costs=[i % 5 + 1 for i in range(catalog_items)])
+    start = time.perf_counter()
+    big_counts = builds.count_builds(big)
+    big_counted = time.perf_counter() - start
+    
+    report('BUILD ENUMERATION', [
+        ('builds streamed/sec', f'{streamed / elapsed:,.0f}'),
+        (f'count_builds ms ({counts["total"]:,} builds)', f'{counted * 1000:.3f}'),
+        (f'count_builds ms ({catalog_items} items, {len(str(big_counts["total"]))} digit total)', f'{big_counted * 1000:.3f}'),
+    ])
+
+def bench_combat(duels=200000, fighters=20000):
+    '''
+    Duels resolved per second by combat.resolve_duels, for random pairings of builds spread across the build space.
+    '''
+    from itertools import islice
+    import numpy as np
+    import builds
+    import combat
+    
+    step = max(builds.count_builds()['total'] // fighters, 1)
+    roster = combat.encode_fighters(islice(builds.enumerate_builds(), 0, None, step))
+    rng = np.random.default_rng(0)
+    a = roster.take(rng.integers(0, len(roster), duels))
+    b = roster.take(rng.integers(0, len(roster), duels))
+    
+    start = time.perf_counter()
+    result = combat.resolve_duels(a, b, rng)
+    elapsed = time.perf_counter() - start
+    report('COMBAT', [
+        (f'{duels:,} duels/sec', f'{duels / elapsed:,.0f}'),
+        ('mean rounds per duel', f'{result["rounds"].mean():.2f}'),
+    ])
+
+def bench_tournament(field=64, games=20, workers=(1, 2, 4)):
+    '''
+    Round-robin tournament throughput (duels/sec) at each pool size.  The standings must come out identical at every size: they only depend on the master seed.
+    '''
+    import builds
+    import tournament
+
+    roster = list(builds.sample_builds(field, 0))
+    rows = []
+    baseline = None
+    for count in workers:
+        start = time.perf_counter()
+        standings = tournament.round_robin(roster, games, seed=0, workers=count)
+        elapsed = time.perf_counter() - start
+        duels = int(standings.games.sum()) // 2
+        if baseline is None:
+            baseline = standings.wins
+        same = 'same' if (standings.wins == baseline).all() else 'DIFFERENT'
+        rows.append((f'{count} worker(s), {duels:,} duels', f'{duels / elapsed:,.0f}/sec, {same} standings'))
+    rows.append(('cores available', f'{os.cpu_count()}'))
+    report('TOURNAMENT', rows)
+
+def bench_saves(characters=200000):
+    '''
+    Save format: bytes per character, binary vs JSON lines, and characters/minute encoded & decoded, for random builds.  Every character must survive the round trip.
+    '''
+    import io
+    import builds
+    import saves
+
+    roster = [(f'Gladiator {i}', att, inventory, skills)
+              for i, (att, inventory, skills) in enumerate(builds.sample_builds(characters, 0))]
+    codec = saves.SaveCodec()
+
+    start = time.perf_counter()
+    data = codec.encode_many(roster)
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    loaded = list(codec.decode_many(data))
+    decode = time.perf_counter() - start
+
+    stream = io.StringIO()
+    start = time.perf_counter()
+    saves.export_json(roster, stream)
+    export = time.perf_counter() - start
+    same = all(saves.to_json(a) == saves.to_json(b) for a, b in zip(roster, loaded)) and len(loaded) == len(roster)
+
+    report('SAVES', [
+        ('binary bytes/character', f'{len(data) / characters:.1f}'),
+        ('JSON bytes/character', f'{len(stream.getvalue().encode()) / characters:.1f}'),
+        ('binary encode characters/min', f'{characters / encode * 60:,.0f}'),
+        ('binary decode characters/min', f'{characters / decode * 60:,.0f}'),
+        ('JSON export characters/min', f'{characters / export * 60:,.0f}'),
+        ('round trip', 'ok' if same else 'MISMATCH'),
+    ])
+
+def bench_roster(characters=100000, queries=10000):
+    '''
+    Roster store: characters/sec appended, score updates/sec, and lookups by id, ranks & top-10 queries per second from a second (reader) handle, how long that reader takes to catch up on the writer's changes, and to reopen from the saved leaderboard.  Runs in a throwaway directory.
+    '''
+    import random
+    import builds
+    import roster
+
+    rng = random.Random(0)
+    league = [(f'Gladiator {i}', att, inventory, skills)
+              for i, (att, inventory, skills) in enumerate(builds.sample_builds(characters, 0))]
+    with tempfile.TemporaryDirectory() as path:
+        with roster.open_roster(path, writer=True) as writer:
+            start = time.perf_counter()
+            for character in league:
+                writer.add(character, rng.randrange(10000))
+            add = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(queries):
+                writer.set_score(rng.randrange(len(writer)), rng.randrange(10000))
+            update = time.perf_counter() - start
+
+            with roster.open_roster(path) as reader:
+                start = time.perf_counter()
+                reader.refresh()
+                refresh = time.perf_counter() - start
+                ids = [rng.randrange(len(reader)) for _ in range(queries)]
+                start = time.perf_counter()
+                for id in ids:
+                    reader.get(id)
+                get = time.perf_counter() - start
+                start = time.perf_counter()
+                for id in ids:
+                    reader.rank(id)
+                rank = time.perf_counter() - start
+                start = time.perf_counter()
+                for _ in range(queries):
+                    reader.top(10)
+                top = time.perf_counter() - start
+                for _ in range(100):
+                    writer.set_score(rng.randrange(len(writer)), rng.randrange(10000))
+                start = time.perf_counter()
+                reader.refresh()
+                catch_up = time.perf_counter() - start
+                same = reader.top(10) == writer.top(10)
+            final = writer.top(10)
+        start = time.perf_counter()
+        with roster.open_roster(path) as reader:
+            reopen = time.perf_counter() - start
+            same = same and reader.top(10) == final
+
+    report('ROSTER', [
+        ('characters', f'{characters:,}'),
+        ('adds/sec', f'{characters / add:,.0f}'),
+        ('score updates/sec', f'{queries / update:,.0f}'),
+        ('reader refresh (ms)', f'{refresh * 1000:.1f}'),
+        ('reader catching up 100 updates (ms)', f'{catch_up * 1000:.2f}'),
+        ('reopen from roster.rank (ms)', f'{reopen * 1000:.1f}'),
+        ('get by id/sec', f'{queries / get:,.0f}'),
+        ('rank/sec', f'{queries / rank:,.0f}'),
+        ('top 10/sec', f'{queries / top:,.0f}'),
+        ('reader matches writer', 'ok' if same else 'MISMATCH'),
+    ])
+
+def bench_replay(keys=5000, repeats=5):
+    '''
+    Replay harness: a seeded random session of `keys` chargen keys is recorded, decoded & played back headless at full speed.  Reports bytes/key of the recording, screens/sec played back, and whether two playbacks end on the same screen.
+    '''
+    import random
+    import replay
+    from blessed.keyboard import Keystroke
+
+    rng = random.Random(0)
+    named = [(name, text) for name, text in replay.KEYS if name in ('KEY_UP', 'KEY_DOWN', 'KEY_LEFT', 'KEY_RIGHT', 'KEY_TAB', 'KEY_ENTER')]
+    session = [(i * 0.15, Keystroke(text, name=name)) for i, (name, text) in enumerate(rng.choice(named) for _ in range(keys))]
+    data = replay.encode_log(session)
+    start = time.perf_counter()
+    _, timed = replay.read_log(data)
+    decode = time.perf_counter() - start
+    played = [key for at, key in timed]
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        replay.play(played)
+    elapsed = time.perf_counter() - start
+
+    first, second = dsp.BufferBackend(), dsp.BufferBackend()
+    replay.play(played, first)
+    replay.play(played, second)
+    report('REPLAY', [
+        ('keys', f'{keys:,}'),
+        ('recording bytes/key', f'{len(data) / keys:.2f}'),
+        ('decode keys/sec', f'{keys / decode:,.0f}'),
+        ('playback screens/sec', f'{keys * repeats / elapsed:,.0f}'),
+        ('deterministic', 'ok' if first.snapshot(styled=True) == second.snapshot(styled=True) else 'MISMATCH'),
+    ])
+
+def bench_tracing(keys=2000, calls=1000000):
+    '''
+    Cost of the keypress tracing (tracing.py): a seeded random chargen session played back headless with tracing off & on, and what a disabled span costs per call, against the spans one keypress makes.
+    '''
+    import random
+    import replay
+    import tracing
+    from blessed.keyboard import Keystroke
+
+    rng = random.Random(0)
+    named = [(name, text) for name, text in replay.KEYS if name in ('KEY_UP', 'KEY_DOWN', 'KEY_LEFT', 'KEY_RIGHT', 'KEY_TAB', 'KEY_ENTER')]
+    session = [Keystroke(text, name=name) for name, text in (rng.choice(named) for _ in range(keys))]
+    replay.play(session)
+
+    start = time.perf_counter()
+    replay.play(session)
+    off = time.perf_counter() - start
+    tracing.enable()
+    start = time.perf_counter()
+    replay.play(session)
+    on = time.perf_counter() - start
+    tracing.disable()
+    per_key = len(tracing.RING) / keys
+
+    @tracing.traced('bench')
+    def noop():
+        pass
+    start = time.perf_counter()
+    for _ in range(calls):
+        with tracing.span('bench'):
+            pass
+    span_ns = (time.perf_counter() - start) / calls * 1e9
+    start = time.perf_counter()
+    for _ in range(calls):
+        noop()
+    traced_ns = (time.perf_counter() - start) / calls * 1e9
+
+    report('TRACING', [
+        ('tracing off ms/keypress', f'{off / keys * 1000:.3f}'),
+        ('tracing on ms/keypress', f'{on / keys * 1000:.3f}'),
+        ('spans/keypress', f'{per_key:.1f}'),
+        ('disabled span() ns/call', f'{span_ns:.0f}'),
+        ('disabled traced() ns/call', f'{traced_ns:.0f}'),
+        ('disabled overhead % of keypress', f'{per_key * max(span_ns, traced_ns) / (off / keys * 1e9) * 100:.2f}'),
+    ])
+
+def bench_large_catalog(sizes=(10, 100, 1000, 10000), presses=400, query='bron cap'):
+    '''
+    Equipment screen keypress (update + render) against catalogs grown to `sizes` items by repeating the real one.  The list is windowed, so ms/keypress should stay flat as the catalog grows.
+    Also times type-ahead filtering: building the search index once, then each character of `query` typed & erased (update only), against rescanning every option's words per character.
+    '''
+    import chargen
+    import search
+    from blessed.keyboard import Keystroke
+
+    headless_display()
+    keys = [Keystroke('', name=name) for name in ('KEY_DOWN', 'KEY_DOWN', 'KEY_PGDOWN', 'KEY_ENTER', 'KEY_UP', 'KEY_PGDOWN', 'KEY_ENTER')]
+    typed = [Keystroke('/')] + [Keystroke(c) for c in query] + [Keystroke('', name='KEY_BACKSPACE')] * len(query) + [Keystroke('', name='KEY_ESCAPE')]
+    results = []
+    for size in sizes:
+        catalog = [dict(e, name=f"{e['name'][:10]}_{i}") for i in range(-(-size // len(rs.equipment_read_only))) for e in rs.equipment_read_only][:size]
+        screen = chargen.EquipmentScreen(remaining_points=chargen.EQUIPMENT_POINTS)
+        screen.res_list = rs.class_init_EQP(catalog)
+        screen.filter = search.TypeAhead(screen.res_list)
+        screen.view = screen.filter.view()
+        screen.cursor_range = chargen.list_to_range(screen.view)
+        screen.selection(None)
+        start = time.perf_counter()
+        for i in range(presses):
+            screen.selection(keys[i % len(keys)])
+        elapsed = time.perf_counter() - start
+        results.append((f'{size:,} items ms/keypress', f'{elapsed / presses * 1000:.3f}'))
+
+        start = time.perf_counter()
+        screen.filter.index = search.SearchIndex(screen.res_list)
+        build = time.perf_counter() - start
+        repeats = max(1, presses // len(typed))
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for key in typed:
+                screen.update(key)
+        incremental = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for n in range(1, len(query) + 1):
+                terms = query[:n].split()
+                [i for i, opt in enumerate(screen.res_list)
+                 if all(any(word.startswith(term) for word in search.words(opt.name) + search.words(opt.desc)) for term in terms)]
+        rescan = time.perf_counter() - start
+        results.append((f'{size:,} items filter index build ms', f'{build * 1000:.2f}'))
+        results.append((f'{size:,} items ms/filter key (trie)', f'{incremental / (repeats * len(typed)) * 1000:.4f}'))
+        results.append((f'{size:,} items ms/filter key (rescan)', f'{rescan / (repeats * len(query)) * 1000:.4f}'))
+    report('LARGE CATALOG', results)
+
+def bench_character_memory(characters=50000):
+    '''
+    Memory & time to generate characters' runtime records (attributes, equipment, skills), old per-call __dict__ classes vs the __slots__ records.  All `characters` are generated & measured with tracemalloc; nothing is extrapolated.  The default is about a million records, and the old classes need ~0.7 GB for it.
+    '''
+    def legacy():
+        return (_legacy_class_init(rs.attributes_read_only, 1),
+                _legacy_class_init(rs.equipment_read_only),
+                _legacy_class_init(rs.skills_read_only, 1))
+    def slots():
+        return (rs.class_init_ATT(rs.attributes_read_only),
+                rs.class_init_EQP(rs.equipment_read_only),
+                rs.class_init_SKL(rs.skills_read_only))
+    
+    results = [('characters', f'{characters:,}'), ('records', f'{characters * sum(map(len, slots())):,}')]
+    for label, generate in [('__dict__ classes (old)', legacy), ('__slots__ records', slots)]:
+        start = time.perf_counter()
+        roster = [generate() for _ in range(characters)]
+        elapsed = time.perf_counter() - start
+        del roster
+        
+        #measured separately: tracemalloc slows allocation down a lot
+        tracemalloc.start()
+        roster = [generate() for _ in range(characters)]
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del roster
+        results.append((f'{label} MB', f'{size / 2**20:,.0f}'))
+        results.append((f'{label} s', f'{elapsed:.2f}'))
+    report('CHARACTER MEMORY', results)
+
+
+###############################################################################
+#[5] MICROBENCHMARKS & BASELINES
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+REGRESSION = 0.10 #a change in ops/sec bigger than this (either way) is flagged when comparing
+
+def measure(op, seconds=0.5, repeats=5, alloc_runs=200):
+    '''
+    Times a zero-arg callable.  The batch size is doubled until a batch takes seconds/repeats; then `repeats` batches are timed and the fastest kept (as timeit advises: slower runs are noise from the rest of the machine, not the code).  Then it runs `alloc_runs` more times under tracemalloc for its allocations.
+    Returns {'ops_per_sec', 'peak_bytes': most memory allocated at once during a call, 'net_bytes': memory a call leaves allocated (caches, leaks), averaged}.
+    '''
+    op()
+    target = seconds / repeats
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= target:
+            break
+        batch *= 2
+    best = elapsed
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(batch):
+            op()
+        best = min(best, time.perf_counter() - start)
+    
+    peak = 0
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(alloc_runs):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            op()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        net = (tracemalloc.get_traced_memory()[0] - before) / alloc_runs
+    finally:
+        tracemalloc.stop()
+    return {'ops_per_sec': batch / best, 'peak_bytes': peak, 'net_bytes': net}
+
+def micro_cases():
+    '''
+    {name: zero-arg callable} for every microbenchmark, set up against a headless display.  Each call is one operation; ops that take a cursor cycle through every position so no one layout is favored.
+    "(uncached)" cases call the layout functions under the layout cache, to time the work itself; the others go through the cache as the game does.
+    '''
+    import itertools
+    import random
+    import chargen
+    import replay
+    from blessed.keyboard import Keystroke
+
+    headless_display()
+    att = rs.class_init_ATT(rs.attributes_read_only)
+    eqp = rs.class_init_EQP(rs.equipment_read_only)
+    skl = rs.class_init_SKL(rs.skills_read_only)
+    tabs = ['ATTRIBUTES', 'EQUIPMENT', 'SKILLS']
+    desc = eqp[0].desc
+    lines = [dsp.cleanify(e.name) for e in eqp]
+    width, height = dsp.HALF_BODY_MAX['width'], dsp.HALF_BODY_MAX['height']
+    
+    def cycle(n):
+        return itertools.cycle(range(n)).__next__
+    
+    att_cursor, eqp_cursor, skl_cursor, tab_cursor = cycle(len(att)), cycle(len(eqp)), cycle(len(skl)), cycle(len(tabs))
+    def pipeline():
+        i = eqp_cursor()
+        return dsp.print_pipeline({'assembled':list(lines), 'v_just':True, 'h_just':True, 'wrap':False},
+                                  {'assembled':eqp[i].desc, 'v_just':False, 'h_just':False, 'wrap':True, 'limits':dsp.DESC_MAX})
+    
+    positions = chargen.list_to_range(eqp)
+    moves = itertools.cycle(['KEY_DOWN', 'KEY_DOWN', 'KEY_UP', 'KEY_PGDOWN', 'KEY_HOME', 'KEY_END']).__next__
+    
+    rng = random.Random(0)
+    named = [(name, text) for name, text in replay.KEYS if name in ('KEY_UP', 'KEY_DOWN', 'KEY_LEFT', 'KEY_RIGHT', 'KEY_TAB', 'KEY_ENTER')]
+    session = [Keystroke(text, name=name) for name, text in (rng.choice(named) for _ in range(100))]
+    
+    return {
+        'wrap_text': lambda: dsp.wrap_text(desc, dsp.DESC_MAX),
+        'wrap_text (uncached)': lambda: dsp._wrap_pages(desc, width - 2, height),
+        'h_justify': lambda: dsp.h_justify(width, lines),
+        'h_justify (uncached)': lambda: dsp._h_justify(width, list(lines)),
+        'v_justify': lambda: dsp.v_justify(height, lines),
+        'v_justify (uncached)': lambda: dsp._v_justify(height, list(lines)),
+        'tab_header': lambda: dsp.tab_header(tabs, tab_cursor()),
+        'print_pipeline': pipeline,
+        'attributes_display': lambda: dsp.attributes_display(att_cursor(), att, chargen.ATTRIBUTE_POINTS),
+        'equipment_display': lambda: dsp.equipment_display(eqp_cursor(), eqp, chargen.EQUIPMENT_POINTS),
+        'skill_display': lambda: dsp.skill_display(skl_cursor(), skl, chargen.SKILL_POINTS),
+        'vertical_cursor_logic': lambda: chargen.vertical_cursor_logic(eqp_cursor(), positions, moves()),
+        'select_logic': lambda: chargen.select_logic(eqp[eqp_cursor()], chargen.EQUIPMENT_POINTS),
+        'chargen session (100 keys)': lambda: replay.play(session),
+    }
+
+def load_baseline(path=BASELINE_PATH):
+    #The saved {name: measure() result} results, or None if there is no baseline yet.
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)['results']
+
+def save_baseline(results, path=BASELINE_PATH):
+    with open(path, 'w') as f:
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'saved': time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'results': results}, f, indent=1, sort_keys=True)
+
+def compare(result, baseline, threshold=REGRESSION):
+    #How result's ops/sec differs from baseline's, as text; flags changes past threshold.
+    if baseline is None:
+        return ''
+    change = result['ops_per_sec'] / baseline['ops_per_sec'] - 1
+    flag = '  REGRESSION' if change < -threshold else '  faster' if change > threshold else ''
+    return f'  {change:+7.1%}{flag}'
+
+def bench_micro(seconds=0.5, save=None, baseline=None, only=None, threshold=REGRESSION):
+    '''
+    Ops/sec, peak & net bytes allocated per op for the display & chargen building blocks (see micro_cases), and how each compares to a saved baseline.
+        save: path to write these results to as the new baseline
+        baseline: path of a saved baseline to compare against
+        only: names of the cases to run (default: all)
+        threshold: flag changes in ops/sec bigger than this fraction.  Timings on a busy machine can swing 10-20% between runs; compare on a quiet one.
+    Returns {name: measure() result}.
+    '''
+    old = load_baseline(baseline) if baseline else None
+    results = {}
+    rows = []
+    for name, op in micro_cases().items():
+        if only and name not in only:
+            continue
+        results[name] = result = measure(op, seconds)
+        was = old.get(name) if old else None
+        rows.append((name, f'{result["ops_per_sec"]:>12,.0f} ops/s {result["peak_bytes"]:>9,} B peak {result["net_bytes"]:>8,.0f} B net'
+                           + compare(result, was, threshold)))
+    report('MICROBENCHMARKS' + (f' (vs {baseline})' if old else ''), rows)
+    if save:
+        save_baseline(results, save)
+        print(f'\nBaseline saved to {save}')
+    return results
+
+
+###############################################################################
+#[6] MAIN
+
+BENCHMARKS = [
+    bench_keypress_render,
+    bench_layout_cache,
+    bench_wrap_text,
+    bench_headless_throughput,
+    bench_startup,
+    bench_catalog_load,
+    bench_build_enumeration,
+    bench_combat,
+    bench_tournament,
+    bench_saves,
+    bench_roster,
+    bench_replay,
+    bench_tracing,
+    bench_large_catalog,
+    bench_character_memory,
+    bench_micro,
+]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='GLADIATOR benchmarks.')
+    parser.add_argument('benchmarks', nargs='*', help='names of the benchmarks to run (default: all)')
+    parser.add_argument('--save', nargs='?', const=BASELINE_PATH, default=None, help='bench_micro: save the results as the baseline')
+    parser.add_argument('--compare', nargs='?', const=BASELINE_PATH, default=None, help='bench_micro: compare against a saved baseline')
+    parser.add_argument('--seconds', type=float, default=0.5, help='bench_micro: seconds to time each case')
+    parser.add_argument('--threshold', type=float, default=REGRESSION, help='bench_micro: flag ops/sec changes bigger than this fraction')
+    args = parser.parse_args(argv)
+    
+    names = {bench.__name__ for bench in BENCHMARKS}
+    unknown = set(args.benchmarks) - names
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(sorted(unknown))} (choose from {", ".join(sorted(names))})')
+    for bench in BENCHMARKS:
+        if args.benchmarks and bench.__name__ not in args.benchmarks:
+            continue
+        if bench is bench_micro:
+            bench_micro(args.seconds, args.save, args.compare, threshold=args.threshold)
+        else:
+            bench()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+'''
+           BITS.PY
+=====================================
+Bitset helpers shared by the save codec (saves.py) and the type-ahead index (search.py).  A bitset is a Python int (or its little-endian bytes); bit i set means entry i of some list is in the set.  Bits are read a byte at a time through a 256-entry table, so decoding costs one step per byte plus one per set bit.
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] BITSETS
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+#BYTE_BITS[b]: the indexes of the bits set in byte b, for decoding bitsets a byte at a time
+BYTE_BITS = [tuple(i for i in range(8) if b >> i & 1) for b in range(256)]
+
+
+###############################################################################
+#[1] BITSETS
+
+def byte_bits(data):
+    #Indexes of the bits set in little-endian bytes, lowest first.
+    found = []
+    for byte_no, byte in enumerate(data):
+        if byte:
+            base = byte_no * 8
+            found.extend(base + bit for bit in BYTE_BITS[byte])
+    return found
+
+def set_bits(mask):
+    #Indexes of the bits set in an int, lowest first.
+    return byte_bits(mask.to_bytes((mask.bit_length() + 7) // 8, 'little'))
@@ -0,0 +1,215 @@
+'''
+           BUILDS.PY
+=====================================
+Enumerates & counts every legal character build: every (attributes, inventory, skills) that character generation can produce, in the same shape as chargen.cast_values().  Used for balance analysis.
+
+The rules are the chargen screens' rules:
+    Attributes: each between chargen.ATTRIBUTE_MIN and ATTRIBUTE_MAX, spending at most chargen.ATTRIBUTE_POINTS above the minimum (AttributeScreen.attribute_logic).
+    Equipment: any set of items whose total value fits in chargen.EQUIPMENT_POINTS (select_logic).
+    Skills: any set of skills whose total value fits in chargen.SKILL_POINTS (select_logic; every skill is worth 1).
+Unspent points are legal, so builds that leave points on the table are included.
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] ENUMERATION: streaming generators; nothing is materialized
+    [2] COUNTING: dynamic programming; the size of the space without enumerating it
+    [3] SAMPLING: uniformly random builds, drawn from the same counts
+    [4] MAIN
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import random
+
+import chargen as cg
+import resources as rs
+
+
+def build_rules():
+    '''
+    Returns the names, costs & budgets the enumerator works from, read off the same runtime records the chargen screens use.
+    '''
+    ATT = rs.class_init_ATT(rs.attributes_read_only)
+    EQP = rs.class_init_EQP(rs.equipment_read_only)
+    SKL = rs.class_init_SKL(rs.skills_read_only)
+    return {
+        'attributes': [a.name for a in ATT],
+        'attribute_points': cg.ATTRIBUTE_POINTS,
+        'attribute_range': (cg.ATTRIBUTE_MIN, cg.ATTRIBUTE_MAX),
+        'equipment': [e.name for e in EQP],
+        'equipment_costs': [e.value for e in EQP],
+        'equipment_points': cg.EQUIPMENT_POINTS,
+        'skills': [s.name for s in SKL],
+        'skill_costs': [s.value for s in SKL],
+        'skill_points': cg.SKILL_POINTS,
+    }
+
+
+###############################################################################
+#[1] ENUMERATION
+
+def attribute_vectors(count, points, low, high):
+    '''
+    Yields every tuple of `count` attribute values in low..high that spends at most `points` above low.
+    '''
+    values = [low] * count
+
+    def _fill(i, remaining):
+        if i == count:
+            yield tuple(values)
+            return
+        for value in range(low, min(high, low + remaining) + 1):
+            values[i] = value
+            yield from _fill(i+1, remaining - (value - low))
+        values[i] = low
+
+    yield from _fill(0, points)
+
+def budget_subsets(costs, budget):
+    '''
+    Yields every set of indexes into costs (as a sorted tuple) whose total cost is at most budget, starting with the empty set.
+    Items are visited cheapest first, so a branch stops as soon as the next item doesn't fit: the work is proportional to the number of subsets yielded, not 2**len(costs).
+    '''
+    order = sorted(range(len(costs)), key=costs.__getitem__)
+    sorted_costs = [costs[i] for i in order]
+    chosen = []
+
+    def _extend(start, remaining):
+        yield tuple(sorted(chosen))
+        for k in range(start, len(order)):
+            cost = sorted_costs[k]
+            if cost > remaining:
+                break
+            chosen.append(order[k])
+            yield from _extend(k+1, remaining - cost)
+            chosen.pop()
+
+    yield from _extend(0, budget)
+
+def enumerate_builds(rules=None):
+    '''
+    Streams every legal build as (attributes, inventory, skills), the shape chargen.cast_values() returns:
+        attributes: {name: value}
+        inventory: {name: False} for each item taken
+        skills: [name, ...]
+    The inner loops are regenerated for each outer item rather than stored, so memory stays flat however large the space is.
+    '''
+    rules = rules or build_rules()
+    att_names = rules['attributes']
+    eqp_names = rules['equipment']
+    skl_names = rules['skills']
+    low, high = rules['attribute_range']
+
+    for eqp in budget_subsets(rules['equipment_costs'], rules['equipment_points']):
+        inventory = {eqp_names[i]:False for i in eqp}
+        for skl in budget_subsets(rules['skill_costs'], rules['skill_points']):
+            skills = [skl_names[i] for i in skl]
+            for att in attribute_vectors(len(att_names), rules['attribute_points'], low, high):
+                yield dict(zip(att_names, att)), dict(inventory), list(skills)
+
+
+###############################################################################
+#[2] COUNTING
+
+def count_attribute_vectors(count, points, low, high):
+    '''
+    Number of tuples attribute_vectors() yields.  ways[p] is the number of ways to spend exactly p points over the attributes so far.
+    '''
+    ways = [1] + [0] * points
+    for _ in range(count):
+        new = [0] * (points + 1)
+        for spent, n in enumerate(ways):
+            if n:
+                for extra in range(0, min(high - low, points - spent) + 1):
+                    new[spent + extra] += n
+        ways = new
+    return sum(ways)
+
+def count_budget_subsets(costs, budget):
+    '''
+    Number of sets budget_subsets() yields: 0/1 knapsack counting, O(len(costs) * budget).  ways[c] is the number of subsets costing exactly c.
+    '''
+    ways = [1] + [0] * budget
+    for cost in costs:
+        for c in range(budget, cost - 1, -1):
+            ways[c] += ways[c - cost]
+    return sum(ways)
+
+def count_builds(rules=None):
+    '''
+    Size of the build space without enumerating it.  The three budgets are independent, so the total is the product of the per-screen counts.  Returns a dict with each count and the 'total'.
+    '''
+    rules = rules or build_rules()
+    low, high = rules['attribute_range']
+    counts = {
+        'attributes': count_attribute_vectors(len(rules['attributes']), rules['attribute_points'], low, high),
+        'equipment': count_budget_subsets(rules['equipment_costs'], rules['equipment_points']),
+        'skills': count_budget_subsets(rules['skill_costs'], rules['skill_points']),
+    }
+    counts['total'] = counts['attributes'] * counts['equipment'] * counts['skills']
+    return counts
+
+
+###############################################################################
+#[3] SAMPLING
+
+def _suffix_counts(options, budget):
+    '''
+    For sampling.  options[i] is the list of costs position i can take (e.g. [0, cost] for an item that's taken or not).  Returns ways where ways[i][c] is the number of ways to fill positions i.. spending at most c.
+    '''
+    ways = [[1] * (budget + 1)]
+    for costs in reversed(options):
+        after = ways[0]
+        ways.insert(0, [sum(after[c - k] for k in costs if k <= c) for c in range(budget + 1)])
+    return ways
+
+def _sample_choices(options, ways, budget, rng):
+    #Walks the positions, picking each option with probability proportional to the number of completions it leaves.
+    picks = []
+    remaining = budget
+    for i, costs in enumerate(options):
+        roll = rng.randrange(ways[i][remaining])
+        for choice, k in enumerate(costs):
+            if k > remaining:
+                continue
+            roll -= ways[i+1][remaining - k]
+            if roll < 0:
+                picks.append(choice)
+                remaining -= k
+                break
+    return picks
+
+def sample_builds(count, rng=None, rules=None):
+    '''
+    Yields `count` builds drawn uniformly at random from the whole build space (every legal build is equally likely), in the same shape as enumerate_builds().  The counting tables are built once, so each draw is linear in the catalog size, however large the space.
+        rng: random.Random (or seed)
+    '''
+    rng = rng if isinstance(rng, random.Random) else random.Random(rng)
+    rules = rules or build_rules()
+    low, high = rules['attribute_range']
+    att_names, eqp_names, skl_names = rules['attributes'], rules['equipment'], rules['skills']
+
+    #attributes: position i takes value low+extra for a cost of extra
+    att_options = [list(range(high - low + 1))] * len(att_names)
+    eqp_options = [[0, cost] for cost in rules['equipment_costs']]
+    skl_options = [[0, cost] for cost in rules['skill_costs']]
+    att_ways = _suffix_counts(att_options, rules['attribute_points'])
+    eqp_ways = _suffix_counts(eqp_options, rules['equipment_points'])
+    skl_ways = _suffix_counts(skl_options, rules['skill_points'])
+
+    for _ in range(count):
+        att = _sample_choices(att_options, att_ways, rules['attribute_points'], rng)
+        eqp = _sample_choices(eqp_options, eqp_ways, rules['equipment_points'], rng)
+        skl = _sample_choices(skl_options, skl_ways, rules['skill_points'], rng)
+        yield ({name:low + extra for name, extra in zip(att_names, att)},
+               {name:False for name, taken in zip(eqp_names, eqp) if taken},
+               [name for name, taken in zip(skl_names, skl) if taken])
+
+
+###############################################################################
+#[4] MAIN
+
+if __name__ == '__main__':
+    for key, value in count_builds().items():
+        print(f'{key:<12}{value:>16,}')
@@ -22,14 +22,29 @@ NEEDS:
 import resources as rsc
 
 
+name = None
+
 attributes = None
 
 #Bool: whether it is equipped
 items = None
 
+#{name: False} for each item taken at chargen (chargen.cast_values)
+inventory = None
+
 skills = None
 
-score = {
+#The leaderboard's first entries, {rank: name}.  roster.py seeds a new roster from these.
+score_seed = {
     0: 'Nero',
     1: 'Caligula'
 }
+
+def __getattr__(name):
+    '''
+    Lazy module attributes, as in display.py & resources.py:  character.score is the leaderboard, {rank: name}, read from the roster store (roster.leaderboard()) on each access, so it's always current.  Until there's a roster it's score_seed.
+    '''
+    if name == 'score':
+        import roster
+        return roster.leaderboard()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -20,7 +20,6 @@ TABLE OF CONTENTS
 
 TO DO:
     *Goes to name selection once ATT/EQP/SKL selection is complete
-    *Need a 'finish' key (spacebar?) to exit out of ATT/EQP/SKL selection
     *Give summary & (option to confirm OR go back) once finished with ATT/EQP/SKL selection
 '''
 
@@ -28,35 +27,66 @@ TO DO:
 #[0] IMPORTS & INITIALIZATIONS
 
 import os
-from blessed import Terminal
+import sys
 
 import display as dsp
 import resources as rs
 import character as ch
+import search
+import stats as st
+import tracing
 
-term = Terminal()
+#Point budgets for the three chargen screens.
+ATTRIBUTE_POINTS = 5
+EQUIPMENT_POINTS = 7
+SKILL_POINTS = 1
+
+#Keys that move the cursor through a list.  Lists longer than the pane scroll (display.list_window); PAGE UP/PAGE DOWN move a screenful, HOME/END to either end.
+VERTICAL_INPUT = ['KEY_UP', 'KEY_DOWN', 'KEY_PGUP', 'KEY_PGDOWN', 'KEY_HOME', 'KEY_END']
+
+#Keys that turn the pages of a description too tall for its pane (display.desc_pages), and which way.
+DESC_PAGE_INPUT = {']':1, '[':-1}
+
+#The key that finishes ATT/EQP/SKL selection with the character as it stands.  'q' quits without one.
+FINISH_INPUT = ' '
+
+#The range an attribute can be at game start (the range stats.py's tables cover).
+ATTRIBUTE_MIN = st.ATTRIBUTE_MIN
+ATTRIBUTE_MAX = st.ATTRIBUTE_MAX
 
 
 ###############################################################################
 #[1] GENERAL UTILITY FUNCTIONS - used in character generation screen logic.
 
-def vertical_cursor_logic(position, all_positions, attempt):
+def vertical_cursor_logic(position, all_positions, attempt, page=dsp.LIST_PAGE):
     '''
     Determines how to move the selection cursor on accepted keyboard input.
         *position: int /in/ all_positions that represents current position
-        *all_positions: list of possible positions 
+        *all_positions: range (or list) of possible positions, in order
         *attempt: recorded key press
+        *page: how far KEY_PGUP/KEY_PGDOWN move.  Unlike UP/DOWN, they stop at the ends instead of wrapping around.
+    Only the ends of all_positions are looked at, so this costs the same for any length of list.
     '''
+    first, last = all_positions[0], all_positions[-1]
     if attempt == 'KEY_UP':
-        if position == min(all_positions):
-            return max(all_positions)
+        if position == first:
+            return last
         else:
             return position-1
     if attempt == 'KEY_DOWN':
-        if position == max(all_positions):
-            return min(all_positions)
+        if position == last:
+            return first
         else:
             return position+1
+    if attempt == 'KEY_PGUP':
+        return max(position-page, first)
+    if attempt == 'KEY_PGDOWN':
+        return min(position+page, last)
+    if attempt == 'KEY_HOME':
+        return first
+    if attempt == 'KEY_END':
+        return last
+    return position
 
 def select_logic(item, remaining_points):
     '''
@@ -80,8 +110,59 @@ def select_logic(item, remaining_points):
             return False, remaining_points
 
 def list_to_range(lst):
-    #Make some code cleaner by compiling this functionality into a func
-    return list(range(len(lst)))
+    #Make some code cleaner by compiling this functionality into a func.  A range rather than a list: indexing its ends is O(1) however long the catalog.
+    return range(len(lst))
+
+def desc_page_logic(screen, options, inp):
+    '''
+    Pages through the highlighted option's description: ']' the next page, '[' the previous, stopping at either end.  Any other key goes back to the first page.
+        *screen: a screen with a .cursor into options & a .desc_page
+        *options: what the screen lists
+        *inp: recorded key press
+    Returns True if the key turned a page.
+    '''
+    step = None if inp.is_sequence else DESC_PAGE_INPUT.get(inp)
+    if step is None or not options:
+        screen.desc_page = 0
+        return False
+    pages = dsp.desc_pages(options[screen.cursor].desc)
+    screen.desc_page = min(max(screen.desc_page + step, 0), pages - 1)
+    return True
+
+def filter_logic(screen, inp):
+    '''
+    Type-ahead filtering for the equipment & skill screens (see search.py).  '/' starts typing a filter; printable keys & BACKSPACE edit it, ENTER stops typing and keeps it, ESCAPE stops typing and clears it.  UP/DOWN etc. still move through the matches while typing.
+        *screen: a screen with a .filter (search.TypeAhead)
+        *inp: recorded key press
+    Returns True if the key was taken by the filter.  When the matches change, the screen's view is narrowed and its cursor goes back to the top.
+    '''
+    typeahead = screen.filter
+    if not typeahead.typing:
+        if inp == '/':
+            typeahead.typing = True
+            return True
+        return False
+    if inp.name == 'KEY_ESCAPE':
+        typeahead.typing = False
+        typeahead.clear()
+    elif inp.name == 'KEY_ENTER':
+        typeahead.typing = False
+        return True
+    elif inp.name in ('KEY_BACKSPACE', 'KEY_DELETE'):
+        typeahead.backspace()
+    elif not inp.is_sequence and inp.isprintable() and len(inp) == 1:
+        typeahead.type(str(inp))
+    else:
+        return False
+    screen.view = typeahead.view()
+    screen.cursor_range = list_to_range(screen.view)
+    screen.cursor = 0
+    return True
+
+def takes_filter_input(screen, inp):
+    #Whether inp is for the screen's type-ahead filter (so 'q' & other letters are typed, not acted on).
+    typeahead = getattr(screen, 'filter', None)
+    return typeahead is not None and inp.name != 'KEY_TAB' and (typeahead.typing or inp == '/')
 
 
 ###############################################################################
@@ -97,14 +178,20 @@ class AttributeScreen:
         
         self.title = 'ATTRIBUTES'
         self.res_list = rs.class_init_ATT(rs.attributes_read_only)
-        self.vertical_input = ['KEY_UP', 'KEY_DOWN']
+        self.vertical_input = list(VERTICAL_INPUT)
         self.att_input = ['KEY_LEFT', 'KEY_RIGHT']
         self.accepted_input = self.vertical_input + self.att_input
         self.cursor = 0
         self.cursor_range = list_to_range(self.res_list)
+        self.desc_page = 0 #page of the highlighted description; see desc_page_logic()
+        self.preview = None #stats.Preview shared by the three screens; set by build_screens()
     def selection(self, inp):
+        #Interprets one input and draws the result.  The event loop calls update() per input & render() once per frame instead.
+        self.update(inp)
+        self.render()
+    def update(self, inp):
         '''
-        Method for attribute selection screen.
+        Method for attribute selection screen: interprets one input, without drawing.
         CALL: 
             1. At main_chargen() initial
             2. When the input 'KEY_TAB' cycles to correct tab position in screens list
@@ -119,7 +206,7 @@ class AttributeScreen:
                 *remaining_points: Points left to spend on attributes
                 *attempt: increase or decrease (KEY_RIGHT or KEY_LEFT respectively)
             NOTE: 'all_positions' is the same for all attributes. The range an attri-
-            bute can be at game start is 1 through 4 (int).  This is hardcoded.
+            bute can be at game start is ATTRIBUTE_MIN through ATTRIBUTE_MAX (int).
             NOTE: This returns a tuple for tuple assignment of 
                 (attribute's value, remaining_points) because both values are changed.
             '''
@@ -127,12 +214,12 @@ class AttributeScreen:
             no_change = (att_val, remaining_points)
             
             if attempt == 'KEY_LEFT':
-                if attribute.value == 1:
+                if attribute.value == ATTRIBUTE_MIN:
                     return no_change
                 else:
                     return (att_val-1, remaining_points+1)
             if attempt == 'KEY_RIGHT':
-                if attribute.value == 4:
+                if attribute.value == ATTRIBUTE_MAX:
                     return no_change
                 elif remaining_points == 0:
                     return no_change
@@ -142,15 +229,24 @@ class AttributeScreen:
         #If the method is called via pressing the TAB key, inp=None.  This resets cursor.
         if inp==None:
             self.cursor=0
+            self.desc_page=0
+        
+        #'[' & ']' page through a long description.
+        elif desc_page_logic(self, self.res_list, inp):
+            pass
         
         #If the method is called via pressing input in accepted_input, cursor state is saved.
         elif inp.name in self.vertical_input:
             self.cursor = vertical_cursor_logic(self.cursor, self.cursor_range, inp.name)
         elif inp.name in self.att_input:
             self.res_list[self.cursor].value, self.remaining_points =attribute_logic(self.res_list[self.cursor], self.remaining_points, inp.name)
-
-        #Display the attributes screen after changes are interpreted.
-        dsp.attributes_display(self.cursor, self.res_list, self.remaining_points)
+            if self.preview is not None:
+                self.preview.set_attribute(self.res_list[self.cursor].name, self.res_list[self.cursor].value)
+    def render(self):
+        #Display the attributes screen as the inputs so far left it.
+        dsp.attributes_display(self.cursor, self.res_list, self.remaining_points, self.desc_page)
+        if self.preview is not None:
+            dsp.preview_display(self.preview.stats())
 
 class EquipmentScreen:
     def __init__(self, remaining_points):
@@ -158,13 +254,20 @@ class EquipmentScreen:
         
         self.title = 'EQUIPMENT'
         self.res_list = rs.class_init_EQP(rs.equipment_read_only)
-        self.vertical_input = ['KEY_UP', 'KEY_DOWN']
+        self.vertical_input = list(VERTICAL_INPUT)
         self.accepted_input = self.vertical_input + ['KEY_ENTER']
+        self.filter = search.TypeAhead(self.res_list) #'/' to filter the list; see filter_logic()
+        self.view = self.filter.view() #the options shown: all of res_list, or the filter's matches.  cursor indexes this.
         self.cursor = 0
-        self.cursor_range = list_to_range(self.res_list)
+        self.cursor_range = list_to_range(self.view)
+        self.desc_page = 0
+        self.preview = None
     def selection(self, inp):
+        self.update(inp)
+        self.render()
+    def update(self, inp):
         '''
-        Method for equipment selection screen.
+        Method for equipment selection screen: interprets one input, without drawing.
         CALL: 
             1. When the input 'KEY_TAB' cycles to correct tab position in screens list
             2. When the input is not TAB and tab position is correct
@@ -174,15 +277,31 @@ class EquipmentScreen:
         #If the method is called via pressing the TAB key, inp=None.  This resets cursor.
         if inp==None:
             self.cursor=0
+            self.desc_page=0
+        
+        #Keys for the type-ahead filter narrow the view.
+        elif filter_logic(self, inp):
+            self.desc_page=0
+        
+        #'[' & ']' page through a long description.
+        elif desc_page_logic(self, self.view, inp):
+            pass
         
         #If the method is called via pressing input in accepted_input, cursor state is saved.
+        elif not self.view:
+            pass
         elif inp.name in self.vertical_input:
             self.cursor = vertical_cursor_logic(self.cursor, self.cursor_range, inp.name)
         elif inp.name == 'KEY_ENTER':
-            self.res_list[self.cursor].selected, self.remaining_points = select_logic(self.res_list[self.cursor], self.remaining_points)
-        
-        #Display the equipment screen after changes are interpreted.
-        dsp.equipment_display(self.cursor, self.res_list, self.remaining_points)
+            option = self.view[self.cursor]
+            option.selected, self.remaining_points = select_logic(option, self.remaining_points)
+            if self.preview is not None:
+                self.preview.set_item(option.name, option.selected)
+    def render(self):
+        #Display the equipment screen as the inputs so far left it.
+        dsp.equipment_display(self.cursor, self.view, self.remaining_points, self.filter.prompt(), self.desc_page)
+        if self.preview is not None:
+            dsp.preview_display(self.preview.stats())
 
 class SkillScreen:
     def __init__(self, remaining_points):
@@ -190,13 +309,20 @@ class SkillScreen:
         
         self.title = 'SKILLS'
         self.res_list = rs.class_init_SKL(rs.skills_read_only)
-        self.vertical_input = ['KEY_UP', 'KEY_DOWN']
+        self.vertical_input = list(VERTICAL_INPUT)
         self.accepted_input = self.vertical_input + ['KEY_ENTER']
+        self.filter = search.TypeAhead(self.res_list) #'/' to filter the list; see filter_logic()
+        self.view = self.filter.view() #the options shown: all of res_list, or the filter's matches.  cursor indexes this.
         self.cursor = 0
-        self.cursor_range = list_to_range(self.res_list)
+        self.cursor_range = list_to_range(self.view)
+        self.desc_page = 0
+        self.preview = None
     def selection(self, inp):
+        self.update(inp)
+        self.render()
+    def update(self, inp):
         '''
-        Method for skill selection screen.
+        Method for skill selection screen: interprets one input, without drawing.
         CALL: 
             1. When the input 'KEY_TAB' cycles to correct tab position in screens list
             2. When the input is not TAB and tab position is correct
@@ -206,22 +332,50 @@ class SkillScreen:
         #If the method is called via pressing the TAB key, inp=None.  This resets cursor.
         if inp==None:
             self.cursor=0
+            self.desc_page=0
+        
+        #Keys for the type-ahead filter narrow the view.
+        elif filter_logic(self, inp):
+            self.desc_page=0
+        
+        #'[' & ']' page through a long description.
+        elif desc_page_logic(self, self.view, inp):
+            pass
         
         #If the method is called via pressing input in accepted_input, cursor state is saved.
+        elif not self.view:
+            pass
         elif inp.name in self.vertical_input:
             self.cursor = vertical_cursor_logic(self.cursor, self.cursor_range, inp.name)
         elif inp.name == 'KEY_ENTER':
-            self.res_list[self.cursor].selected, self.remaining_points = select_logic(self.res_list[self.cursor], self.remaining_points)
-        
-        #Display the equipment screen after changes are interpreted.
-        dsp.skill_display(self.cursor, self.res_list, self.remaining_points)
-
-#Instatiate classes and compile them into a list for main()
-screen_ATT = AttributeScreen(remaining_points = 5)
-screen_EQP = EquipmentScreen(remaining_points=7)
-screen_SKL = SkillScreen(remaining_points=1)
-
-screens = [screen_ATT, screen_EQP, screen_SKL]
+            option = self.view[self.cursor]
+            option.selected, self.remaining_points = select_logic(option, self.remaining_points)
+            if self.preview is not None:
+                self.preview.set_skill(option.name, option.selected)
+    def render(self):
+        #Display the skill screen as the inputs so far left it.
+        dsp.skill_display(self.cursor, self.view, self.remaining_points, self.filter.prompt(), self.desc_page)
+        if self.preview is not None:
+            dsp.preview_display(self.preview.stats())
+
+def build_screens():
+    '''
+    Instantiates the chargen screen classes and compiles them into a list for main().  Done on demand rather than at import, so importing chargen.py has no side effects.
+    '''
+    screen_ATT = AttributeScreen(remaining_points=ATTRIBUTE_POINTS)
+    screen_EQP = EquipmentScreen(remaining_points=EQUIPMENT_POINTS)
+    screen_SKL = SkillScreen(remaining_points=SKILL_POINTS)
+    
+    #One stat preview for all three screens; each screen tells it what it changes.
+    preview = st.Preview(*cast_values(screen_ATT.res_list, screen_EQP.res_list, screen_SKL.res_list))
+    screen_ATT.preview = screen_EQP.preview = screen_SKL.preview = preview
+    
+    #Lay out every description now, rather than on the first cursor move onto it.
+    for screen in (screen_ATT, screen_EQP, screen_SKL):
+        for record in screen.res_list:
+            dsp.prewrap(record.desc)
+    
+    return [screen_ATT, screen_EQP, screen_SKL]
 
 
 ###############################################################################
@@ -230,42 +384,132 @@ screens = [screen_ATT, screen_EQP, screen_SKL]
 Primary function uses class methods & attributes for the 3 character generation tabs.  Loops between user inputs (tab > new screen; class.accepted_input > updated screen) until mechanics selection is finished.  Finally, prompts the user to input a name, and then asks them one more time to confirm all choices.
 '''
 
-def main(screens):
+#Minimum time between two renders (seconds).  Inputs that arrive in between are all applied, then drawn once.
+FRAME_TICK = 1/30
+
+def tab_logic(position, all_positions):
+    #Simple func to cycle position, an integer in all_positions. Returns new position. 
+    if position==all_positions[-1]:
+        return 0
+    return position+1
+
+class ChargenState:
     '''
-    This function uses a list of classes - each one representing a different mechanic - for character generation.  
+    The chargen screens and which one is up.  update() interprets one input; render() draws the current state.  Keeping the two apart lets the event loop apply a burst of inputs and draw only the end result.
+        *screens: A list of classes representing the core mechanics of character generation that requires user input.
+    '''
+    def __init__(self, screens):
+        self.screens = screens
+        self.tab = 0
+        self.tabs = [s.title for s in screens]
+        self.tab_range = list_to_range(self.tabs)
+        self.done = False
+        self.finished = False #True once the player finished the character (FINISH_INPUT), rather than quitting
+        self.dirty = True
+        #Call chargen screen in tab position 0, with no value for input key.
+        screens[self.tab].update(None)
     
-    *screens: A list of classes representing the core mechanics of character generation that requires user input.
+    @tracing.traced('update')
+    def update(self, inp):
+        #interpret one input: finish on FINISH_INPUT, quit on 'q' (or None: the input has ended, e.g. a hang-up), cycle tabs if inp==TAB, else call screen logic (which includes '[' & ']' for description pages).  Keys typed into a filter go to the screen, 'q' & SPACE included.
+        if inp is None:
+            self.done = True
+        elif takes_filter_input(self.screens[self.tab], inp):
+            self.screens[self.tab].update(inp)
+            self.dirty = True
+        elif inp == 'q':
+            self.done = True
+        elif inp == FINISH_INPUT:
+            self.done = self.finished = True
+        elif inp.name in self.screens[self.tab].accepted_input or (not inp.is_sequence and inp in DESC_PAGE_INPUT):
+            self.screens[self.tab].update(inp)
+            self.dirty = True
+        elif inp.name == 'KEY_TAB':
+            self.tab = tab_logic(self.tab, self.tab_range)
+            self.screens[self.tab].update(None)
+            self.dirty = True
+    
+    @tracing.traced('render')
+    def render(self):
+        #batch() so the screen and the header go out as a single diffed write
+        with dsp.get_screen().batch():
+            self.screens[self.tab].render()
+            dsp.tab_header(self.tabs, self.tab)
+        self.dirty = False
+
+async def drive(state, keys, tick=FRAME_TICK, render=None, drain=None):
+    '''
+    Applies inputs from keys (an asyncio.Queue) to state until it's done.  Every queued input is applied with state.update(), and the result is rendered at most once per tick, so a held key or a burst of input over a slow connection costs one redraw per frame, not one per key.
+        render: draws the state (default: state.render)
+        drain: coroutine function awaited after every render, e.g. a socket's drain(): the next frame waits until the last one has gone out, and inputs meanwhile are folded into it
     '''
-    tab = 0
-    tabs = [s.title for s in screens]
-    tab_range = list_to_range(tabs)
+    import asyncio #by the time a loop is running it's already imported; see main()
+    loop = asyncio.get_running_loop()
+    render = render or state.render
+    render()
+    if drain is not None:
+        await drain()
+    next_frame = loop.time() + tick
+    while not state.done:
+        state.update(await keys.get())
+        #wait out the rest of the frame, then apply everything that came in meanwhile
+        delay = next_frame - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        while not keys.empty() and not state.done:
+            state.update(keys.get_nowait())
+        if state.dirty and not state.done:
+            render()
+            if drain is not None:
+                await drain()
+            next_frame = loop.time() + tick
+
+async def event_loop(state, term, tick=FRAME_TICK, recorder=None):
+    '''
+    Runs chargen on the local terminal until 'q'.  Keys are read as soon as the terminal has them (the loop never blocks on inkey()) and handed to drive().
+        recorder: if given, every key is also passed to recorder.record() (see replay.py)
+    '''
+    import asyncio
+    loop = asyncio.get_running_loop()
+    keys = asyncio.Queue()
+    fd = sys.stdin.fileno()
     
-    def tab_logic(position, all_positions):
-        #Simple func to cycle position, an integer in all_positions. Returns new position. 
-        if position==all_positions[-1]:
-            return 0
-        return position+1
+    def read_keys():
+        #Called whenever stdin is readable: take every key that has arrived.
+        while True:
+            with tracing.span('inkey'):
+                inp = term.inkey(timeout=0)
+            if not inp:
+                break
+            if recorder is not None:
+                recorder.record(inp)
+            keys.put_nowait(inp)
     
-    with term.cbreak(), term.hidden_cursor():
-        #Call chargen screen in tab position 0, with no value for input key.
-        screens[tab].selection(None)
-        dsp.tab_header(tabs, tab)
-        inp = term.inkey()
-        
-        while inp != 'q':
-            #interpret first input: cycle tabs if inp==TAB, else call screen logic
-            if inp.name in screens[tab].accepted_input:
-                screens[tab].selection(inp)
-            if inp.name == 'KEY_TAB':
-                tab = tab_logic(tab, tab_range)
-                screens[tab].selection(None)
-            dsp.tab_header(tabs, tab)
-            inp = term.inkey()
+    loop.add_reader(fd, read_keys)
+    try:
+        await drive(state, keys, tick)
+    finally:
+        loop.remove_reader(fd)
+
+def main(screens, recorder=None):
+    '''
+    This function uses a list of classes - each one representing a different mechanic - for character generation.  
     
+    *screens: A list of classes representing the core mechanics of character generation that requires user input.
+    recorder: optional replay.Recorder; logs every key taken
+    Returns True if the player finished the character, False if they quit.
+    '''
+    #asyncio is imported here rather than at the top, like blessed: it would add most of the game's import time, and importing chargen (e.g. for replay or the benchmarks) shouldn't pay for it.
+    import asyncio
+    term = dsp.get_term()
+    state = ChargenState(screens)
+    with term.cbreak(), term.hidden_cursor():
+        asyncio.run(event_loop(state, term, recorder=recorder))
     
     os.system('clear')
     print('\n\n\n        Thanks for playing GLADIATOR!  I hope you had a good time.')
     print('             [game by Joan Kovacs]\n\n\n')
+    return state.finished
     
 
 ###############################################################################
@@ -318,18 +562,37 @@ def cast_values(ATT, EQP, SKL):
     
     return attributes, inventory, skills
 
+def run(recorder=None):
+    '''
+    Runs character generation start to finish and casts the results into character.py.  This is the chargen entry point (main.py calls it; so does `python chargen.py`).
+        recorder: optional replay.Recorder; logs every key taken
+    Returns (screens, finished): finished is False if the player quit with 'q' (or the input ended) rather than finishing the character, so there's nothing to keep.
+    With GLADIATOR_TRACE=<path> set, every keypress is traced (tracing.py) and the spans are written to path at the end, however the session ends: a crash or Ctrl-C keeps the trace that led up to it.
+    '''
+    trace_path = os.environ.get('GLADIATOR_TRACE')
+    if trace_path:
+        tracing.enable()
+    try:
+        screens = build_screens()
+        finished = main(screens, recorder)
+    finally:
+        if trace_path:
+            tracing.disable()
+            tracing.dump(trace_path)
+    
+    screen_ATT, screen_EQP, screen_SKL = screens
+    ch.attributes, ch.inventory, ch.skills = cast_values(screen_ATT.res_list, screen_EQP.res_list, screen_SKL.res_list)
+    return screens, finished
+
 ###############################################################################
 #[X] TEST CODE
 
-
-main(screens)
-
-
-#Finalization tests
-ch.attributes, ch.inventory, ch.skills = cast_values(screen_ATT.res_list, screen_EQP.res_list, screen_SKL.res_list)
-
-print(f'Final attributes: {ch.attributes}')
-print(f'Final inventory:  {ch.inventory}')
-print(f'Final skills learned:  {ch.skills}')
+if __name__ == '__main__':
+    run()
+    
+    #Finalization tests
+    print(f'Final attributes: {ch.attributes}')
+    print(f'Final inventory:  {ch.inventory}')
+    print(f'Final skills learned:  {ch.skills}')
 
 
@@ -0,0 +1,200 @@
+'''
+           COMBAT.PY
+=====================================
+Resolves duels between characters.  Fighters are held as NumPy arrays (one row per fighter) and every round of every duel in a batch is resolved with whole-array operations, so simulating many duels costs a few array ops per round instead of a Python loop per fighter.
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] FIGHTER ENCODING: builds (the chargen.cast_values shape) > arrays
+    [2] DUEL RESOLUTION
+    [3] MAIN
+
+THE RULES (per round; both fighters act at once):
+    Health: BASE_HEALTH + HEALTH_PER_FOR * FOR.
+    Hit chance: HIT_BASE + HIT_PER_POINT * ((REF + hit) - (foe's REF + dodge)) + HIT_PER_WIT * (WIT - foe's WIT), clipped to HIT_MIN..HIT_MAX.  ("Reflex determines how hard it is to hit you, and also your hit chance")
+    Damage: best weapon 'damage' (UNARMED_DAMAGE if none) + every other item's & skill's 'damage' + a 0..DAMAGE_ROLL roll - foe's 'armor', at least 1.
+    Pain: a fighter who is hit is staggered & loses their next attack with chance PAIN_BASE - PAIN_PER_POINT * (FOR + pain).  ("Fortitude determines your resistance to pain")
+    Crowd favor: every landed hit earns the attacker MOX + favor.  ("Crowds love a gladiator with moxie!")
+    The duel ends when someone drops.  If both drop in the same round, or MAX_ROUNDS pass, the fighter with more health left wins, then the one with more favor, then fighter A.
+
+Equipment & skill modifiers come from the catalogs (resources.COMBAT_MODIFIERS); an item or skill without a modifier has 0.
+The numbers above live in stats.py, which also precomputes the derived stats (health, accuracy, ...) & the hit/stagger chances these rules give; fighters are encoded straight into derived stats and duels only look them up.
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import numpy as np
+
+import stats
+from stats import (ATTRIBUTES, REF, FOR, WIT, MOX, MODIFIERS, DAMAGE, ARMOR, HIT, DODGE, PAIN, FAVOR,
+                   BASE_HEALTH, HEALTH_PER_FOR, HIT_BASE, HIT_PER_POINT, HIT_PER_WIT, HIT_MIN, HIT_MAX,
+                   UNARMED_DAMAGE, DAMAGE_ROLL, PAIN_BASE, PAIN_PER_POINT, MAX_ROUNDS)
+
+
+###############################################################################
+#[1] FIGHTER ENCODING
+
+class Fighters:
+    '''
+    A batch of fighters as arrays, one row per fighter:
+        attributes: (n, 4) int8, columns in ATTRIBUTES order
+        equipment, skills: (n, words) uint64 bitsets, as many 64-bit words as the catalog needs; bit i (bit i % 64 of word i // 64) = entry i of the catalog
+        mods: (n, 6) int16 total modifiers, columns in MODIFIERS order.  Damage is the best weapon plus every other damage modifier; everything else is summed.
+        stats: (n, 8) int32 derived stats, columns in stats.STATS order
+    '''
+    def __init__(self, attributes, equipment, skills, mods, stats):
+        self.attributes = attributes
+        self.equipment = equipment
+        self.skills = skills
+        self.mods = mods
+        self.stats = stats
+
+    def __len__(self):
+        return len(self.attributes)
+
+    def take(self, index):
+        #A new batch with the rows at index (an int array), e.g. to pair fighters up for duels.
+        return Fighters(self.attributes[index], self.equipment[index], self.skills[index], self.mods[index], self.stats[index])
+
+def _words(count):
+    #64-bit words in a bitset of count entries
+    return max(1, -(-count // 64))
+
+def _bitsets(masks, count):
+    #Python int bitmasks > (n, words) uint64, however many entries the catalog has
+    size = 8 * _words(count)
+    data = b''.join(mask.to_bytes(size, 'little') for mask in masks)
+    return np.frombuffer(data, dtype='<u8').reshape(-1, size // 8).copy()
+
+def _bits(masks, count):
+    #(n, words) uint64 bitsets > (n, count) bool
+    masks = np.ascontiguousarray(masks, dtype='<u8')
+    return np.unpackbits(masks.view(np.uint8), axis=1, count=count, bitorder='little').astype(bool)
+
+def combine_modifiers(equipment, skills, tables=None):
+    '''
+    Totals the modifiers for (n, words) equipment & skill bitsets.  Returns (n, 6) int16.
+        tables: stats.StatTables (default: the current ones)
+    '''
+    arrays = (tables or stats.tables()).arrays()
+    eqp_mods, skl_mods, weapons = arrays['eqp_mods'], arrays['skl_mods'], arrays['weapons']
+    eqp = _bits(equipment, len(eqp_mods))
+    skl = _bits(skills, len(skl_mods))
+    mods = eqp.astype(np.int16) @ eqp_mods + skl.astype(np.int16) @ skl_mods
+
+    #weapons don't stack: only the best one counts.  Other items' damage adds on, as skills' does.
+    weapon = np.where(eqp & weapons, eqp_mods[:, DAMAGE], 0).max(axis=1, initial=0)
+    other = (eqp & ~weapons).astype(np.int16) @ eqp_mods[:, DAMAGE] + skl.astype(np.int16) @ skl_mods[:, DAMAGE]
+    mods[:, DAMAGE] = np.maximum(weapon, UNARMED_DAMAGE) + other
+    return mods.astype(np.int16)
+
+def derive_stats(attributes, mods, tables=None):
+    '''
+    Derived stats for (n, 4) attributes & (n, 6) modifiers: the attribute part is one row of the precomputed 256-row table, the modifiers are added on.  Returns (n, 8) int32.
+    '''
+    base = (tables or stats.tables()).arrays()['base']
+    codes = ((attributes.astype(np.int32) - stats.ATTRIBUTE_MIN) * stats.LEVELS ** np.arange(len(ATTRIBUTES))).sum(axis=1)
+    derived = base[codes].copy()
+    for modifier, stat in stats.MODIFIER_STATS.items():
+        derived[:, stat] += mods[:, modifier]
+    derived[:, stats.DAMAGE_STAT] += mods[:, DAMAGE]
+    return derived
+
+def encode_fighters(builds, tables=None):
+    '''
+    Encodes an iterable of builds, each (attributes, inventory, skills) as returned by chargen.cast_values(), into a Fighters batch.
+        tables: stats.StatTables (default: the current ones)
+    '''
+    tables = tables or stats.tables()
+    attributes = []
+    equipment = []
+    skills = []
+    for att, inventory, learned in builds:
+        attributes.append([att[a] for a in ATTRIBUTES])
+        equipment.append(sum(1 << tables.equipment[name] for name in inventory))
+        skills.append(sum(1 << tables.skills[name] for name in learned))
+    attributes = np.array(attributes, dtype=np.int8).reshape(-1, len(ATTRIBUTES))
+    equipment = _bitsets(equipment, len(tables.equipment))
+    skills = _bitsets(skills, len(tables.skills))
+    mods = combine_modifiers(equipment, skills, tables)
+    return Fighters(attributes, equipment, skills, mods, derive_stats(attributes, mods, tables))
+
+
+###############################################################################
+#[2] DUEL RESOLUTION
+
+def resolve_duels(a, b, rng=None, max_rounds=MAX_ROUNDS, tables=None):
+    '''
+    Fights a[i] against b[i] for every i at once (a & b are Fighters batches of the same length).
+        rng: numpy Generator (or seed) for the rolls; pass one to make results reproducible.
+        tables: the stats.StatTables a & b were encoded with (default: the current ones)
+    Returns a dict of arrays, one entry per duel:
+        winner: 0 if a won, 1 if b won
+        rounds: rounds fought
+        favor: (n, 2) crowd favor earned by a and b
+        health: (n, 2) health left
+    '''
+    rng = np.random.default_rng(rng)
+    tables = tables or stats.tables()
+    arrays = tables.arrays()
+    n = len(a)
+    own = np.stack([a.stats, b.stats], axis=1)  #(n, 2, stats)
+    foe = own[:, ::-1]
+
+    #Everything that doesn't change during a duel is looked up once, up front.
+    hit_chance = arrays['hit'][own[..., stats.ACCURACY] - foe[..., stats.EVASION] + tables.hit_offset,
+                               own[..., stats.WIT_STAT] - foe[..., stats.WIT_STAT] + tables.wit_offset]
+    base_damage = own[..., stats.DAMAGE_STAT] - foe[..., stats.ARMOR_STAT]
+    stagger_chance = arrays['stagger'][own[..., stats.RESISTANCE] - tables.resistance_offset]
+    favor_per_hit = own[..., stats.FAVOR_STAT]
+
+    health = own[..., stats.HEALTH].astype(np.int32)
+    favor = np.zeros((n, 2), dtype=np.int32)
+    staggered = np.zeros((n, 2), dtype=bool)
+    rounds = np.zeros(n, dtype=np.int32)
+
+    #Only the duels still going are rolled each round.
+    active = np.arange(n)
+    for round_no in range(1, max_rounds + 1):
+        if not len(active):
+            break
+        m = len(active)
+        hits = (rng.random((m, 2)) < hit_chance[active]) & ~staggered[active]
+        damage = np.maximum(base_damage[active] + rng.integers(0, DAMAGE_ROLL + 1, (m, 2)), 1) * hits
+
+        #a hit on fighter k is damage[:, 1-k]
+        taken = damage[:, ::-1]
+        health[active] -= taken
+        favor[active] += favor_per_hit[active] * hits
+        staggered[active] = (taken > 0) & (rng.random((m, 2)) < stagger_chance[active])
+        rounds[active] = round_no
+
+        active = active[(health[active] > 0).all(axis=1)]
+
+    #B wins if it has more health left, or the same health and more favor.
+    diff_health = health[:, 1] - health[:, 0]
+    diff_favor = favor[:, 1] - favor[:, 0]
+    winner = ((diff_health > 0) | ((diff_health == 0) & (diff_favor > 0))).astype(np.int8)
+    return {'winner': winner, 'rounds': rounds, 'favor': favor, 'health': health}
+
+
+###############################################################################
+#[3] MAIN
+
+if __name__ == '__main__':
+    import time
+    from itertools import islice
+    import builds
+
+    sample = list(islice(builds.enumerate_builds(), 0, None, 20)) #every 20th build, across the whole space
+    fighters = encode_fighters(sample)
+    rng = np.random.default_rng(0)
+    duels = 200000
+    a = fighters.take(rng.integers(0, len(fighters), duels))
+    b = fighters.take(rng.integers(0, len(fighters), duels))
+
+    start = time.perf_counter()
+    result = resolve_duels(a, b, rng)
+    elapsed = time.perf_counter() - start
+    print(f'{duels:,} duels in {elapsed:.3f}s: {duels / elapsed:,.0f} duels/sec, mean {result["rounds"].mean():.1f} rounds')
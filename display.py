@@ -6,8 +6,9 @@ Contains data & functions for composing & displaying the data/GUI for the game.
 TABLE OF CONTENTS
     [0] IMPORTS & INITIALIZATIONS
     [1] DISPLAY FRAME: coords and loads the ASCII text file into runtime as a variable
-    [2] GENERAL UTILITY FUNCTIONS: Used for more than one screen
-    [3] SCREEN FUNCTIONS: Used for only one specific screen
+    [2] RENDER BACKENDS & SCREEN BUFFER: where output goes (terminal, in-memory cells, nowhere) and the double-buffered cell grid that only writes changed cells
+    [3] GENERAL UTILITY FUNCTIONS: Used for more than one screen, including compiled screen templates (compile_template)
+    [4] SCREEN FUNCTIONS: Used for only one specific screen
     [X] JUNK CODE: Various bits and pieces and materials that were replaced/revised.
 
 
@@ -15,12 +16,16 @@ TABLE OF CONTENTS
 
 ############################################################################################
 
+import io
 import os
-from blessed import Terminal
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from heapq import heapify, heappop, heappush
+import re
 from math import floor
 from statistics import mean
 
-term = Terminal()
+import tracing
 
 ############################################################################################
 
@@ -32,14 +37,362 @@ DISPLAY_COORDS = {
     'body_max':{'width':53, 'height':20},
     'footnote':{'x':14, 'y':34},
     'footnote_max':{'width':53, 'height':1},
+    'preview':{'x':40, 'y':27},
+    'preview_max':{'width':26, 'height':6},
 }
 
+#limits for each pane when print_pipeline splits the body into two
+HALF_BODY_MAX = {'width':floor(DISPLAY_COORDS['body_max']['width']/2), 'height':DISPLAY_COORDS['body_max']['height']}
 
-#load in display frame so that the file isn't continuously read
-DISPLAY_FRAME = []
-with open('display_frame_tall.txt', 'r') as f:
-    for line in f.read().splitlines():
-        DISPLAY_FRAME.append(line)            
+#limits for chargen's description pane: the right pane above the stat preview
+DESC_MAX = {'width':HALF_BODY_MAX['width'], 'height':HALF_BODY_MAX['height'] - DISPLAY_COORDS['preview_max']['height']}
+
+
+#The display frame file lives next to this module, so the game can be launched from any directory.
+FRAME_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'display_frame_tall.txt')
+
+@lru_cache(maxsize=None)
+def load_frame(path=FRAME_PATH):
+    '''
+    Loads the display frame on first use so that the file isn't continuously read (and isn't read at all on import).  Returns a tuple of lines; DISPLAY_FRAME is a list copy of it.
+    '''
+    with open(path, 'r', encoding='utf-8') as f:
+        return tuple(f.read().splitlines())
+
+############################################################################################
+'''RENDER BACKENDS & SCREEN BUFFER
+Everything display.py draws goes: screen function > ScreenBuffer (composes & diffs) > backend.write().  Swap the backend with set_backend() to render without a TTY:
+    TerminalBackend: the real terminal (default).
+    BufferBackend: headless; interprets the written sequences into an in-memory cell grid that can be snapshotted.
+    NullBackend: headless; throws output away and only counts it.
+The headless backends use a styled xterm-256color terminal regardless of where the process is running, so their output & snapshots are deterministic.
+
+The ScreenBuffer replaces the old clear-and-repaint approach (os.system('clear') + reprinting DISPLAY_FRAME on every keypress).  Screen functions compose into the back buffer; flush() compares it against the front buffer (what is currently painted on the terminal) and writes only the cells that changed, as one buffered write.
+'''
+
+#CSI sequences (styles, moves) and charset selects; blessed's split_seqs is far too slow to run on every composed line.
+ESCAPE_SEQ = re.compile(r'(\x1b\[[0-9;?]*[A-Za-z]|\x1b[()][A-Za-z0-9])')
+
+@lru_cache(maxsize=None)
+def char_width(char):
+    #Columns a character takes on screen: 2 for wide (e.g. CJK) glyphs, 0 for combining marks, 1 otherwise.
+    from wcwidth import wcwidth #imported on first use, like blessed.  A direct dependency (requirements.txt), not just blessed's.
+    width = wcwidth(char)
+    return 1 if width < 0 else width
+
+def text_width(text):
+    '''
+    Columns a string takes on screen: escape sequences count as zero, wide glyphs as two.
+    '''
+    if '\x1b' in text:
+        text = ESCAPE_SEQ.sub('', text)
+    if text.isascii():
+        return len(text)
+    return sum(map(char_width, text))
+
+def new_terminal(**kwargs):
+    #blessed is imported here rather than at the top: it is most of the import time of the whole game.
+    from blessed import Terminal
+    return Terminal(**kwargs)
+
+def headless_terminal():
+    #A styled terminal that never touches the real stdout.
+    return new_terminal(kind='xterm-256color', stream=io.StringIO(), force_styling=True)
+
+class TerminalBackend:
+    '''
+    Writes straight to the terminal's stream.
+        term: blessed Terminal.  Defaults to a new Terminal() on stdout.
+    '''
+    def __init__(self, term=None):
+        self.term = term if term is not None else new_terminal()
+        self.bytes_written = 0
+        self.writes = 0
+    
+    def write(self, data):
+        self.term.stream.write(data)
+        self.term.stream.flush()
+        self.bytes_written += len(data.encode())
+        self.writes += 1
+
+class NullBackend(TerminalBackend):
+    '''
+    Discards everything written; only keeps the byte & write counts.  For throughput benchmarks.
+    '''
+    def __init__(self):
+        super().__init__(headless_terminal())
+    
+    def write(self, data):
+        self.bytes_written += len(data.encode())
+        self.writes += 1
+
+class BufferBackend(TerminalBackend):
+    '''
+    Headless in-memory terminal.  Interprets the move, clear & style sequences written by the ScreenBuffer into a grid of (char, style) cells, so what would be on screen can be checked without a TTY.
+        width, height: grid dimensions; default to fit DISPLAY_FRAME.
+    '''
+    def __init__(self, width=None, height=None):
+        super().__init__(headless_terminal())
+        self.width = width or max(map(text_width, load_frame()))
+        self.height = height or len(load_frame())
+        self.cells = self._blank()
+        self.x = self.y = 0
+        self.style = ''
+    
+    def _blank(self):
+        return [[(' ', '')] * self.width for i in range(self.height)]
+    
+    def write(self, data):
+        self.bytes_written += len(data.encode())
+        self.writes += 1
+        for seg in ESCAPE_SEQ.split(data):
+            if not seg:
+                continue
+            if seg[0] != '\x1b':
+                row = self.cells[self.y] if self.y < self.height else None
+                for char in seg:
+                    w = char_width(char)
+                    if row is not None and self.x < self.width:
+                        if w == 0 and self.x > 0:
+                            row[self.x-1] = (row[self.x-1][0] + char, row[self.x-1][1])
+                            continue
+                        row[self.x] = (char, self.style)
+                        if w == 2 and self.x + 1 < self.width:
+                            row[self.x+1] = ('', self.style)
+                    self.x += w
+            elif seg[-1] == 'H':
+                args = seg[2:-1].split(';')
+                self.y = int(args[0]) - 1 if args[0] else 0
+                self.x = int(args[1]) - 1 if len(args) > 1 else 0
+            elif seg[-1] == 'J':
+                self.cells = self._blank()
+            elif seg[-1] == 'm':
+                self.style = '' if seg in ('\x1b[m', '\x1b[0m') else self.style + seg
+    
+    def snapshot(self, styled=False):
+        '''
+        Returns the screen as a list of strings with trailing spaces stripped.  With styled=True the style sequences are kept inline (normalized, so equal screens give equal snapshots).
+        '''
+        lines = []
+        for row in self.cells:
+            line = ''
+            style = ''
+            for char, cell_style in row:
+                if styled and cell_style != style:
+                    line += self.term.normal + cell_style if style else cell_style
+                    style = cell_style
+                line += char
+            if style:
+                line += self.term.normal
+            lines.append(line.rstrip(' '))
+        return lines
+
+#Memoized parse_cells, one per set of reset sequences: every ScreenBuffer styling for the same kind of terminal (e.g. all of a server's sessions) shares one cache.
+CELL_CACHES = {}
+
+def parse_cells(text, resets):
+    '''
+    Converts a (possibly styled) string into a list of (char, style) cells.  resets are the sequences that clear the style.  ScreenBuffers call it through a CELL_CACHES entry: the same lines get composed frame after frame.  A wide glyph takes its own cell plus a ('', style) placeholder for the second column; zero-width marks join the previous cell.
+    '''
+    if '\x1b' not in text and text.isascii():
+        return [(char, '') for char in text]
+    cells = []
+    style = ''
+    for seg in ESCAPE_SEQ.split(text):
+        if not seg:
+            continue
+        if seg[0] == '\x1b':
+            style = '' if seg in resets else style + seg
+        elif seg.isascii():
+            cells.extend((char, style) for char in seg)
+        else:
+            for char in seg:
+                w = char_width(char)
+                if w == 0 and cells:
+                    cells[-1] = (cells[-1][0] + char, cells[-1][1])
+                else:
+                    cells.append((char, style))
+                    if w == 2:
+                        cells.append(('', style))
+    return cells
+
+class ScreenBuffer:
+    '''
+    Double-buffered model of the terminal.  Each cell is a (char, style) tuple, where style is the concatenated escape sequences that were active when the char was composed ('' for plain text).
+        backend: where flush() writes to; its term is used for the move/normal sequences.
+        frame: list of strings; the static background that reset() restores.
+    '''
+    #Unchanged cells between two changed runs are rewritten rather than jumped over with a move sequence when the gap is this short (a move_xy is ~8 bytes).
+    run_gap = 6
+    
+    def __init__(self, backend, frame):
+        self.backend = backend
+        self.term = term = backend.term
+        self.resets = frozenset(ESCAPE_SEQ.findall(term.normal)) | {'\x1b[m', '\x1b[0m'}
+        if self.resets not in CELL_CACHES:
+            CELL_CACHES[self.resets] = lru_cache(maxsize=4096)(partial(parse_cells, resets=self.resets))
+        self._cells = CELL_CACHES[self.resets]
+        self.width = max(map(text_width, frame))
+        self.height = len(frame)
+        self.blank = [self._cells(line + ' ' * (self.width - text_width(line))) for line in frame]
+        self.back = [row[:] for row in self.blank]
+        self.front = None #None until the first flush; forces a full paint.
+        self._depth = 0
+        self.bases = {} #compiled screen templates' backgrounds, see base()
+    
+    def reset(self, base=None):
+        #Restores the back buffer to the bare display frame, or to base (rows of cells, from base()).
+        self.back = [row[:] for row in (base or self.blank)]
+    
+    def put(self, x, y, text):
+        #Composes text into the back buffer at x, y.  Anything past the right edge is dropped.
+        self._compose(self.back, x, y, text)
+    
+    def _compose(self, rows, x, y, text):
+        if not 0 <= y < self.height:
+            return
+        row = rows[y]
+        cells = self._cells(text)[:max(self.width - x, 0)]
+        row[x:x+len(cells)] = cells
+    
+    def base(self, key, statics):
+        '''
+        The display frame with statics ((x, y, text) tuples) drawn in, as rows of cells for reset().  Built once per key for this screen, so static parts of a layout cost nothing per frame.
+        '''
+        rows = self.bases.get(key)
+        if rows is None:
+            rows = [row[:] for row in self.blank]
+            for x, y, text in statics:
+                self._compose(rows, x, y, text)
+            self.bases[key] = rows
+        return rows
+    
+    def _runs(self, new, old):
+        #Yields (start, end) spans of cells that differ between two rows, merging spans separated by short gaps.
+        start = end = None
+        for i, (a, b) in enumerate(zip(new, old)):
+            if a != b:
+                if start is None:
+                    start = i
+                elif i - end > self.run_gap:
+                    yield start, end
+                    start = i
+                end = i + 1
+        if start is not None:
+            yield start, end
+    
+    @tracing.traced('diff')
+    def render(self, full=False):
+        '''
+        Returns the escape sequence string that brings the terminal from the front buffer to the back buffer, and marks the back buffer as painted.  full=True repaints every cell (what the old clear-and-repaint amounted to).
+        '''
+        out = []
+        style = ''
+        if full or self.front is None:
+            out.append(self.term.home + self.term.clear)
+            old_rows = [[None] * self.width for row in self.back]
+        else:
+            old_rows = self.front
+        
+        for y, (new, old) in enumerate(zip(self.back, old_rows)):
+            if new == old:
+                continue
+            for start, end in self._runs(new, old):
+                if new[start][0] == '' and start > 0:
+                    start -= 1 #don't start a run on the right half of a wide glyph
+                out.append(self.term.move_xy(start, y))
+                for char, cell_style in new[start:end]:
+                    if cell_style != style:
+                        out.append(self.term.normal + cell_style)
+                        style = cell_style
+                    out.append(char)
+        if style:
+            out.append(self.term.normal)
+        
+        self.front = [row[:] for row in self.back]
+        return ''.join(out)
+    
+    def flush(self, full=False):
+        #Writes the changes in a single write.  Deferred while inside batch().
+        if self._depth:
+            return
+        data = self.render(full)
+        if data:
+            with tracing.span('write'):
+                self.backend.write(data)
+    
+    @contextmanager
+    def batch(self):
+        '''
+        Groups several screen functions into one flush, e.g. a chargen screen + tab_header for one keypress:
+            with dsp.get_screen().batch():
+                screens[tab].selection(inp)
+                dsp.tab_header(tabs, tab)
+        '''
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+        self.flush()
+
+#Compiled tab headers, keyed on the tuple of tab names.  Cleared by set_backend() since the highlight is terminal-specific.
+TAB_HEADERS = {}
+
+def set_backend(new_backend):
+    '''
+    Routes all display output through new_backend (see the backend classes above).  Rebinds the module's term & screen, so styles are generated for the backend's terminal and the next flush is a full paint.
+    '''
+    global backend, term, screen
+    backend = new_backend
+    term = backend.term
+    screen = ScreenBuffer(backend, load_frame())
+    TAB_HEADERS.clear()
+    return screen
+
+@contextmanager
+def use_screen(new_screen):
+    '''
+    Routes display output to new_screen (a ScreenBuffer) for the duration of the with block, then puts the previous screen back.  Lets one process drive many screens, e.g. the server's screen per player: the screen functions draw to whichever screen is current.
+    Unlike set_backend(), nothing is cleared, so compiled tab headers & layouts stay shared between screens.  Every screen must style for the same kind of terminal.
+    '''
+    global backend, term, screen
+    saved = {name:globals()[name] for name in ('backend', 'term', 'screen') if name in globals()}
+    backend, term, screen = new_screen.backend, new_screen.term, new_screen
+    try:
+        yield new_screen
+    finally:
+        for name in ('backend', 'term', 'screen'):
+            if name in saved:
+                globals()[name] = saved[name]
+            else:
+                globals().pop(name, None)
+
+#Per-span counters for tracing.py: bytes sent to the current backend, and layout cache hits & misses.
+tracing.counter('bytes', lambda: globals()['backend'].bytes_written if 'backend' in globals() else 0)
+tracing.counter('layout_hits', lambda: _layout.cache_info().hits)
+tracing.counter('layout_misses', lambda: _layout.cache_info().misses)
+
+def get_screen():
+    #The current ScreenBuffer.  The first call (with no set_backend() before it) opens the real terminal.
+    if 'screen' not in globals():
+        set_backend(TerminalBackend())
+    return screen
+
+def get_term():
+    #The blessed Terminal the current backend styles for.
+    return get_screen().term
+
+def __getattr__(name):
+    '''
+    Lazy module attributes, so importing display.py has no side effects:  dsp.term, dsp.screen & dsp.backend open the terminal on first access, dsp.DISPLAY_FRAME reads the frame file.
+    '''
+    if name in ('term', 'screen', 'backend'):
+        get_screen()
+        return globals()[name]
+    if name == 'DISPLAY_FRAME':
+        return list(load_frame())
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 ############################################################################################
 '''GENERAL UTILITY FUNCTIONS
@@ -52,62 +405,66 @@ def cleanify(string):
     '''
     return string.capitalize().replace('_', ' ')
 
-def wrap_text(data, limits):
+LAYOUT_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _layout(mode, data, width, height):
+    '''
+    Bounded LRU cache shared by wrap_text, v_justify & h_justify, keyed on (justification mode, text, limits).  data is the text to wrap or a tuple of lines; returns a tuple so cached layouts can't be mutated by callers.
+    '''
+    if mode == 'wrap':
+        return _wrap_pages(data, width, height)
+    if mode == 'v_just':
+        return tuple(_v_justify(height, list(data)))
+    if mode == 'h_just':
+        return tuple(_h_justify(width, list(data)))
+    raise ValueError(f'Unknown layout mode: {mode}')
+
+def layout_cache_info():
+    #Hit/miss counters for the layout cache: (hits, misses, maxsize, currsize)
+    return _layout.cache_info()
+
+def layout_cache_clear():
+    _layout.cache_clear()
+
+#The last row of every page of a paginated description.  chargen turns the pages with '[' & ']' (chargen.DESC_PAGE_INPUT).
+PAGE_MARKER = ' (page {page}/{pages}  [ ])'
+
+#The smallest area wrap_text lays out, in columns of text (a box's width less 2) & rows: a word too wide for a line is hyphenated into chunks of at least one character plus '-', and each page of a long text needs a row of text above its PAGE_MARKER.
+WRAP_MIN_WIDTH = 3
+WRAP_MIN_HEIGHT = 2
+
+def wrap_text(data, limits, page=0):
     '''
     Accepts a longer string and returns a wrapped string.
     Wrap text is mutually exclusive with v_just and h_just at the moment, and prints a single block of wrapped text in a frame that's slightly smaller than the maximum bounding limits.  Because of how print_pipeline by convention expects a list for data_group_n ['assembled'] but that this may not parse later with the specific assembly functions, this function will check to see if it is being passed a string or a list.  If it is a list, it expects a one-item list and grabs the first item from it.
     
-    DANGER: if any word exceeds the limit of width and is not broken by a space, this function cannot work.
+    Words wider than the pane are hyphenated across lines.  Text taller than the pane is split into pages (see wrap_pages); page picks which one is returned and is clamped to the last page.
+    '''
+    pages = wrap_pages(data, limits)
+    return list(pages[min(page, len(pages)-1)])
+
+def wrap_pages(data, limits):
+    '''
+    Returns every page of wrapped text as a tuple of tuples of lines.  Widths are measured on screen (escape sequences are zero width, wide glyphs are two), and each page is at most limits['height'] lines.
+    Raises ValueError for limits too small to wrap into (see WRAP_MIN_WIDTH & WRAP_MIN_HEIGHT).
     '''
     if type(data) == list:
         data = data[0]
-    
-    #establishes function-specific variables for the wrap process
-    height = limits['height']- 2
-    width = limits['width'] - 2
-    data = data.split()
-    
-    #Safety check: aborts function early if nonfunctional parameters are reached.
-    for word in data:
-        if len(word) >= width-1:
-            return ['ERROR: WORD IN TEXT','EXCEEDS WIDTH LIMIT.']
-    
-    def line_assemble(data):
-        #puts together each line for the wrapped text
-        string = ''
-        while len(string) <= width:
-            #send empty strings home
-            if data == []:
-                return string, data
-            
-            #catches overflow and ensures end spaces aren't butting out words
-            if len(string + data[0]) == width:
-                string+= data.pop(0)
-                return string, data
-            if len(string + data[0]) > width:
-                return string, data
-            
-            string += data.pop(0) + ' '
-        return string, data
-    
-    refactored = []
-    while data != []:
-        newline, data = line_assemble(data)
-        refactored.append(newline)
-
-    
-    #finally, h&v justify the new list to be properly set forward
-    y_pad = [' ']
-    refactored = [' '+line for line in refactored]
-    
-    #final safety check:
-    if len(refactored) > height+2:
-        return ['ERROR: HEIGHT OF','TEXT EXCEEDS LIMIT.']
-    
-    if len(refactored) > height:
-        return refactored
-    else:
-        return y_pad + refactored
+    width, height = limits['width'] - 2, limits['height']
+    if width < WRAP_MIN_WIDTH or height < WRAP_MIN_HEIGHT:
+        raise ValueError(f"Cannot wrap into {limits['width']}x{height}: needs a width of at least {WRAP_MIN_WIDTH + 2} and a height of at least {WRAP_MIN_HEIGHT}.")
+    return _layout('wrap', data, width, height)
+
+def prewrap(text):
+    '''
+    Lays out a description for the right-hand pane of the two-pane body ahead of time, so moving the cursor onto it is a cache hit.  chargen.build_screens() does this for every option, so resources.py stays free of the display.
+    '''
+    return wrap_text(text, DESC_MAX)
+
+def desc_pages(text):
+    #How many pages a description takes in the right-hand pane.
+    return len(wrap_pages(text, DESC_MAX))
 
 def v_justify(height, data):
     '''
@@ -116,11 +473,7 @@ def v_justify(height, data):
         data: the data printed in the frame
     Returns a list of strings with justified spacing.
     '''
-    v_difference = height - len(data)
-    front_pad = [' ' for i in range(floor(v_difference/2))]
-    back_pad = [' ' for i in range(v_difference - len(front_pad))]
-    
-    return front_pad + data + back_pad
+    return list(_layout('v_just', tuple(data), None, height))
 
 def h_justify(width, data):
     '''
@@ -129,105 +482,188 @@ def h_justify(width, data):
         data: the data printed in the frame
     Returns a list of strings with justified spacing.
     '''
+    return list(_layout('h_just', tuple(data), width, None))
+
+def _wrap_pages(text, width, height):
+    '''
+    Uncached; see wrap_pages().  One pass over the tokens: each word is measured once and lines are joined once, so the cost is linear in the length of the text.
+    '''
+    lines = []
+    line = []
+    line_width = 0
+    
+    def _break_word(word):
+        #Splits a word wider than the line into width-1 chunks + '-'.  Escape sequences are kept whole and count as zero width.
+        chunks = []
+        chunk = ''
+        chunk_width = 0
+        for seg in ESCAPE_SEQ.split(word):
+            if seg[:1] == '\x1b':
+                chunk += seg
+                continue
+            for char in seg:
+                w = char_width(char)
+                if chunk_width + w > width - 1:
+                    chunks.append(chunk + '-')
+                    chunk, chunk_width = '', 0
+                chunk += char
+                chunk_width += w
+        return chunks + [chunk]
+    
+    for word in text.split():
+        word_width = text_width(word)
+        if word_width > width:
+            #too wide for any line: hyphenate it across as many lines as it takes
+            if line:
+                lines.append(' '.join(line))
+            *full, word = _break_word(word)
+            lines.extend(full)
+            line, line_width = [], 0
+            word_width = text_width(word)
+        
+        if line and line_width + 1 + word_width > width:
+            lines.append(' '.join(line))
+            line, line_width = [], 0
+        line_width += word_width + (1 if line else 0)
+        line.append(word)
+    if line:
+        lines.append(' '.join(line))
+    
+    #Same look as before pagination: one space of left margin, and a blank top line when there's room for it.
+    lines = [' ' + line for line in lines]
+    if len(lines) <= height - 2:
+        return ((' ',) + tuple(lines),)
+    if len(lines) <= height:
+        return (tuple(lines),)
+    
+    #Too tall for the pane: the last row of every page shows where you are.
+    per_page = height - 1
+    total = -(-len(lines) // per_page)
+    pages = []
+    for n in range(total):
+        page = lines[n*per_page:(n+1)*per_page]
+        page += [' '] * (per_page - len(page))
+        pages.append(tuple(page) + (PAGE_MARKER.format(page=n+1, pages=total),))
+    return tuple(pages)
+
+def _v_justify(height, data):
+    #Uncached; see v_justify().
+    v_difference = height - len(data)
+    front_pad = [' ' for i in range(floor(v_difference/2))]
+    back_pad = [' ' for i in range(v_difference - len(front_pad))]
+    
+    return front_pad + data + back_pad
+
+def _h_justify(width, data):
+    #Uncached; see h_justify().
     autosetback = 3 #something of a magic constant - justifies further left for a more 'natural' centered look.  
     #average_width = floor(mean([len(line) for line in map(term.strip_seqs, data)]))
-    average_width = floor(mean(map(len, map(term.strip_seqs, data))))
+    average_width = floor(mean(map(text_width, data)))
 
     
     front_pad = [' ' * (floor((width - average_width)/2)-autosetback) for i in range(width)]
     back_pad = []
     
-    for line in map(term.strip_seqs, data):
-        back_pad.append(' ' * (width - len(line) - len(front_pad[0])))
+    for line in data:
+        back_pad.append(' ' * (width - text_width(line) - len(front_pad[0])))
     
     return [a+b+c for a, b, c in zip(front_pad, data, back_pad)]
 
-def tab_header(tabs, position):
+def compile_tab_header(tabs):
     '''
-    Constructs a header that is incorporated into the print pipeline for additional display. 
-    Function returns an array of 3 strings each of length header_max; the keys are the position
+    Builds every variant of the header for a list of tabs, once.  Returns a tuple with one entry per tab position, each a tuple of 3 strings (top outline, tabs line with that tab highlighted, bottom outline).  Does not modify tabs.
     WARNING: This function assumes that the tabs display will always be 3 high.  Even if length or display frame changes, this dimension is unlikely to change.
     
     tabs: list of strings that will be displayed in header.
-    position: integer that MUST be in the possible index range for tabs. Current position.
     '''
-    
     header_max = DISPLAY_COORDS['title_max']['width']
     total_width = 1+sum([len(s) +1 for s in tabs]) #totals length of tabs and ║s
     spare_spaces = header_max-total_width
-    header_array = ['╔', '║', '╚'] #print array
+    padded = list(tabs)
     
     #Catch case where total width exceed space limits.
     if header_max < total_width:
         raise Exception(f"Cannot print.  Width ({total_width}) exceeds maximum permissible ({header_max}).")
     
-    def _get_shortest(lst):
-        #Returns the index of the shortest length string from a list of strings.
-        return lst.index(min(lst, key=len))
-    
-    def _outline(tabline, l_corner, middle_t, r_corner):
-        '''
-        This function requires the centre tabline to have already been constructed
-        For top:     l_corner = '╔', middle_t = '╦', r_corner = '╗'
-        For bottom:  l_corner = '╚', middle_t = '╩', r_corner = '╝'
-        tabline = header['tabs'] /after/ it is complete
-        '''
-        bar_index = [i for i, c in enumerate(tabline) if c=='║']
-        bar_index.pop(0) #remove index=0 (║ in first place) so the while loop works
-        line = l_corner #initialize start of line
-        
-        while len(line) < (len(tabline)-1):
-            
-            if len(line) < bar_index[0]:
-                line += '═'
-            elif len(line) == bar_index[0]:
-                line += middle_t
-                bar_index.pop(0)
-        line += r_corner
-        
-        return line
-    
     #Initial 'even' space padding if there's lots of pads to be handed out:
-    if spare_spaces >= 2*len(tabs):
-        for i in range(len(tabs)):
-            tabs[i] = ' ' + tabs[i] + ' '
-        spare_spaces -= 2*len(tabs)
+    if spare_spaces >= 2*len(padded):
+        padded = [' ' + t + ' ' for t in padded]
+        spare_spaces -= 2*len(padded)
     
-    #Thereafter, space pads the shortest item first:
+    #Thereafter, space pads the shortest item first (lowest index on ties); a heap keeps that from rescanning the list.
+    shortest = [(len(t), i) for i, t in enumerate(padded)]
+    heapify(shortest)
     while spare_spaces >= 1:
+        length, i = heappop(shortest)
         if spare_spaces == 1:
-            tabs[_get_shortest(tabs)] = tabs[_get_shortest(tabs)] + ' '
+            padded[i] = padded[i] + ' '
             spare_spaces -= 1
         else:
-            tabs[_get_shortest(tabs)] = ' ' + tabs[_get_shortest(tabs)] + ' '
+            padded[i] = ' ' + padded[i] + ' '
             spare_spaces -= 2
+        heappush(shortest, (len(padded[i]), i))
     
-    #finalize array structure
-    for t in tabs:
-        header_array[1] += t + '║' #Middle line of tabs (with text)
-    header_array[0] = _outline(header_array[1], '╔', '╦', '╗') #Top (first) line
-    header_array[2] = _outline(header_array[1], '╚', '╩', '╝') #Bottom (last) line
+    #Top & bottom outlines put a ╦/╩ above/below every ║ between tabs.
+    top = '╔' + '╦'.join('═' * len(t) for t in padded) + '╗'
+    bottom = '╚' + '╩'.join('═' * len(t) for t in padded) + '╝'
     
-    #The unfortunate quality of having to construct the tabs line twice.  The first must be WITHOUT term.method, in order to have the proper index locations for top and bottom.  The second must be to add 'bold_black_on_white' method.  You can see this in that the ['tabs'] line will be len+20 compared to top and bottom *programmatically* but the difference NOT visually displayed to the monitor.
-    header_array[1] = '║' 
-    for t in tabs:
-        if tabs[position]==t:
-            header_array[1] += term.bold_black_on_white(t) + '║'
-        else: header_array[1] += t + '║'
+    variants = []
+    term = get_term()
+    for position in range(len(padded)):
+        middle = '║' + '║'.join(term.bold_black_on_white(t) if i == position else t for i, t in enumerate(padded)) + '║'
+        variants.append((top, middle, bottom))
+    return tuple(variants)
+
+@tracing.traced('tab_header')
+def tab_header(tabs, position):
+    '''
+    Draws the tab header with the tab at position highlighted.  The header for each list of tabs is compiled once (compile_tab_header) and cached, so switching tabs is a lookup plus a write.
+    
+    tabs: list of strings that will be displayed in header.
+    position: integer that MUST be in the possible index range for tabs. Current position.
+    '''
+    screen = get_screen()
+    key = tuple(tabs)
+    if key not in TAB_HEADERS:
+        TAB_HEADERS[key] = compile_tab_header(tabs)
     
-    #print the tab header in the correct location
+    #compose the tab header in the correct location
     x = DISPLAY_COORDS['title']['x']
     y = DISPLAY_COORDS['title']['y']
-    for i in header_array:
-        print(term.move_xy(x, y) + i)
+    for i in TAB_HEADERS[key][position]:
+        screen.put(x, y, i)
         y+=1
+    screen.flush()
 
 def footnote(text, coords):
     '''
     Thus function prints information in the footnote at the bottom of the display frame.  Text length to not exceed 53.
     '''
-    print(term.move_xy(coords['x'], coords['y']) + term.bold(text))
+    screen = get_screen()
+    screen.put(coords['x'], coords['y'], screen.term.bold(text))
+    screen.flush()
 
+#Rows of a scrolling option list: the body's height, less the two rows that show how much is above & below.  Also how far PAGE UP/PAGE DOWN move the cursor.
+LIST_PAGE = DISPLAY_COORDS['body_max']['height'] - 2
+
+def list_window(cursor, total, height=DISPLAY_COORDS['body_max']['height']):
+    '''
+    Which options of a list to draw, so long catalogs scroll instead of overflowing the pane.  Only the options in the window need formatting, so a keypress costs the same however long the list is.
+        cursor: index of the highlighted option
+        total: number of options
+        height: rows available
+    Returns (first, last, above, below): draw options[first:last].  If the whole list fits, above & below are None; otherwise they are the lines for the rows above & below the window, which say how many options are hidden on that side.  The cursor is kept mid-window where possible.
+    '''
+    if total <= height:
+        return 0, total, None, None
+    rows = height - 2
+    first = min(max(cursor - rows//2, 0), total - rows)
+    last = first + rows
+    above = f'▲ {first} more' if first else ' '
+    below = f'▼ {total - last} more' if last < total else ' '
+    return first, last, above, below
+
+@tracing.traced('layout')
 def print_pipeline(data_group_1, data_group_2=None):
     '''
     This function aggregates data & print functions and return a list of strings that print out within the current display frame (as declared at the beginning of the file).  The data group variables are the data that is to be printed; it will automatically split into windows if group 2 != None.  The details of how data groups should be formatted is as below:
@@ -236,6 +672,8 @@ def print_pipeline(data_group_1, data_group_2=None):
         v_just: Boolean; whether this group will be vertically justified.
         h_just: Boolean; whether this group will be horizontally justified.
         wrap: Boolean; whether this group is a long string that will need to wrap around.  Currently mutually exclusive with v/h justification
+        page: (optional, wrap only) int; which page of the wrapped text to show when it is taller than the pane.
+        limits: (optional, wrap only) dict like HALF_BODY_MAX; wrap into a smaller area than the pane, e.g. to leave room below the text.
     }
     NOTE that this function, largely, currently does not check to see if the data will display past limit boundaries.  Validation occurs in data group assembly.
     NOTE that this function deals with neither the header nor the footnote.
@@ -244,7 +682,7 @@ def print_pipeline(data_group_1, data_group_2=None):
     #Automatically defines limits based on whether there are two groups or not.
     limits = DISPLAY_COORDS['body_max'].copy()
     if data_group_2 != None:
-        limits['width'] = floor(limits['width']/2)
+        limits = HALF_BODY_MAX.copy()
     
     #apply print pipeline to each group
     for group in [data_group_1, data_group_2]:
@@ -257,7 +695,7 @@ def print_pipeline(data_group_1, data_group_2=None):
         
         #Returns a wrapped string
         if group['wrap']:
-            group['preprint'] = wrap_text(data, limits)
+            group['preprint'] = wrap_text(data, group.get('limits', limits), group.get('page', 0))
             v_distance = limits['height'] - len(group['preprint'])
             for i in range(v_distance):
                 group['preprint'].append(' ' * limits['width'])
@@ -276,7 +714,7 @@ def print_pipeline(data_group_1, data_group_2=None):
             data = h_justify(limits['width'], data)
         else:
             for i in range(len(data)):
-                data[i] += (' ' * (limits['width']-len(data[i])))
+                data[i] += (' ' * (limits['width']-text_width(data[i])))
         
         #Casts the refactored display data.
         group['preprint'] = data
@@ -288,6 +726,80 @@ def print_pipeline(data_group_1, data_group_2=None):
         return data_group_1['preprint']
 
 
+class ScreenTemplate:
+    '''
+    A screen layout, compiled once into a render plan (see compile_template()).  render() then only fills the dynamic panes: the static parts are already drawn into the screen's background, and every pane's position & size are fixed.
+    '''
+    KINDS = ('list', 'wrap', 'text')
+    
+    def __init__(self, layout):
+        self.static = tuple((x, y, text) for x, y, text in layout.get('static', ()))
+        plan = []
+        for name, pane in layout['panes'].items():
+            kind = pane['kind']
+            if kind not in self.KINDS:
+                raise ValueError(f"pane {name!r}: unknown kind {kind!r} (expected one of {', '.join(self.KINDS)})")
+            limits = {'width':pane.get('width'), 'height':pane.get('height')}
+            plan.append((name, kind, pane['x'], pane['y'], limits, pane.get('v_just', False), pane.get('h_just', False), pane.get('style')))
+        self.plan = tuple(plan)
+    
+    @tracing.traced('layout')
+    def render(self, **slots):
+        '''
+        Draws the screen with each pane filled from the slot of the same name; a pane with no slot (or None) is left blank.
+            list panes: a list of lines
+            wrap panes: text, or (text, page) for a later page of text too tall for the pane
+            text panes: one line
+        '''
+        screen = get_screen()
+        screen.reset(screen.base(self, self.static))
+        for name, kind, x, y, limits, v_just, h_just, style in self.plan:
+            value = slots.get(name)
+            if value is None:
+                continue
+            if kind == 'text':
+                screen.put(x, y, getattr(screen.term, style)(value) if style else value)
+                continue
+            if kind == 'wrap':
+                text, page = value if isinstance(value, tuple) else (value, 0)
+                lines = wrap_text(text, limits, page)
+            else:
+                lines = value
+                if v_just:
+                    lines = v_justify(limits['height'], lines)
+                if h_just:
+                    lines = h_justify(limits['width'], lines)
+            for i, line in enumerate(lines):
+                screen.put(x, y+i, line)
+        screen.flush()
+
+def compile_template(layout):
+    '''
+    Compiles a declarative screen layout into a ScreenTemplate.  Compile once (at import) and render() per frame.
+    layout = {
+        'static': [(x, y, text), ...]: drawn into the background once; never redrawn, e.g. pane dividers
+        'panes': {name: pane}, drawn in order, each pane a dict of:
+            kind: 'list' (lines, justified in the box like print_pipeline's groups), 'wrap' (text wrapped & paged into the box) or 'text' (one line)
+            x, y: top-left corner
+            width, height: the box ('list' & 'wrap' only)
+            v_just, h_just: (optional, 'list' only) Boolean; center the lines vertically/horizontally in the box
+            style: (optional, 'text' only) name of a blessed style, e.g. 'bold'
+    }
+    '''
+    return ScreenTemplate(layout)
+
+#The two-pane list screen: a scrolling option list on the left, the highlighted option's description on the right (above where chargen's stat preview goes), and a footnote.  Chargen's three screens use it; inventory & shop lists can too.
+LIST_LAYOUT = {
+    'static': [(DISPLAY_COORDS['body']['x'] + HALF_BODY_MAX['width'], DISPLAY_COORDS['body']['y'] + i, '║') for i in range(HALF_BODY_MAX['height'])],
+    'panes': {
+        'options': {'kind':'list', 'x':DISPLAY_COORDS['body']['x'], 'y':DISPLAY_COORDS['body']['y'], **HALF_BODY_MAX, 'v_just':True, 'h_just':True},
+        'desc': {'kind':'wrap', 'x':DISPLAY_COORDS['body']['x'] + HALF_BODY_MAX['width'] + 1, 'y':DISPLAY_COORDS['body']['y'], **DESC_MAX},
+        'footnote': {'kind':'text', **DISPLAY_COORDS['footnote'], 'style':'bold'},
+    },
+}
+LIST_TEMPLATE = compile_template(LIST_LAYOUT)
+
+
 ############################################################################################
 '''SCREEN FUNCTIONS
 These functions are used for specific screens within the game.
@@ -309,151 +821,94 @@ def box_logic(num):
     '''
     return ('●' * num) + ('○' * (4-num))
 
-def attributes_display(cursor, options, points):
+def option_list_display(cursor, options, row, note=None, template=LIST_TEMPLATE, page=0):
+    '''
+    Draws a list screen: the window of options around the cursor (see list_window), the highlighted option's description and a footnote.
+        cursor: an integer IN the index of options
+        options: the options to list (any sequence; may be empty)
+        row: function (option, highlighted, term) > the option's line in the list
+        note: footnote text, or None for none
+        template: a compiled layout with 'options', 'desc' & 'footnote' panes
+        page: which page of the highlighted option's description to show, when it's too tall for the pane
+    Only the visible options are formatted, and the template's static parts are already drawn, so a frame costs the same for any length of list.
+    '''
+    term = get_term()
+    lines = []
+    first, last, above, below = list_window(cursor, len(options))
+    for i in range(first, last):
+        lines.append(row(options[i], cursor == i, term))
+    if above is not None:
+        lines = [above] + lines + [below]
+    if not options:
+        lines = ['(no matches)']
+    template.render(options=lines, desc=(options[cursor].desc, page) if options else ' ', footnote=note)
+
+def attribute_row(opt, highlighted, term):
+    line = f'{box_logic(opt.value)}  {opt.name}'
+    return term.bold_black_on_white(line) if highlighted else line
+
+def equipment_row(opt, highlighted, term):
+    line = f'{cleanify(opt.name)}' + ' ' * (16-len(opt.name)) + f'{opt.value}'
+    line = f'[{term.bold(line)}]' if opt.selected else f' {line} '
+    return term.bold_black_on_white(line) if highlighted else line
+
+def skill_row(opt, highlighted, term):
+    line = f'{cleanify(opt.name)}'
+    line = f'[{term.bold(line)}]' if opt.selected else f' {line} '
+    return term.bold_black_on_white(line) if highlighted else line
+
+def attributes_display(cursor, options, points, page=0):
     '''
     Cursor is an integer IN the index of options.
     Options is the full list of attribute namedtuples.
     Points is the points remaining to spend and is only used in the footnote.
+    Page is the page of the highlighted description to show (see desc_pages).
     '''
-    #Clear screen and print current display frame + tabs.
-    os.system('clear')
-    for line in DISPLAY_FRAME:
-        print(line)
-    
-    #Assemble left side display list from current cursor and options data.
-    left_disp = []
-    for i, opt in enumerate(options):
-        if cursor != i:
-            left_disp.append(f'{box_logic(opt.value)}  {opt.name}')
-        else:
-            left_disp.append(term.bold_black_on_white(f'{box_logic(opt.value)}  {opt.name}'))
-    
-    #Assemble right side display list from current cursor and options data.
-    right_disp = options[cursor].desc
-    
-    #Construct display groups 1 and 2.
-    group1 = {
-        'assembled':left_disp,
-        'v_just':True,
-        'h_just':True,
-        'wrap':False,
-    }
-    group2 = {
-        'assembled':right_disp,
-        'v_just':False,
-        'h_just':False,
-        'wrap':True,
-    }
-    
-    #Use preprint for the finalized display.
-    x = DISPLAY_COORDS['body']['x']
-    y = DISPLAY_COORDS['body']['y']
-    total_body = print_pipeline(group1, group2)
-    
-    for i in range(len(total_body)):
-        print(term.move_xy(x, y+i) + total_body[i])
-    
-    footnote(f'Remaining Points:  {points}', DISPLAY_COORDS['footnote'])
+    option_list_display(cursor, options, attribute_row, f'Remaining Points:  {points}', page=page)
 
-def equipment_display(cursor, options, points):
+def equipment_display(cursor, options, points, query=None, page=0):
     '''
     Cursor is an integer IN the index of options.
-    Options is the full list of equipment namedtuples.
+    Options is the list of equipment namedtuples to show: the full list, or what a type-ahead filter left (any sequence; may be empty).
     Points is the points remaining to spend and is only used in the footnote.
+    Query is the type-ahead filter as chargen shows it (e.g. '/bron_'), or None with no filter.
+    Page is the page of the highlighted description to show (see desc_pages).
     '''
-    #Clear screen and print current display frame.
-    os.system('clear')
-    for line in DISPLAY_FRAME:
-       print(line)
-    
-    #Assemble left side display list from current cursor and options data.
-    left_disp = []
-    for i, opt in enumerate(options):
-        option_string = f'{cleanify(opt.name)}' + ' ' * (16-len(opt.name)) + f'{opt.value}'
-        if opt.selected:
-            option_string = f'[{term.bold(option_string)}]'
-        else:
-            option_string = f' {option_string} '
-        if cursor == i:
-            option_string = f'{term.bold_black_on_white(option_string)}'
-        
-        left_disp.append(option_string)
-        
-    #Assemble right side display list from current cursor and options data.
-    right_disp = options[cursor].desc
-    
-    #Construct display groups 1 and 2.
-    group1 = {
-        'assembled':left_disp,
-        'v_just':True,
-        'h_just':True,
-        'wrap':False,
-    }
-    group2 = {
-        'assembled':right_disp,
-        'v_just':False,
-        'h_just':False,
-        'wrap':True,
-    }
-    
-    #Use preprint for the finalized display.
-    x = DISPLAY_COORDS['body']['x']
-    y = DISPLAY_COORDS['body']['y']
-    total_body = print_pipeline(group1, group2)
-    
-    for i in range(len(total_body)):
-        print(term.move_xy(x, y+i) + total_body[i])
-    
-    footnote(f'Remaining Points:  {points}', DISPLAY_COORDS['footnote'])
+    note = f'Remaining Points:  {points}'
+    if query:
+        note += f'    {query[-28:]}'
+    option_list_display(cursor, options, equipment_row, note, page=page)
 
-def skill_display(cursor, options, points):
+def skill_display(cursor, options, points, query=None, page=0):
     '''
     Cursor is an integer IN the index of options.
-    Options is the full list of skill namedtuples.
+    Options is the list of skill namedtuples to show: the full list, or what a type-ahead filter left (any sequence; may be empty).
     Points is the points remaining to spend, ==1 and is implicit.
+    Query is the type-ahead filter as chargen shows it (e.g. '/bron_'), or None with no filter.
+    Page is the page of the highlighted description to show (see desc_pages).
     '''
-    #Clear screen and print current display frame.
-    os.system('clear')
-    for line in DISPLAY_FRAME:
-       print(line)
-    
-    #Assemble left side display list from current cursor and options data.
-    left_disp = []
-    for i, opt in enumerate(options):
-        option_string = f'{cleanify(opt.name)}'
-        if opt.selected:
-            option_string = f'[{term.bold(option_string)}]'
-        else:
-            option_string = f' {option_string} '
-        if cursor == i:
-            option_string = f'{term.bold_black_on_white(option_string)}'
-        
-        left_disp.append(option_string)
-        
-    #Assemble right side display list from current cursor and options data.
-    right_disp = options[cursor].desc
-    
-    #Construct display groups 1 and 2.
-    group1 = {
-        'assembled':left_disp,
-        'v_just':True,
-        'h_just':True,
-        'wrap':False,
-    }
-    group2 = {
-        'assembled':right_disp,
-        'v_just':False,
-        'h_just':False,
-        'wrap':True,
-    }
-    
-    #Use preprint for the finalized display.
-    x = DISPLAY_COORDS['body']['x']
-    y = DISPLAY_COORDS['body']['y']
-    total_body = print_pipeline(group1, group2)
-    
-    for i in range(len(total_body)):
-        print(term.move_xy(x, y+i) + total_body[i])
+    option_list_display(cursor, options, skill_row, query[-50:] if query else None, page=page)
+
+def preview_display(stats, coords=DISPLAY_COORDS['preview']):
+    '''
+    Draws the combat stat preview under the description pane during chargen.
+    stats is a {stat: value} dict as stats.Preview.stats() returns it.  Only the cells that changed reach the terminal, as with every other put.
+    '''
+    screen = get_screen()
+    width = DISPLAY_COORDS['preview_max']['width']
+    rows = [
+        ' ' + ' PREVIEW '.center(width - 2, '─'),
+        ('Health', stats['health'], 'Damage', stats['damage']),
+        ('Accuracy', stats['accuracy'], 'Armor', stats['armor']),
+        ('Evasion', stats['evasion'], 'Wit', stats['wit']),
+        ('Stagger', f"{stats['stagger']:.0%}", 'Favor', stats['favor']),
+        ('Hit', f"{stats['hit']:.0%}", '', ''),
+    ]
+    for i, row in enumerate(rows):
+        if not isinstance(row, str):
+            row = f' {row[0]:<9}{row[1]:>3}   {row[2]:<7}{row[3]:>3}'
+        screen.put(coords['x'], coords['y'] + i, row.ljust(width))
+    screen.flush()
 
 
 
@@ -3,7 +3,11 @@
 
 ###################################################################################################
 
-import display as dsp
+import chargen
+import character as ch
+import resources as rs
+import roster
+import saves
 
 ###################################################################################################
 #CHARACTER GENERATION
@@ -20,28 +24,31 @@ attributes = {
 }
 remaining_att_points = 3
 
-equipment_possibles = {
-    'gladius':2,
-    'hasta':2,
-    'javelin':1,
-    'dagger':1,
-    'mace':2,
-    'recurve_bow':3,
-    'tunic':2,
-    'leather_shield':1,
-    'leather_hood':2,
-    'bronze_cap':3,
-    'linen_leggings':2,
-}
+#Equipment costs come from the equipment catalog (content/equipment.json) instead of being duplicated here.
+def equipment_possibles():
+    return {e['name']:e['value'] for e in rs.equipment_read_only}
 remaining_equipment_points = 6
 
 
 name = ''
 
 
-print(dsp.intro1())
-
-name = input("Enter your name here:  ")
+def main():
+    '''
+    Application entry point:  python main.py
+    Nothing runs at import; the terminal, display frame & chargen screens are all set up here, on demand.
+    '''
+    global name
+    screens, finished = chargen.run()
+    if not finished:
+        return #quit with 'q': nothing to name or keep
+    name = input("Enter your name here:  ")
+    ch.name = name
+    with roster.open_roster(writer=True) as league:
+        league.add(saves.current_character())
+
+if __name__ == '__main__':
+    main()
 
 
 
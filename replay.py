@@ -0,0 +1,234 @@
+'''
+           REPLAY.PY
+=====================================
+Records the keys a chargen session takes, and plays them back.  A recording is a complete, reproducible bug report: playing it back through a fresh session on a headless display ends on exactly the screen & choices the player saw.  Playback runs at full speed, so it doubles as a throughput benchmark.
+    python replay.py record bug.rec                #play chargen as normal, keys are logged to bug.rec
+    python replay.py play bug.rec --show           #replay it; print the final screen & choices
+    python replay.py play bug.rec --repeat 100     #replay it 100 times; report screens/sec
+
+Recordings are compact & versioned:
+    header: MAGIC, VERSION, wall-clock time the recording started
+    a record per key:
+        delay: milliseconds since the previous key, as a varint (1 byte for anything under 128ms)
+        key: 1 byte; below 0x80 an unnamed ASCII key (letters etc.), 0x80 + i the named key KEYS[i], ESCAPE for anything else (followed by a varint length & JSON [text, name])
+A key is 2 bytes in nearly every case.
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] LOG FORMAT
+    [2] RECORDING
+    [3] PLAYBACK
+    [4] MAIN
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import argparse
+import json
+import struct
+import time
+
+import display as dsp
+import chargen
+import tracing
+
+MAGIC = b'GLRP'
+VERSION = 1
+HEADER = struct.Struct('<4sBd') #magic, version, start time (seconds since the epoch)
+
+#Named keys with a 1-byte code, as (name, the sequence a terminal sends for it).  Only ever append to this: the codes are indexes.
+KEYS = [
+    ('KEY_UP', '\x1b[A'), ('KEY_DOWN', '\x1b[B'), ('KEY_LEFT', '\x1b[D'), ('KEY_RIGHT', '\x1b[C'),
+    ('KEY_TAB', '\t'), ('KEY_ENTER', '\n'), ('KEY_ESCAPE', '\x1b'), ('KEY_BACKSPACE', '\x7f'),
+    ('KEY_PGUP', '\x1b[5~'), ('KEY_PGDOWN', '\x1b[6~'), ('KEY_HOME', '\x1b[H'), ('KEY_END', '\x1b[F'),
+]
+KEY_CODES = {name:0x80 + i for i, (name, text) in enumerate(KEYS)}
+ESCAPE = 0xFF
+
+class ReplayError(ValueError):
+    #Raised for a file that isn't a recording, is from a newer version, or is cut short.
+    pass
+
+
+###############################################################################
+#[1] LOG FORMAT
+
+def _varint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def encode_key(key):
+    #One keystroke (blessed Keystroke or str) > bytes.
+    name = getattr(key, 'name', None)
+    if name in KEY_CODES:
+        return bytes([KEY_CODES[name]])
+    if name is None and len(key) == 1 and ord(key) < 0x80:
+        return key.encode()
+    extra = json.dumps([str(key), name]).encode()
+    return bytes([ESCAPE]) + _varint(len(extra)) + extra
+
+def decode_key(data, offset, Keystroke):
+    #The key at data[offset:].  Returns (Keystroke, offset of the next byte).
+    code = data[offset]
+    if code < 0x80:
+        return Keystroke(chr(code)), offset + 1
+    if code == ESCAPE:
+        size, offset = _read_varint(data, offset + 1)
+        text, name = json.loads(bytes(data[offset:offset+size]))
+        return Keystroke(text, name=name), offset + size
+    name, text = KEYS[code - 0x80]
+    return Keystroke(text, name=name), offset + 1
+
+def read_log(data):
+    '''
+    Decodes a recording.  Returns (start time, [(seconds since start, Keystroke), ...]).
+    '''
+    from blessed.keyboard import Keystroke
+    if len(data) < HEADER.size:
+        raise ReplayError('not a recording (too short)')
+    magic, version, started = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ReplayError('not a recording')
+    if version > VERSION:
+        raise ReplayError(f'recording version {version} is newer than this game ({VERSION})')
+    keys = []
+    offset = HEADER.size
+    at = 0
+    try:
+        while offset < len(data):
+            delay, offset = _read_varint(data, offset)
+            key, offset = decode_key(data, offset, Keystroke)
+            at += delay
+            keys.append((at / 1000, key))
+    except (IndexError, ValueError):
+        raise ReplayError(f'recording is damaged or cut short at byte {offset}') from None
+    return started, keys
+
+def load_log(path):
+    with open(path, 'rb') as f:
+        return read_log(f.read())
+
+
+###############################################################################
+#[2] RECORDING
+
+class Recorder:
+    '''
+    Appends each key it's given to a recording.
+        stream: binary stream; the header is written straight away & every key is flushed, so a crash loses nothing
+        clock: seconds, for the delays between keys
+    '''
+    def __init__(self, stream, clock=time.monotonic):
+        self.stream = stream
+        self.clock = clock
+        self.last = clock()
+        self.count = 0
+        stream.write(HEADER.pack(MAGIC, VERSION, time.time()))
+        stream.flush()
+
+    def record(self, key):
+        now = self.clock()
+        delay = max(0, round((now - self.last) * 1000))
+        self.last += delay / 1000
+        self.stream.write(_varint(delay) + encode_key(key))
+        self.stream.flush()
+        self.count += 1
+
+def encode_log(keys, started=0.0):
+    #A recording of [(seconds since start, key), ...] as bytes, e.g. for a scripted session.
+    out = [HEADER.pack(MAGIC, VERSION, started)]
+    last = 0
+    for at, key in keys:
+        ms = round(at * 1000)
+        out.append(_varint(ms - last) + encode_key(key))
+        last = ms
+    return b''.join(out)
+
+
+###############################################################################
+#[3] PLAYBACK
+
+def play(keys, backend=None, screens=None):
+    '''
+    Feeds keys (Keystrokes, without their times) through a fresh chargen session, rendering to a headless screen after every key: what the live loop draws when keys come one per frame.  Stops at 'q' or the end of the keys.
+        backend: display backend for the session's screen (default: NullBackend; BufferBackend to inspect the result)
+        screens: chargen screens (default: chargen.build_screens())
+    Returns the ChargenState, for its screens & their choices.  The display's own current screen is left alone.
+    '''
+    screen = dsp.ScreenBuffer(backend if backend is not None else dsp.NullBackend(), dsp.load_frame())
+    state = chargen.ChargenState(screens if screens is not None else chargen.build_screens())
+    with dsp.use_screen(screen):
+        state.render()
+        for key in keys:
+            state.update(key)
+            if state.done:
+                break
+            if state.dirty:
+                state.render()
+    return state
+
+def choices(state):
+    #The session's attributes, inventory & skills, as chargen.run() would cast them into character.py.
+    screen_ATT, screen_EQP, screen_SKL = state.screens
+    return chargen.cast_values(screen_ATT.res_list, screen_EQP.res_list, screen_SKL.res_list)
+
+
+###############################################################################
+#[4] MAIN
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record & replay chargen sessions.')
+    parser.add_argument('mode', choices=['record', 'play'])
+    parser.add_argument('path')
+    parser.add_argument('--show', action='store_true', help='play: print the final screen')
+    parser.add_argument('--repeat', type=int, default=1, help='play: replay this many times and report screens/sec')
+    parser.add_argument('--trace', default=None, help='play: trace every keypress (tracing.py) and write the spans here (.folded for folded stacks, else JSON lines)')
+    args = parser.parse_args(argv)
+
+    if args.mode == 'record':
+        with open(args.path, 'wb') as f:
+            recorder = Recorder(f)
+            screens, finished = chargen.run(recorder)
+        print(f'{recorder.count} keys recorded to {args.path}')
+        attributes, inventory, skills = chargen.cast_values(*(s.res_list for s in screens))
+    else:
+        started, timed = load_log(args.path)
+        keys = [key for at, key in timed]
+        print(f'{len(keys)} keys over {timed[-1][0] if timed else 0:.1f}s, recorded {time.ctime(started)}')
+        backend = dsp.BufferBackend() if args.show else None
+        if args.trace:
+            tracing.enable()
+        try:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                state = play(keys, backend)
+            elapsed = time.perf_counter() - start
+        finally:
+            if args.trace:
+                tracing.disable()
+                print(f'{tracing.dump(args.trace)} trace records written to {args.trace}')
+        if args.show:
+            print('\n'.join(backend.snapshot()))
+        print(f'{args.repeat * len(keys) / elapsed:,.0f} screens/sec')
+        attributes, inventory, skills = choices(state)
+    print(f'Final attributes: {attributes}')
+    print(f'Final inventory:  {inventory}')
+    print(f'Final skills learned:  {skills}')
+
+if __name__ == '__main__':
+    main()
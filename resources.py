@@ -4,7 +4,7 @@
 Contains data for the game. 
 
 TABLE OF CONTENTS
-    [0] DATA STRUCTURES: Equipment, skills, and attributes as lists of dictonaries
+    [0] DATA STRUCTURES: Equipment, skills, and attributes as lists of dictonaries, loaded from the catalog files in content/
     [1] COMPOSITION FUNCTIONS: Renders read-only structures into runtime structures
     [2] Suspended/revision/test code
 
@@ -18,130 +18,306 @@ NOTE: If modifying data structures, certain properties for each type must be pre
     Skills
         STRUCTURE: 'name', 'desc'
         COMP FUNCTION: 'value', 'selected'
+    All three may also have a 'category' (used for the catalog's category index).
+    Equipment & skills may also have combat modifiers (see COMBAT_MODIFIERS): 'damage', 'armor', 'hit', 'dodge', 'pain', 'favor'.
 *See further notes about equipment about value property placement
 '''
 
+import hashlib
+import json
+import marshal
+import os
+import struct
+import sys
+
 #########################################################################################
 #[0] DATA STRUCTURES
 '''
-Contains lists of dictionaries that contain read-only information for the game.
+Contains lists of dictionaries that contain read-only information for the game.  The data lives in catalog files (content/attributes.json, content/equipment.json, content/skills.json; a .toml file of the same name is also accepted) and is loaded, validated & indexed once, on first use:
+    attributes_read_only, equipment_read_only, skills_read_only: the lists of dictionaries, in catalog order.
+    catalog(kind): the Catalog for 'attributes', 'equipment' or 'skills', with O(1) lookups by name & category.
+
+A catalog file holds one list named after its kind, e.g. {"equipment": [{"name": ..., "desc": ..., "value": ...}, ...]}.  Each entry must have the STRUCTURE fields from the NOTE at the top of this file; 'category' is optional.
 
 TASK: Figure out what to do with 'value' in equipment_read_only - it's only used for chargen and possibly doesn't need to be in the main game data structures.  [Possible: in class_init?  stand-alone list or dict?]
 
 NOTE: EQP & SKL will possess many more fields later.  Full properties don't need to exist until F1.
 '''
 
-attributes_read_only = [
-    {'name':'REF', 'desc':'Reflex determines how hard it is to hit you, and also your hit chance with weapons of all kinds. Armor can negatively affect your reflex.  Reflex also affects characteristics such as parrying, counterattacks, or certain maneuvers.',},
-    {'name':'FOR', 'desc':'Fortitude determines your resistance to pain & suffering.  A character with a high fortitude will find it easier to keep going despite grievous injuries.  Fortitude also affects your stamina and energy levels.',},
-    {'name':'WIT', 'desc':'Wits affects the success of a broad range of maneuvers and really keeps your opponents on their toes.  It also has a (small) hand in many other characteristics and abilities and allows you to perceive enemy actions clearer.',},
-    {'name':'MOX', 'desc':'Moxie allows you to execute maneuvers with grace and panache and to stick it to overwhelming odds.  Crowds love a gladiator with moxie!  This stat is essential to keeping you in the crowds\' good graces.',},
-]
+CONTENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content')
 
-equipment_read_only = [
-    {'name':'gladius', 'value':2, 
-     'desc':'duhhhh a sword'},
-    {'name':'hasta', 'value':2, 
-     'desc':'stabby stabby boi'},
-    {'name':'javelin', 'value':1, 
-     'desc':'+1000 stab range'},
-    {'name':'dagger', 'value':1, 
-     'desc':'nothing says you\'re brutally unprepared for a deathfest like a 6" piece of cheap iron'},
-    {'name':'mace', 'value':2, 
-     'desc':'BONK! horny jail'},
-    {'name':'recurve_bow', 'value':3, 
-     'desc':'this bow makes laser gun noises'},
-    {'name':'tunic', 'value':2, 
-     'desc':'TOGA PARTY! TOGA PAAAAARTY!!!'},
-    {'name':'leather_shield', 'value':1, 
-     'desc':'It\'ll stop an arrow but it won\'t stop your father\'s disappointment.'},
-    {'name':'leather_hood', 'value':2, 
-     'desc':'look shady and cool.  I mean, edgy and lame'},
-    {'name':'bronze_cap', 'value':3,
-     'desc':'keeps HAARP mind control rays out'},
-    {'name':'linen_leggings', 'value':2, 
-     'desc':'the name lies.  they\'re actually fishnet leggings & heels.'},
-]
+#Combat modifiers equipment & skills may carry (all ints, 0 when absent).  See combat.py for what each one does.
+COMBAT_MODIFIERS = ('damage', 'armor', 'hit', 'dodge', 'pain', 'favor')
+
+#Fields each catalog entry must have (with their types) and may have.
+CATALOG_SCHEMA = {
+    'attributes': {'required': {'name':str, 'desc':str}, 'optional': {'category':str}},
+    'equipment': {'required': {'name':str, 'desc':str, 'value':int}, 'optional': {'category':str, **{m:int for m in COMBAT_MODIFIERS}}},
+    'skills': {'required': {'name':str, 'desc':str}, 'optional': {'category':str, **{m:int for m in COMBAT_MODIFIERS}}},
+}
+
+#Module attribute > catalog kind, for the lazily loaded *_read_only lists.
+READ_ONLY_LISTS = {
+    'attributes_read_only': 'attributes',
+    'equipment_read_only': 'equipment',
+    'skills_read_only': 'skills',
+}
 
-skills_read_only = [
-    {'name':'gimmick_lvl1', 
-     'desc':'Unlocks a number of cheap tricks that spring up from time to time in combat.  The crowd loves fighting dirty!',},
-    {'name':'levelheaded_lvl1', 
-     'desc':'You\'re less likely to panic or succumb to pain in battle.',},
-    {'name':'shield_bash', 
-     'desc':'Unlocks a short-range offensive maneuver with your shield.  The harder and heavier the shield, the better it is.',},
-    {'name':'pommel_strike', 
-     'desc':'Unlocks a short-range blunt damage strike with one-handed weapons.',},
-    {'name':'wrestler', 
-     'desc':'Unlocks a lot of hand-to-hand grappling and fighting maneuvers.  Don\'t miss out on this if you\'re fighting barehanded!',},
-    {'name':'sprinter', 
-     'desc':'Allows you to cover much greater distances in less time in the arena.  Important for closing on ranged opponents.',},
-    {'name':'surefooted', 
-     'desc':'You\'re much less likely to stumble, be staggered, or be knocked down in combat.',},
-    {'name':'snipe', 
-     'desc':'Increases range and accuracy of ranged weapons.  But only candy-asses used ranged in the arena.',},
-    {'name':'tosser', 
-     'desc':'Increases range, accuracy, and power of thrown weapons.  Be sure to flex it up for the crowd before you throw!',},
+class CatalogError(ValueError):
+    #Raised when a catalog file is missing or doesn't match CATALOG_SCHEMA.
+    pass
+
+class Catalog:
+    '''
+    A validated catalog with its indexes, built once when it's loaded.
+        kind: 'attributes', 'equipment' or 'skills'
+        records: list of dictionaries, in file order (this is the *_read_only list)
+        by_name: name > record
+        by_category: category > list of records, in file order
+        signature: sha256 hex digest of the source file; changes whenever the catalog data does
+    '''
+    def __init__(self, kind, records, signature=None, by_name=None, by_category=None):
+        self.kind = kind
+        self.records = records
+        self.signature = signature
+        if by_name is not None:
+            #indexes that were already built (i.e. from the precompiled cache)
+            self.by_name, self.by_category = by_name, by_category
+            return
+        self.by_name = {}
+        self.by_category = {}
+        for record in records:
+            self.by_name[record['name']] = record
+            if 'category' in record:
+                self.by_category.setdefault(record['category'], []).append(record)
     
-]
+    def __len__(self):
+        return len(self.records)
+    
+    def __iter__(self):
+        return iter(self.records)
+    
+    def __contains__(self, name):
+        return name in self.by_name
+    
+    def get(self, name, default=None):
+        return self.by_name.get(name, default)
+
+def validate_catalog(kind, records, source='<catalog>'):
+    '''
+    Checks a list of catalog entries against CATALOG_SCHEMA[kind].  Raises CatalogError naming the first bad entry; returns the records otherwise.
+    '''
+    schema = CATALOG_SCHEMA[kind]
+    required, optional = schema['required'], schema['optional']
+    if not isinstance(records, list):
+        raise CatalogError(f'{source}: expected a list of {kind}, got {type(records).__name__}')
+    
+    fields = {**optional, **required}
+    seen = set()
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise CatalogError(f'{source}: {kind}[{i}]: expected an object, got {type(record).__name__}')
+        for field in required:
+            if field not in record:
+                raise CatalogError(f'{source}: {kind}[{i}]: missing required field {field!r}')
+        for field, value in record.items():
+            field_type = fields.get(field)
+            #bools are ints to isinstance, but a True/False cost is a typo
+            if field_type is not None and (type(value) is bool or not isinstance(value, field_type)):
+                raise CatalogError(f'{source}: {kind}[{i}]: {field!r} should be {field_type.__name__}, got {type(value).__name__}')
+        if record['name'] in seen:
+            raise CatalogError(f'{source}: {kind}[{i}]: duplicate name {record["name"]!r}')
+        seen.add(record['name'])
+    return records
+
+def catalog_path(kind, content_dir=None):
+    #Finds the catalog file for kind: <kind>.json, else <kind>.toml
+    content_dir = content_dir or CONTENT_DIR
+    for ext in ('.json', '.toml'):
+        path = os.path.join(content_dir, kind + ext)
+        if os.path.exists(path):
+            return path
+    raise CatalogError(f'No catalog file for {kind!r} in {content_dir}')
+
+def read_catalog_file(kind, path):
+    #Parses one catalog file and returns its (unvalidated) list of entries.  A file that doesn't parse raises CatalogError too, like one that doesn't match the schema.
+    try:
+        if path.endswith('.toml'):
+            import tomllib
+            with open(path, 'rb') as f:
+                data = tomllib.load(f)
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+    except ValueError as error: #json.JSONDecodeError, tomllib.TOMLDecodeError & UnicodeDecodeError are all ValueErrors
+        raise CatalogError(f'{path}: {error}') from error
+    if not isinstance(data, dict) or kind not in data:
+        raise CatalogError(f'{path}: expected a top-level {kind!r} list')
+    return data[kind]
+
+'''
+PRECOMPILED CACHE
+Parsing & validating the catalog files on every launch is most of the cost of loading them, so load_catalog() keeps a precompiled copy next to each source (<source>.cache) and reuses it while the source is unchanged.
+    Layout: CACHE_HEADER (magic, format version, source mtime_ns, source size, source sha256, build key) followed by the marshalled (records, by_name, by_category).  marshal keeps the shared references, so the indexes point into the same record dicts without being rebuilt.
+    Invalidation: a cache is only ever used by the build that wrote it: the build key covers the kind's CATALOG_SCHEMA, VALIDATOR_VERSION and the Python version (marshal's format is version-specific), so tightening the schema or the validator rebuilds every cache.  Then, if the source's mtime & size match the header the cache is used as is.  If they don't (e.g. a fresh checkout) the source is hashed; a matching hash reuses the cache (and rewrites it with the new mtime), anything else rebuilds it.
+    Caches are only ever written whole, to a temp file swapped in with os.replace, so a reader never sees a torn one.
+    The cache is read with one plain read: marshal.loads builds every object in the loading process anyway, so there is nothing to gain from mapping the file.
+'''
+
+CACHE_SUFFIX = '.cache'
+CACHE_MAGIC = b'GLCC'
+CACHE_VERSION = 2
+CACHE_HEADER = struct.Struct('<4sBqq32s16s') #magic, version, mtime_ns, size, sha256, build key
+VALIDATOR_VERSION = 1 #bump whenever validate_catalog() changes what it accepts, so caches it passed are rebuilt
+
+def _build_key(kind):
+    #What a cache was built with besides its source: the kind's schema, the validator & the Python version.
+    schema = {part:{field:t.__name__ for field, t in fields.items()} for part, fields in CATALOG_SCHEMA[kind].items()}
+    key = json.dumps([kind, schema, VALIDATOR_VERSION, sys.version_info[:2]], sort_keys=True)
+    return hashlib.sha256(key.encode()).digest()[:16]
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+def _read_cache(cache_path, source_stat, source_path, build):
+    '''
+    Returns (records, by_name, by_category, digest, moved) from a valid cache, or None if the cache is missing, stale or from another build.  moved: the source was touched but not changed, so the cache should be rewritten with its new mtime.
+    '''
+    try:
+        with open(cache_path, 'rb') as f:
+            data = f.read()
+        if len(data) < CACHE_HEADER.size:
+            return None
+        magic, version, mtime_ns, size, digest, cache_build = CACHE_HEADER.unpack_from(data)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION or cache_build != build:
+            return None
+        moved = (mtime_ns, size) != (source_stat.st_mtime_ns, source_stat.st_size)
+        if moved and _file_digest(source_path) != digest:
+            return None
+        records, by_name, by_category = marshal.loads(memoryview(data)[CACHE_HEADER.size:])
+        return records, by_name, by_category, digest, moved
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+
+def _write_cache(cache_path, source_stat, digest, catalog, build):
+    #Writes to a temp file and swaps it in, so a process reading the cache never sees half of one.  A read-only content directory just means no cache.
+    header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, source_stat.st_mtime_ns, source_stat.st_size, digest, build)
+    payload = marshal.dumps((catalog.records, catalog.by_name, catalog.by_category))
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(header + payload)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+def load_catalog(kind, path=None, use_cache=True):
+    '''
+    Reads, validates & indexes the catalog for kind ('attributes', 'equipment' or 'skills').  path defaults to the file in CONTENT_DIR.
+    With use_cache, a precompiled copy (see PRECOMPILED CACHE above) is used when it's up to date, and written when it isn't.
+    '''
+    if kind not in CATALOG_SCHEMA:
+        raise CatalogError(f'Unknown catalog kind {kind!r}')
+    path = path or catalog_path(kind)
+    source_stat = os.stat(path)
+    cache_path = path + CACHE_SUFFIX
+    build = _build_key(kind)
+    
+    if use_cache:
+        cached = _read_cache(cache_path, source_stat, path, build)
+        if cached is not None:
+            records, by_name, by_category, digest, moved = cached
+            loaded = Catalog(kind, records, digest.hex(), by_name, by_category)
+            if moved:
+                #same contents, new mtime: rewritten (whole) so the next load skips hashing
+                _write_cache(cache_path, source_stat, digest, loaded, build)
+            return loaded
+    
+    digest = _file_digest(path)
+    records = validate_catalog(kind, read_catalog_file(kind, path), path)
+    loaded = Catalog(kind, records, digest.hex())
+    if use_cache:
+        _write_cache(cache_path, source_stat, digest, loaded, build)
+    return loaded
+
+#Loaded catalogs, by kind
+CATALOGS = {}
+
+def catalog(kind):
+    #The Catalog for kind, loaded on first use.
+    if kind not in CATALOGS:
+        CATALOGS[kind] = load_catalog(kind)
+    return CATALOGS[kind]
+
+def reload_catalogs():
+    #Drops the loaded catalogs, so the next use re-reads the files.
+    CATALOGS.clear()
+
+def __getattr__(name):
+    #attributes_read_only, equipment_read_only & skills_read_only are read from the catalogs on first access.
+    if name in READ_ONLY_LISTS:
+        return catalog(READ_ONLY_LISTS[name]).records
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 
 #########################################################################################
 #[1] COMPOSITION FUNCTIONS - CHARACTER GENERATION
 '''
 Contains functions that composes runtime data for chargen (and possibly later, the main game?)
-Returns a list of classes composed from DATA STRUCTURES above.
+Returns a list of records (Attribute, Equipment, Skill) composed from DATA STRUCTURES above.
 '''
 
+class Attribute:
+    #Runtime record for one attribute.  __slots__ keeps large batches of characters small.
+    __slots__ = ('name', 'desc', 'value')
+    def __init__(self, name, desc, value):
+        self.name = name
+        self.desc = desc
+        self.value = value
+
+class Equipment:
+    #Runtime record for one piece of equipment.
+    __slots__ = ('name', 'desc', 'value', 'selected')
+    def __init__(self, name, desc, value, selected):
+        self.name = name
+        self.desc = desc
+        self.value = value
+        self.selected = selected
+
+class Skill:
+    #Runtime record for one skill.
+    __slots__ = ('name', 'desc', 'value', 'selected')
+    def __init__(self, name, desc, value, selected):
+        self.name = name
+        self.desc = desc
+        self.value = value
+        self.selected = selected
+
 def class_init_ATT(struc):
     '''
-    >This function composes & returns a class that is an initialized version of a data structure.  The data structure can be attributes, skills, or equipment.  The class that it returns is suitable for being passes to chargen, where it exists during runtime, and then writes the values to character.py.  The purpose of this function is to be able to create runtime values (e.i. value of an attribute, whether a piece of equipment is in your inventory) without modifying runtime values of resources.py (Previous iteration had .selected as an attribute of namedtuples in resources.py).
+    >This function composes & returns a list of records that is an initialized version of a data structure.  The data structure can be attributes, skills, or equipment.  The records it returns are suitable for being passes to chargen, where they exist during runtime, and then write the values to character.py.  The purpose of this function is to be able to create runtime values (e.i. value of an attribute, whether a piece of equipment is in your inventory) without modifying runtime values of resources.py (Previous iteration had .selected as an attribute of namedtuples in resources.py).
     CAUTION: this might not be the best solution to the problem.  Consult w/ Samantha.
+    The record classes are declared once, above, with __slots__ (they used to be declared inside each call).
     
     struc: the data structure associated with the function (att, eqp, or skl)
     '''
-    class Attribute:
-        def __init__(self, name, desc, value):
-            self.name = name
-            self.desc = desc
-            self.value = value
-    
-    attributes = [Attribute(name=att['name'], desc=att['desc'], value=1) for att in struc]
-    return attributes
+    return [Attribute(att['name'], att['desc'], 1) for att in struc]
 
 def class_init_EQP(struc):
     '''
-    >This function composes & returns a class that is an initialized version of a data structure.  The data structure can be attributes, skills, or equipment.  The class that it returns is suitable for being passes to chargen, where it exists during runtime, and then writes the values to character.py.  The purpose of this function is to be able to create runtime values (e.i. value of an attribute, whether a piece of equipment is in your inventory) without modifying runtime values of resources.py (Previous iteration had .selected as an attribute of namedtuples in resources.py).
-    CAUTION: this might not be the best solution to the problem.  Consult w/ Samantha.
-    
-    struc: the data structure associated with the function (att, eqp, or skl)
+    >See class_init_ATT.  Equipment records start unselected, with their value (cost) from the data structure.
     '''
-    class Equipment:
-        def __init__(self, name, desc, value, selected):
-            self.name = name
-            self.desc = desc
-            self.value = value
-            self.selected = selected
-    
-    equipment = [Equipment(name=eqp['name'], desc=eqp['desc'], value=eqp['value'], selected=False) for eqp in struc]
-    return equipment
+    return [Equipment(eqp['name'], eqp['desc'], eqp['value'], False) for eqp in struc]
 
 def class_init_SKL(struc):
     '''
-    >This function composes & returns a class that is an initialized version of a data structure.  The data structure can be attributes, skills, or equipment.  The class that it returns is suitable for being passes to chargen, where it exists during runtime, and then writes the values to character.py.  The purpose of this function is to be able to create runtime values (e.i. value of an attribute, whether a piece of equipment is in your inventory) without modifying runtime values of resources.py (Previous iteration had .selected as an attribute of namedtuples in resources.py).
-    CAUTION: this might not be the best solution to the problem.  Consult w/ Samantha.
-    
-    struc: the data structure associated with the function (att, eqp, or skl)
+    >See class_init_ATT.  Skill records start unselected and all cost 1.
     '''
-    class Skill:
-        def __init__(self, name, desc, value, selected):
-            self.name = name
-            self.desc = desc
-            self.value = value
-            self.selected = selected
-    
-    skills = [Skill(name=skl['name'], desc=skl['desc'], value=1, selected=False) for skl in struc]
-    return skills
+    return [Skill(skl['name'], skl['desc'], 1, False) for skl in struc]
 
 
 
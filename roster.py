@@ -0,0 +1,508 @@
+'''
+           ROSTER.PY
+=====================================
+The league roster: every gladiator ever made, with their score, stored on disk.  Built on the save format (saves.py).
+
+Four files in ROSTER_DIR:
+    roster.dat: append-only.  Records: for every add or score change a RECORD (id, length, score, codec) followed by the character's save record.  Records are never rewritten; the newest one for an id wins.
+        The save records are encoded against a saves.py file header (the codec's name lists) stored in the same file: one at the start, and a new one appended whenever a character names an attribute, item or skill the current one doesn't have (the catalogs grew).  Every RECORD carries the offset of its header, so old records still load after the catalogs change.
+    roster.idx: fixed-width index, memory-mapped.  An INDEX_HEADER (count of ids, sequence number, offset of the current codec), then one ENTRY (offset of the id's newest record, score) per id, so a character is found by id with one lookup.
+    roster.log: the score journal, one CHANGE (id, old score, new score, record offset) per add or score change, in order.  Change n is generation n.
+    roster.rank: the leaderboard as of some generation, (-score, id) pairs in sorted order.  Written by the writer when it closes.
+The leaderboard is a secondary index: a Ranking (sorted buckets), loaded from roster.rank and brought up to date from roster.log, so neither opening nor refreshing sorts anything.  The top N is its first N entries; a rank, an insert or a removal is O(log n).
+
+One writer & any number of readers may have the roster open at once.  The writer holds an exclusive lock (fcntl, where available), and always appends the record & its journal entry before publishing them in the index through a seqlock: the sequence number goes odd, the entry & count are written, the sequence number goes even (generation = sequence // 2).  Readers retry any read of the index that started on an odd number or saw it change, so they never see a half-written entry or header; they call refresh() to pick up changes.
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] LEADERBOARD INDEX
+    [2] ROSTER
+    [3] LEADERBOARD: the league's top N
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left, insort
+
+import saves
+
+try:
+    import fcntl
+except ImportError: #no fcntl on Windows: the single-writer rule is then up to the caller
+    fcntl = None
+
+ROSTER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'roster')
+
+RECORD = struct.Struct('<IIiQ')           #id, length of the save record that follows, score, offset of the saves header it's encoded against
+INDEX_MAGIC = b'GLRI'
+INDEX_VERSION = 2
+INDEX_HEADER = struct.Struct('<4sB3xIIQ') #magic, version, count of ids, sequence number (odd while the writer is mid-update), offset of the current saves header
+SEQUENCE = struct.Struct('<I')
+SEQUENCE_AT = 12                          #offset of the sequence number in INDEX_HEADER
+ENTRY = struct.Struct('<Qi')              #offset of the id's newest RECORD in roster.dat, score
+INDEX_GROWTH = 1024                       #entries the index grows by at a time
+CHANGE = struct.Struct('<IiiQ')           #id, old score, new score, offset of the new RECORD
+RANK_MAGIC = b'GLRR'
+RANK_HEADER = struct.Struct('<4sB3xII')   #magic, version, generation, count
+RANK_ENTRY = struct.Struct('<iI')         #-score, id
+BUCKET = 512                              #Ranking bucket size
+RETRIES = 10000                           #reads of an index that stays mid-update before giving up on the writer
+
+class RosterError(Exception):
+    #Raised for a damaged roster, a second writer, or a character the roster can't store.
+    pass
+
+
+###############################################################################
+#[1] LEADERBOARD INDEX
+
+class Ranking:
+    '''
+    (-score, id) pairs in sorted order, as buckets of about BUCKET pairs, each bucket's last pair, and a Fenwick tree of the bucket sizes.
+        insert & remove: a bisect for the bucket, then one within it; O(log n) plus a short list move
+        index: a bisect, then a Fenwick prefix sum of the sizes of the buckets before; O(log n)
+        first(n): the first buckets, O(n)
+    Buckets split when they double and go when they empty; only then is the Fenwick tree rebuilt.
+    '''
+    def __init__(self, pairs=()):
+        #pairs: already in sorted order (roster.rank), so building is O(n)
+        pairs = list(pairs)
+        self.buckets = [pairs[i:i+BUCKET] for i in range(0, len(pairs), BUCKET)]
+        self.size = len(pairs)
+        self._rebuild()
+
+    def _rebuild(self):
+        self.maxes = [bucket[-1] for bucket in self.buckets]
+        self.tree = [0] * (len(self.buckets) + 1)
+        for i, bucket in enumerate(self.buckets, 1):
+            self.tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+
+    def _grow(self, i, delta):
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def _before(self, i):
+        #Pairs in the buckets before bucket i.
+        total = 0
+        while i:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, pair):
+        self.size += 1
+        if not self.buckets:
+            self.buckets.append([pair])
+            self._rebuild()
+            return
+        i = min(bisect_left(self.maxes, pair), len(self.buckets) - 1)
+        bucket = self.buckets[i]
+        insort(bucket, pair)
+        self.maxes[i] = bucket[-1]
+        if len(bucket) > 2 * BUCKET:
+            self.buckets[i:i+1] = [bucket[:BUCKET], bucket[BUCKET:]]
+            self._rebuild()
+        else:
+            self._grow(i, 1)
+
+    def remove(self, pair):
+        i = bisect_left(self.maxes, pair)
+        bucket = self.buckets[i] if i < len(self.buckets) else None
+        j = bisect_left(bucket, pair) if bucket else 0
+        if bucket is None or j == len(bucket) or bucket[j] != pair:
+            raise RosterError(f'leaderboard has no entry {pair}')
+        del bucket[j]
+        self.size -= 1
+        if not bucket:
+            del self.buckets[i]
+            self._rebuild()
+        else:
+            self.maxes[i] = bucket[-1]
+            self._grow(i, -1)
+
+    def index(self, pair):
+        #How many pairs sort before pair.
+        i = bisect_left(self.maxes, pair)
+        if i == len(self.buckets):
+            return self.size
+        return self._before(i) + bisect_left(self.buckets[i], pair)
+
+    def first(self, n):
+        found = []
+        for bucket in self.buckets:
+            if len(found) >= n:
+                break
+            found.extend(bucket[:n - len(found)])
+        return found
+
+    def __iter__(self):
+        for bucket in self.buckets:
+            yield from bucket
+
+
+###############################################################################
+#[2] ROSTER
+
+class Roster:
+    '''
+    An open roster.
+        path: the roster directory (created if missing when writer=True)
+        writer: open for writing; only one process may at a time
+        wait: writer only; wait for another writer to close, rather than raising RosterError
+    Characters are (name, attributes, inventory, skills) as in saves.py, and get ids 0, 1, 2... in the order they're added.
+    '''
+    def __init__(self, path=ROSTER_DIR, writer=False, wait=False):
+        self.path = path
+        self.writer = writer
+        self.data_path = os.path.join(path, 'roster.dat')
+        self.index_path = os.path.join(path, 'roster.idx')
+        self.log_path = os.path.join(path, 'roster.log')
+        self.rank_path = os.path.join(path, 'roster.rank')
+        self.lock = None
+        self.index = None
+        self.generation = None
+        self.codecs = {} #saves header offset: SaveCodec
+        if writer:
+            os.makedirs(path, exist_ok=True)
+            self.lock = open(os.path.join(path, 'roster.lock'), 'w')
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self.lock, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    self.lock.close()
+                    raise RosterError(f'{path} is already open for writing') from None
+            if not os.path.exists(self.index_path):
+                self._create()
+        elif not os.path.exists(self.index_path):
+            raise RosterError(f'no roster at {path}')
+        mode = 'r+b' if writer else 'rb'
+        self.data = open(self.data_path, mode)
+        self.index_file = open(self.index_path, mode)
+        self.log = open(self.log_path, mode)
+        self._map()
+        if writer:
+            self._recover()
+        self.refresh()
+        if writer:
+            self.codec_offset = self._header()[2]
+            self.codec = self._codec(self.codec_offset)
+
+    def _create(self):
+        #Written aside & moved into place, the index last: a roster with an index is complete.
+        for path, content in [(self.data_path, saves.file_header(saves.SaveCodec())),
+                              (self.log_path, b''),
+                              (self.index_path, INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, 0, 0) + bytes(ENTRY.size * INDEX_GROWTH))]:
+            with open(path + '.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(path + '.tmp', path)
+
+    def _map(self):
+        if self.index is not None:
+            self.index.close()
+        access = mmap.ACCESS_WRITE if self.writer else mmap.ACCESS_READ
+        self.index = mmap.mmap(self.index_file.fileno(), 0, access=access)
+        magic, version = INDEX_HEADER.unpack_from(self.index)[:2]
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise RosterError(f'{self.index_path} is not a roster index this game can read')
+
+    def _recover(self):
+        #A writer that died mid-update leaves the sequence odd, or journal entries it never published: finish or drop them.
+        _, _, count, sequence, codec_offset = INDEX_HEADER.unpack_from(self.index)
+        if sequence & 1:
+            self.log.seek((sequence // 2) * CHANGE.size)
+            change = self.log.read(CHANGE.size)
+            if len(change) == CHANGE.size:
+                id, old, score, offset = CHANGE.unpack(change)
+                self._grow_index(id)
+                ENTRY.pack_into(self.index, INDEX_HEADER.size + id * ENTRY.size, offset, score)
+                count = max(count, id + 1)
+                sequence += 1
+            else:
+                sequence -= 1
+            INDEX_HEADER.pack_into(self.index, 0, INDEX_MAGIC, INDEX_VERSION, count, sequence, codec_offset)
+        self.log.truncate((sequence // 2) * CHANGE.size)
+
+    def _read(self, read):
+        '''
+        read() under the seqlock: retried until it runs start to finish without the writer touching the index.  Returns (read()'s result, generation).
+        '''
+        for attempt in range(RETRIES):
+            sequence, = SEQUENCE.unpack_from(self.index, SEQUENCE_AT)
+            if not sequence & 1:
+                try:
+                    result = read()
+                except (IndexError, struct.error): #the writer grew the index: remap & retry
+                    result = None
+                else:
+                    if SEQUENCE.unpack_from(self.index, SEQUENCE_AT)[0] == sequence:
+                        return result, sequence // 2
+            if len(self.index) != os.fstat(self.index_file.fileno()).st_size:
+                self._map()
+            time.sleep(0)
+        raise RosterError(f'{self.index_path} stays mid-update; its writer may have died (open it for writing to recover)')
+
+    def _header(self):
+        #(count, generation, offset of the current saves header)
+        (_, _, count, _, codec_offset), generation = self._read(lambda: INDEX_HEADER.unpack_from(self.index))
+        return count, generation, codec_offset
+
+    def _entry(self, id):
+        #(offset of the id's newest RECORD, score)
+        entry, _ = self._read(lambda: ENTRY.unpack_from(self.index, INDEX_HEADER.size + id * ENTRY.size))
+        return entry
+
+    def _codec(self, offset):
+        #The SaveCodec for the saves header at offset in roster.dat, read exactly (however long its name lists are).
+        codec = self.codecs.get(offset)
+        if codec is None:
+            self.data.seek(offset)
+            head = self.data.read(saves.HEADER.size)
+            try:
+                if len(head) < saves.HEADER.size:
+                    raise saves.SaveError('header is cut short')
+                codec, _ = saves.read_header(head + self.data.read(saves.HEADER.unpack(head)[2]))
+            except saves.SaveError as error:
+                raise RosterError(f'{self.data_path}: bad saves header at byte {offset}: {error}') from None
+            self.codecs[offset] = codec
+        return codec
+
+    def refresh(self):
+        '''
+        Picks up whatever the writer has done since the last refresh: a no-op if nothing has changed, else the new journal entries applied to the leaderboard.
+        '''
+        if self.index is None or len(self.index) != os.fstat(self.index_file.fileno()).st_size:
+            self._map()
+        if self.generation is None:
+            self._load()
+            return
+        count, generation, _ = self._header()
+        if generation != self.generation:
+            self._replay(self.generation, generation)
+            self.generation = generation
+            self.count = count
+
+    def _load(self):
+        #Scores from the index, the leaderboard from roster.rank plus the journal since it was written (or, with no usable roster.rank, sorted from the scores).
+        def read():
+            _, _, count, _, _ = INDEX_HEADER.unpack_from(self.index)
+            entries = self.index[INDEX_HEADER.size:INDEX_HEADER.size + count * ENTRY.size]
+            if len(entries) != count * ENTRY.size:
+                raise IndexError
+            return count, [score for _, score in ENTRY.iter_unpack(entries)]
+        (count, scores), generation = self._read(read)
+        snapshot = self._snapshot(generation)
+        if snapshot is None:
+            self.scores = scores
+            self.ranking = Ranking(sorted((-score, i) for i, score in enumerate(scores)))
+        else:
+            #Replayed from the snapshot's own scores; they end up where the index is.
+            since, pairs = snapshot
+            self.scores = [0] * len(pairs)
+            for negative, id in pairs:
+                self.scores[id] = -negative
+            self.ranking = Ranking(pairs)
+            self._replay(since, generation)
+        self.generation = generation
+        self.count = count
+
+    def _snapshot(self, generation):
+        #(generation, sorted pairs) from roster.rank, or None if there isn't a usable one.
+        try:
+            with open(self.rank_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < RANK_HEADER.size:
+            return None
+        magic, version, since, count = RANK_HEADER.unpack_from(data)
+        if magic != RANK_MAGIC or version != INDEX_VERSION or since > generation or len(data) != RANK_HEADER.size + count * RANK_ENTRY.size:
+            return None
+        return since, list(RANK_ENTRY.iter_unpack(memoryview(data)[RANK_HEADER.size:]))
+
+    def _replay(self, start, end):
+        #Applies journal entries start..end (generations start+1..end).
+        self.log.seek(start * CHANGE.size)
+        data = self.log.read((end - start) * CHANGE.size)
+        if len(data) != (end - start) * CHANGE.size:
+            raise RosterError(f'{self.log_path} is missing entries {start}..{end}')
+        for id, old, score, _ in CHANGE.iter_unpack(data):
+            self._apply(id, old, score)
+
+    def _apply(self, id, old, score):
+        if id == len(self.scores):
+            self.scores.append(score)
+        else:
+            self.ranking.remove((-old, id))
+            self.scores[id] = score
+        self.ranking.insert((-score, id))
+
+    def close(self):
+        if self.writer:
+            self._save_snapshot()
+        self.index.close()
+        self.index_file.close()
+        self.data.close()
+        self.log.close()
+        if self.lock is not None:
+            self.lock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    #--- writing
+    def _save_snapshot(self):
+        with open(self.rank_path + '.tmp', 'wb') as f:
+            f.write(RANK_HEADER.pack(RANK_MAGIC, INDEX_VERSION, self.generation, len(self.ranking)))
+            f.write(b''.join(RANK_ENTRY.pack(*pair) for pair in self.ranking))
+        os.replace(self.rank_path + '.tmp', self.rank_path)
+
+    def _codec_for(self, character):
+        #The current codec, extended with (& a new header appended for) any names the character has that it doesn't.
+        name, attributes, inventory, skills = character
+        codec = self.codec
+        known = set(codec.attributes)
+        new_attributes = [a for a in attributes if a not in known]
+        new_equipment = [item for item in inventory if item not in codec.eqp_bits]
+        new_skills = [skill for skill in skills if skill not in codec.skl_bits]
+        if new_attributes or new_equipment or new_skills:
+            codec = saves.SaveCodec(codec.attributes + new_attributes, codec.equipment + new_equipment, codec.skills + new_skills)
+            self.data.seek(0, os.SEEK_END)
+            self.codec_offset = self.data.tell()
+            self.data.write(saves.file_header(codec))
+            self.codec = self.codecs[self.codec_offset] = codec
+        return codec
+
+    def _append(self, id, character, score):
+        if not self.writer:
+            raise RosterError('roster is open read-only')
+        try:
+            payload = self._codec_for(character).encode(*character)
+        except (KeyError, ValueError) as error:
+            raise RosterError(f'cannot store {character[0]!r}: {error!r}') from None
+        self.data.seek(0, os.SEEK_END)
+        offset = self.data.tell()
+        self.data.write(RECORD.pack(id, len(payload), score, self.codec_offset) + payload)
+        self.data.flush()
+        return offset
+
+    def _grow_index(self, id):
+        if INDEX_HEADER.size + (id + 1) * ENTRY.size > len(self.index):
+            self.index_file.truncate(len(self.index) + ENTRY.size * INDEX_GROWTH)
+            self._map()
+
+    def _publish(self, id, offset, old, score):
+        #Journals the change, points the index at a record that's already on disk under the seqlock, then applies it to the leaderboard.
+        self.log.seek(self.generation * CHANGE.size)
+        self.log.write(CHANGE.pack(id, old, score, offset))
+        self.log.flush()
+        self._grow_index(id)
+        sequence = self.generation * 2
+        count = max(self.count, id + 1)
+        SEQUENCE.pack_into(self.index, SEQUENCE_AT, sequence + 1)
+        ENTRY.pack_into(self.index, INDEX_HEADER.size + id * ENTRY.size, offset, score)
+        INDEX_HEADER.pack_into(self.index, 0, INDEX_MAGIC, INDEX_VERSION, count, sequence + 1, self.codec_offset)
+        SEQUENCE.pack_into(self.index, SEQUENCE_AT, sequence + 2)
+        self.generation += 1
+        self.count = count
+        self._apply(id, old, score)
+
+    def add(self, character, score=0):
+        #Adds a character; returns its id.
+        id = self.count
+        self._publish(id, self._append(id, character, score), 0, score)
+        return id
+
+    def set_score(self, id, score):
+        #Records a new score for id (as a new record; the old one stays in the file).
+        self._publish(id, self._append(id, self.get(id), score), self.scores[id], score)
+
+    #--- reading
+    def get(self, id):
+        '''
+        The character with this id.
+        '''
+        if not 0 <= id < self.count:
+            raise KeyError(id)
+        offset, _ = self._entry(id)
+        self.data.seek(offset)
+        head = self.data.read(RECORD.size)
+        if len(head) < RECORD.size:
+            raise RosterError(f'index entry {id} points past the end of {self.data_path}')
+        record_id, length, _, codec_offset = RECORD.unpack(head)
+        if record_id != id:
+            raise RosterError(f'index entry {id} points at the record for {record_id}')
+        payload = self.data.read(length)
+        try:
+            character, _ = self._codec(codec_offset).decode(payload)
+        except saves.SaveError as error:
+            raise RosterError(f'record for {id}: {error}') from None
+        return character
+
+    def score(self, id):
+        return self.scores[id]
+
+    def rank(self, id):
+        #0 for the best score.  Ties go to the earlier id.
+        return self.ranking.index((-self.scores[id], id))
+
+    def top(self, n=10):
+        #[(id, score), ...] for the best n, best first.
+        return [(id, -negative) for negative, id in self.ranking.first(n)]
+
+
+###############################################################################
+#[3] LEADERBOARD
+
+def seed(roster):
+    '''
+    Fills an empty roster with the original leaderboard (character.score_seed), best first, as fresh characters.
+    '''
+    import character as ch
+    import stats as st
+    for rank, name in sorted(ch.score_seed.items()):
+        attributes = {a:st.ATTRIBUTE_MIN for a in roster.codec.attributes}
+        roster.add((name, attributes, {}, []), score=len(ch.score_seed) - rank)
+
+def open_roster(path=ROSTER_DIR, writer=False):
+    '''
+    Opens the roster, creating & seeding it first if there isn't one yet.  Seeding happens under the writer lock, and only into an empty roster, so two first runs can't both seed it.
+    '''
+    if writer:
+        roster = Roster(path, writer=True)
+        if not len(roster):
+            seed(roster)
+        return roster
+    if not os.path.exists(os.path.join(path, 'roster.idx')):
+        with Roster(path, writer=True, wait=True) as roster:
+            if not len(roster):
+                seed(roster)
+    return Roster(path)
+
+def leaderboard(n=10, path=ROSTER_DIR):
+    '''
+    {rank: name} for the best n.  Reads the roster from disk; with no roster yet it's character.score_seed, and nothing is written.
+    '''
+    if not os.path.exists(os.path.join(path, 'roster.idx')):
+        import character as ch
+        return dict(list(sorted(ch.score_seed.items()))[:n])
+    with Roster(path) as roster:
+        return {rank:roster.get(id)[0] for rank, (id, score) in enumerate(roster.top(n))}
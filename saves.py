@@ -0,0 +1,203 @@
+'''
+           SAVES.PY
+=====================================
+Saving & loading finished characters.  A character is (name, attributes, inventory, skills): a name plus the three values chargen.cast_values() returns.
+
+Binary save files are compact & versioned:
+    header: MAGIC, VERSION, then the attribute, equipment & skill names the records were written against (JSON, length-prefixed)
+    records, back to back, each:
+        name: 1-byte length + UTF-8
+        attributes: one nibble per attribute (values 0..15), two to a byte
+        inventory: bitset, bit i = the header's equipment name i
+        skills: bitset, bit i = the header's skill name i
+A typical character is ~10 bytes plus its name.  Because a file carries its own name lists, it still loads after the catalogs are reordered or grown; a name no longer in the catalog loads as-is.
+
+JSON export writes one character per line, for tools & people.
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] RECORD CODEC
+    [2] FILES
+    [3] JSON EXPORT
+    [4] CURRENT CHARACTER: character.py's globals
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import json
+import struct
+
+import resources as rs
+from bits import byte_bits
+
+MAGIC = b'GLSV'
+VERSION = 1
+HEADER = struct.Struct('<4sBI') #magic, version, length of the JSON name lists that follow
+
+class SaveError(ValueError):
+    #Raised for a file that isn't a save, is from a newer version, or is cut short.
+    pass
+
+
+###############################################################################
+#[1] RECORD CODEC
+
+class SaveCodec:
+    '''
+    Encodes & decodes character records against fixed lists of attribute, equipment & skill names (default: the catalogs, in file order).
+    Lookups are built once, so encode() & decode() are a handful of dict lookups and int conversions per character.
+    '''
+    def __init__(self, attributes=None, equipment=None, skills=None):
+        self.attributes = list(attributes) if attributes is not None else [a['name'] for a in rs.attributes_read_only]
+        self.equipment = list(equipment) if equipment is not None else [e['name'] for e in rs.equipment_read_only]
+        self.skills = list(skills) if skills is not None else [s['name'] for s in rs.skills_read_only]
+        self.att_bytes = (len(self.attributes) + 1) // 2
+        self.eqp_bytes = (len(self.equipment) + 7) // 8
+        self.skl_bytes = (len(self.skills) + 7) // 8
+        self.eqp_bits = {name:1 << i for i, name in enumerate(self.equipment)}
+        self.skl_bits = {name:1 << i for i, name in enumerate(self.skills)}
+
+    def names(self):
+        return {'attributes': self.attributes, 'equipment': self.equipment, 'skills': self.skills}
+
+    def encode(self, name, attributes, inventory, skills):
+        #One character > bytes.
+        packed = 0
+        for i, att in enumerate(self.attributes):
+            value = attributes[att]
+            if not 0 <= value <= 15:
+                raise ValueError(f'{att}={value} does not fit in a nibble')
+            packed |= value << (4 * i)
+        eqp = 0
+        for item in inventory:
+            eqp |= self.eqp_bits[item]
+        skl = 0
+        for skill in skills:
+            skl |= self.skl_bits[skill]
+        name = name.encode()
+        if len(name) > 255:
+            raise ValueError('names are limited to 255 bytes')
+        return b''.join([bytes([len(name)]), name, packed.to_bytes(self.att_bytes, 'little'),
+                         eqp.to_bytes(self.eqp_bytes, 'little'), skl.to_bytes(self.skl_bytes, 'little')])
+
+    def _bitset(self, data, names):
+        return [names[i] for i in byte_bits(data)]
+
+    def decode(self, data, offset=0):
+        '''
+        The character at data[offset:].  Returns (character, offset of the next record).
+        '''
+        try:
+            end = offset + 1 + data[offset]
+            name = bytes(data[offset+1:end]).decode()
+            packed = int.from_bytes(data[end:end+self.att_bytes], 'little')
+            end += self.att_bytes
+            attributes = {att:(packed >> (4 * i)) & 15 for i, att in enumerate(self.attributes)}
+            inventory = {item:False for item in self._bitset(data[end:end+self.eqp_bytes], self.equipment)}
+            end += self.eqp_bytes
+            skills = self._bitset(data[end:end+self.skl_bytes], self.skills)
+            end += self.skl_bytes
+        except (IndexError, UnicodeDecodeError) as error:
+            raise SaveError(f'bad record at byte {offset}: {error}') from None
+        if end > len(data):
+            raise SaveError(f'record at byte {offset} is cut short')
+        return (name, attributes, inventory, skills), end
+
+    def encode_many(self, characters):
+        return b''.join(self.encode(*character) for character in characters)
+
+    def decode_many(self, data, offset=0):
+        #Yields every character in data[offset:].
+        while offset < len(data):
+            character, offset = self.decode(data, offset)
+            yield character
+
+
+###############################################################################
+#[2] FILES
+
+def file_header(codec):
+    names = json.dumps(codec.names(), separators=(',', ':')).encode()
+    return HEADER.pack(MAGIC, VERSION, len(names)) + names
+
+def read_header(data):
+    '''
+    Checks a save's header.  Returns (codec for its records, offset of the first record).
+    '''
+    if len(data) < HEADER.size:
+        raise SaveError('not a save file (too short)')
+    magic, version, size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SaveError('not a save file')
+    if version > VERSION:
+        raise SaveError(f'save version {version} is newer than this game ({VERSION})')
+    try:
+        #JSON that isn't {'attributes': [...], 'equipment': [...], 'skills': [...]} is as damaged as JSON that doesn't parse
+        names = json.loads(bytes(data[HEADER.size:HEADER.size+size]))
+        codec = SaveCodec(names['attributes'], names['equipment'], names['skills'])
+    except (ValueError, KeyError, TypeError):
+        raise SaveError('save header is damaged') from None
+    return codec, HEADER.size + size
+
+def save_characters(path, characters, codec=None):
+    '''
+    Writes characters to a new save file at path.  Returns how many were written.
+    '''
+    codec = codec or SaveCodec()
+    count = 0
+    with open(path, 'wb') as f:
+        f.write(file_header(codec))
+        batch = []
+        for character in characters:
+            batch.append(codec.encode(*character))
+            if len(batch) == 4096:
+                f.write(b''.join(batch))
+                count += len(batch)
+                batch = []
+        f.write(b''.join(batch))
+        count += len(batch)
+    return count
+
+def load_characters(path):
+    '''
+    Yields every character in the save file at path.
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    codec, offset = read_header(data)
+    yield from codec.decode_many(memoryview(data), offset)
+
+
+###############################################################################
+#[3] JSON EXPORT
+
+def to_json(character):
+    name, attributes, inventory, skills = character
+    return {'name': name, 'attributes': attributes, 'inventory': list(inventory), 'skills': list(skills)}
+
+def from_json(record):
+    return record['name'], record['attributes'], {item:False for item in record['inventory']}, list(record['skills'])
+
+def export_json(characters, stream):
+    '''
+    Writes characters to a text stream as JSON lines.  Returns how many were written.
+    '''
+    count = 0
+    for count, character in enumerate(characters, 1):
+        stream.write(json.dumps(to_json(character)) + '\n')
+    return count
+
+
+###############################################################################
+#[4] CURRENT CHARACTER
+
+def current_character():
+    #The character chargen cast into character.py, as a save record.
+    import character as ch
+    return ch.name or '', ch.attributes, ch.inventory, ch.skills
+
+def load_into_character(character):
+    #Casts a loaded character back into character.py's globals.
+    import character as ch
+    ch.name, ch.attributes, ch.inventory, ch.skills = character
@@ -0,0 +1,151 @@
+'''
+           SEARCH.PY
+=====================================
+Type-ahead filtering for the chargen option lists.  Typing '/' on the equipment or skill screen starts a filter; every character typed narrows the list to the options whose name or description has a word starting with each typed term.
+
+The index is a prefix trie over the words of every option's name & description, built once (on the first keystroke of the first filter).  Each trie node holds a bitmask of the options that have a word with that prefix, so:
+    typing a character is one step down the trie & one AND with the terms already finished; the list is never rescanned
+    backspace pops back to the previous step
+    the matches come out in catalog order, straight from the bits
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] INDEX
+    [2] TYPE-AHEAD FILTER
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import re
+
+from bits import set_bits
+
+WORD = re.compile(r'[^\W_]+')
+
+def words(text):
+    #The lowercase words of a name or description; underscores split words, as cleanify() shows them.
+    return WORD.findall(text.lower())
+
+
+###############################################################################
+#[1] INDEX
+
+class TrieNode:
+    __slots__ = ('children', 'mask')
+    def __init__(self):
+        self.children = {}
+        self.mask = 0 #bit i: option i has a word with this node's prefix
+
+class SearchIndex:
+    '''
+    Prefix trie over the words of options' names & descriptions.
+        options: runtime records with .name & .desc (resources.py), in display order
+    '''
+    def __init__(self, options):
+        self.size = len(options)
+        self.all = (1 << self.size) - 1
+        self.root = TrieNode()
+        self.root.mask = self.all
+        for i, opt in enumerate(options):
+            bit = 1 << i
+            for word in set(words(opt.name) + words(opt.desc)):
+                node = self.root
+                for char in word:
+                    child = node.children.get(char)
+                    if child is None:
+                        child = node.children[char] = TrieNode()
+                    child.mask |= bit
+                    node = child
+
+    def search(self, query):
+        #Bitmask of the options matching every term of query, from scratch.  TypeAhead does the same a character at a time.
+        mask = self.all
+        for term in query.lower().split():
+            node = self.root
+            for char in term:
+                node = node.children.get(char)
+                if node is None:
+                    return 0
+            mask &= node.mask
+        return mask
+
+
+###############################################################################
+#[2] TYPE-AHEAD FILTER
+
+class FilteredList:
+    '''
+    The options a filter leaves, as a read-only sequence: view[i] is options[indexes[i]].  Nothing is copied, so the display can window into it as it would the full list.
+    '''
+    __slots__ = ('options', 'indexes')
+    def __init__(self, options, indexes):
+        self.options = options
+        self.indexes = indexes
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __getitem__(self, i):
+        return self.options[self.indexes[i]]
+
+class TypeAhead:
+    '''
+    One screen's filter: the query typed so far and the options it leaves.
+        options: the screen's res_list
+        typing: True while keys go to the query ('/' to start; ENTER to stop & keep the filter, ESCAPE to stop & clear it)
+    Each typed character pushes a step (mask of the finished terms, trie node of the term being typed, mask of the matches); BACKSPACE pops one.
+    '''
+    def __init__(self, options):
+        self.options = options
+        self.index = None #built on the first keystroke
+        self.query = ''
+        self.typing = False
+        self.steps = []
+        self.indexes = range(len(options))
+
+    def _step(self):
+        if not self.steps:
+            if self.index is None:
+                self.index = SearchIndex(self.options)
+            self.steps.append((self.index.all, self.index.root, self.index.all))
+        return self.steps[-1]
+
+    def type(self, char):
+        done, node, mask = self._step()
+        char = char.lower()
+        if char.isspace():
+            step = (mask, self.index.root, mask)
+        else:
+            node = node.children.get(char) if node is not None else None
+            step = (done, node, done & node.mask if node is not None else 0)
+        self.steps.append(step)
+        self.query += char
+        self._update()
+
+    def backspace(self):
+        if self.query:
+            self.steps.pop()
+            self.query = self.query[:-1]
+            self._update()
+
+    def clear(self):
+        self.steps = []
+        self.query = ''
+        self._update()
+
+    def _update(self):
+        if not self.query.strip():
+            self.indexes = range(len(self.options))
+        else:
+            self.indexes = set_bits(self.steps[-1][2])
+
+    def view(self):
+        #The matching options, in catalog order.
+        return FilteredList(self.options, self.indexes)
+
+    def prompt(self):
+        #What the footnote shows: None with no filter, else the query (with a cursor while typing).
+        if not self.typing and not self.query:
+            return None
+        return '/' + self.query + ('_' if self.typing else '')
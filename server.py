@@ -0,0 +1,356 @@
+'''
+           SERVER.PY
+=====================================
+Hosts character generation for many players at once over TCP, from one process.  Connect with a telnet client in a terminal of at least 80x36:
+    python server.py --port 4000
+    telnet localhost 4000
+
+Each connection is a session: its own chargen screens (AttributeScreen, EquipmentScreen, SkillScreen) and its own ScreenBuffer, run as an asyncio task.  The catalogs, the compiled layouts & tab headers and the styling terminal are shared by every session; display.use_screen() points the screen functions at a session's ScreenBuffer while that session renders.
+
+The load test starts a server and drives scripted sessions against it, reporting keypress latency (key sent > first byte of the redraw back):
+    python server.py load-test --sessions 1000 --keys 20
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] TELNET INPUT: bytes > keystrokes
+    [2] SESSIONS
+    [3] LOAD TEST
+    [4] MAIN
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import argparse
+import asyncio
+import socket
+import sys
+import time
+
+import display as dsp
+import chargen
+import tracing
+
+HOST = '127.0.0.1'
+PORT = 4000
+
+#Telnet: IAC WILL ECHO + IAC WILL SUPPRESS-GO-AHEAD puts a telnet client in character-at-a-time mode with local echo off.
+IAC, SB, SE = 255, 250, 240
+NEGOTIATE = bytes([IAC, 251, 1, IAC, 251, 3])
+
+#Input sequences > key names, for the keys chargen uses.
+KEY_SEQUENCES = {
+    '\x1b[A':'KEY_UP', '\x1bOA':'KEY_UP',
+    '\x1b[B':'KEY_DOWN', '\x1bOB':'KEY_DOWN',
+    '\x1b[C':'KEY_RIGHT', '\x1bOC':'KEY_RIGHT',
+    '\x1b[D':'KEY_LEFT', '\x1bOD':'KEY_LEFT',
+    '\x1b[5~':'KEY_PGUP', '\x1b[6~':'KEY_PGDOWN',
+    '\x1b[H':'KEY_HOME', '\x1bOH':'KEY_HOME', '\x1b[1~':'KEY_HOME',
+    '\x1b[F':'KEY_END', '\x1bOF':'KEY_END', '\x1b[4~':'KEY_END',
+    '\x1b[3~':'KEY_DELETE',
+    '\x7f':'KEY_BACKSPACE', '\x08':'KEY_BACKSPACE',
+    '\t':'KEY_TAB',
+    '\r\n':'KEY_ENTER', '\r\x00':'KEY_ENTER', '\r':'KEY_ENTER', '\n':'KEY_ENTER',
+}
+LONGEST_SEQUENCE = max(map(len, KEY_SEQUENCES))
+#What a read can end on partway through a key sequence.
+SEQUENCE_PREFIXES = {seq[:n] for seq in KEY_SEQUENCES for n in range(1, len(seq)) if seq[0] == '\x1b'}
+
+#ESCAPE is also the first byte of the sequences above, so a lone ESC is only taken as the ESCAPE key once nothing has followed it for this long (seconds; blessed's inkey() waits the same).
+ESCAPE_DELAY = 0.35
+
+#Backpressure: a session stops drawing while more than WRITE_HIGH_WATER bytes are waiting to go out to its client, and is dropped if they haven't gone in DRAIN_TIMEOUT seconds.
+WRITE_HIGH_WATER = 64 * 1024
+DRAIN_TIMEOUT = 30
+
+
+###############################################################################
+#[1] TELNET INPUT
+
+class KeyDecoder:
+    '''
+    Turns the bytes a client sends into blessed Keystrokes, the same objects term.inkey() returns locally.  Telnet commands are dropped, and a key split across two reads is held until the rest of it arrives.
+    A read that ends on ESC (or on the start of an escape sequence) is held too: call flush() once ESCAPE_DELAY has passed with nothing more (see waiting) to take it as the ESCAPE key.
+    '''
+    def __init__(self):
+        from blessed.keyboard import Keystroke
+        self.Keystroke = Keystroke
+        self.pending = b''
+        self.after_cr = False #telnet sends ENTER as CR LF or CR NUL, which can be split across reads
+
+    def _strip_telnet(self, data):
+        out = bytearray()
+        i = 0
+        while i < len(data):
+            if data[i] != IAC:
+                out.append(data[i])
+                i += 1
+            elif i + 1 >= len(data):
+                break
+            elif data[i+1] == IAC:
+                out.append(IAC)
+                i += 2
+            elif data[i+1] == SB:
+                end = data.find(bytes([IAC, SE]), i)
+                if end < 0:
+                    break
+                i = end + 2
+            elif i + 2 < len(data):
+                i += 3
+            else:
+                break
+        return bytes(out), data[i:]
+
+    @tracing.traced('decode')
+    def feed(self, data):
+        #Returns the complete keys in pending + data.
+        data, self.pending = self._strip_telnet(self.pending + data)
+        text = data.decode('utf-8', 'ignore')
+        keys = []
+        i = 0
+        if self.after_cr and text[:1] in ('\n', '\x00'):
+            i = 1
+        while i < len(text):
+            for size in range(min(LONGEST_SEQUENCE, len(text) - i), 0, -1):
+                name = KEY_SEQUENCES.get(text[i:i+size])
+                if name:
+                    keys.append(self.Keystroke(text[i:i+size], name=name))
+                    i += size
+                    break
+            else:
+                if text[i:] in SEQUENCE_PREFIXES:
+                    #the start of an escape sequence: wait for the rest
+                    self.pending = text[i:].encode() + self.pending
+                    break
+                keys.append(self._key(text[i]))
+                i += 1
+        if text:
+            self.after_cr = text.endswith('\r')
+        return keys
+
+    def _key(self, char):
+        #One key that isn't in KEY_SEQUENCES: an ESC that nothing valid follows is the ESCAPE key, anything else is itself.
+        if char == '\x1b':
+            return self.Keystroke(char, name='KEY_ESCAPE')
+        return self.Keystroke(char)
+
+    @property
+    def waiting(self):
+        #Whether the last read ended on an ESC that might still turn into a key sequence.
+        return self.pending[:1] == b'\x1b'
+
+    def flush(self):
+        #Takes a held ESC as the ESCAPE key, and whatever followed it as keys of their own.  Call when nothing more has arrived for ESCAPE_DELAY.
+        if not self.waiting:
+            return []
+        rest, self.pending = self.pending[1:], b''
+        return [self._key('\x1b')] + self.feed(rest)
+
+
+###############################################################################
+#[2] SESSIONS
+
+class StreamBackend(dsp.TerminalBackend):
+    '''
+    Display backend that writes to a session's socket.  Writes are buffered by asyncio & sent as the socket allows, so a slow client never stalls the others; the session awaits drain() after every frame, so its buffer stays bounded (WRITE_HIGH_WATER) however slow the client is.
+    '''
+    def __init__(self, term, writer):
+        self.term = term
+        self.writer = writer
+        self.bytes_written = 0
+        self.writes = 0
+
+    def write(self, data):
+        data = data.encode()
+        self.writer.write(data)
+        self.bytes_written += len(data)
+        self.writes += 1
+
+    async def drain(self):
+        #Waits until the client has taken enough of what's been written; a client that stalls for DRAIN_TIMEOUT is dropped.
+        try:
+            await asyncio.wait_for(self.writer.drain(), DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ConnectionError('client stopped reading') from None
+
+class Server:
+    '''
+    The listening server.
+        term: the terminal every session styles for (default: a headless xterm-256color)
+        sessions: the live sessions' tasks.  Held here because asyncio only keeps weak references to tasks, and a session's connection can drop before its task ends.
+    '''
+    def __init__(self, term=None, tick=chargen.FRAME_TICK):
+        self.term = term if term is not None else dsp.headless_terminal()
+        self.tick = tick
+        self.sessions = set()
+
+    async def session(self, reader, writer):
+        #One player, from connect to 'q' (or hang-up).
+        task = asyncio.current_task()
+        self.sessions.add(task)
+        writer.transport.set_write_buffer_limits(high=WRITE_HIGH_WATER)
+        backend = StreamBackend(self.term, writer)
+        screen = dsp.ScreenBuffer(backend, dsp.load_frame())
+        state = chargen.ChargenState(chargen.build_screens())
+        keys = asyncio.Queue()
+        decoder = KeyDecoder()
+
+        def render():
+            with dsp.use_screen(screen):
+                state.render()
+
+        async def read_keys():
+            while True:
+                try:
+                    data = await asyncio.wait_for(reader.read(4096), ESCAPE_DELAY if decoder.waiting else None)
+                except asyncio.TimeoutError:
+                    #a lone ESC: nothing followed it, so it's the ESCAPE key
+                    for key in decoder.flush():
+                        keys.put_nowait(key)
+                    continue
+                if not data:
+                    keys.put_nowait(None) #hung up: ends the session even mid-filter, where 'q' would be typed
+                    return
+                for key in decoder.feed(data):
+                    keys.put_nowait(key)
+
+        writer.write(NEGOTIATE + self.term.clear.encode() + self.term.civis.encode())
+        reading = asyncio.create_task(read_keys())
+        try:
+            await chargen.drive(state, keys, self.tick, render, backend.drain)
+            writer.write((self.term.normal + self.term.clear + self.term.cnorm + 'Thanks for playing GLADIATOR!\r\n').encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            reading.cancel()
+            writer.close()
+            self.sessions.discard(task)
+
+    async def serve(self, host=HOST, port=PORT, ready=None):
+        server = await asyncio.start_server(self.session, host, port)
+        if ready is not None:
+            ready.set_result(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+
+###############################################################################
+#[3] LOAD TEST
+
+#What each scripted session presses: walks every list and toggles a few items, always changing the screen so every key gets a redraw.
+SCRIPT = ['\x1b[B', '\x1b[B', '\x1b[C', '\x1b[A', '\t', '\x1b[B', '\r', '\x1b[B', '\t', '\x1b[B', '\r', '\t']
+
+#A redraw is taken to be over once nothing has arrived for this long (seconds).
+QUIET = 0.02
+
+async def scripted_session(host, port, keys, think, latencies):
+    '''
+    One simulated player: connects, waits for the first screen, then presses `keys` keys from SCRIPT, `think` seconds apart, timing each until its redraw starts arriving.
+    A redraw can arrive in several reads, so output is consumed by a background task and a key is only sent once the previous redraw has stopped arriving; otherwise its tail would be mistaken for the next key's response.
+    '''
+    loop = asyncio.get_running_loop()
+    reader, writer = await asyncio.open_connection(host, port)
+    arrived = asyncio.Event()
+    last = [loop.time()]
+
+    async def consume():
+        while await reader.read(65536):
+            last[0] = loop.time()
+            arrived.set()
+        arrived.set()
+
+    consuming = asyncio.create_task(consume())
+    try:
+        await arrived.wait()
+        for i in range(keys):
+            await asyncio.sleep(think)
+            while loop.time() - last[0] < QUIET:
+                await asyncio.sleep(QUIET)
+            if consuming.done():
+                return
+            arrived.clear()
+            start = time.perf_counter()
+            writer.write(SCRIPT[i % len(SCRIPT)].encode())
+            await arrived.wait()
+            latencies.append(time.perf_counter() - start)
+        writer.write(b'q')
+        await asyncio.wait_for(consuming, 5)
+    finally:
+        consuming.cancel()
+        writer.close()
+
+def percentile(ordered, p):
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+async def load_test(sessions=1000, keys=20, think=0.5, host=None, port=None, ramp=1.0):
+    '''
+    Drives `sessions` scripted sessions at once (started over `ramp` seconds) and returns the sorted keypress latencies in seconds.  With no host, a server is started in a separate process on a free port.
+    '''
+    server = None
+    if host is None:
+        host = HOST
+        with socket.socket() as s:
+            s.bind((host, 0))
+            port = s.getsockname()[1]
+        server = await asyncio.create_subprocess_exec(sys.executable, __file__, '--host', host, '--port', str(port))
+        for _ in range(100):
+            try:
+                _, writer = await asyncio.open_connection(host, port)
+                writer.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.05)
+
+    latencies = []
+    async def staggered(i):
+        await asyncio.sleep(ramp * i / sessions)
+        await scripted_session(host, port, keys, think, latencies)
+    try:
+        results = await asyncio.gather(*[staggered(i) for i in range(sessions)], return_exceptions=True)
+    finally:
+        if server is not None:
+            server.terminate()
+            await server.wait()
+    failed = sum(isinstance(r, Exception) for r in results)
+    return sorted(latencies), failed
+
+
+###############################################################################
+#[4] MAIN
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='GLADIATOR character generation server.')
+    parser.add_argument('mode', nargs='?', choices=['serve', 'load-test'], default='serve')
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--sessions', type=int, default=1000, help='load-test: concurrent sessions')
+    parser.add_argument('--keys', type=int, default=20, help='load-test: keys per session')
+    parser.add_argument('--think', type=float, default=0.5, help='load-test: seconds between keys')
+    parser.add_argument('--ramp', type=float, default=1.0, help='load-test: seconds over which the sessions connect')
+    args = parser.parse_args(argv)
+
+    if args.mode == 'serve':
+        print(f'Serving on {args.host or HOST}:{args.port}', file=sys.stderr)
+        try:
+            asyncio.run(Server().serve(args.host or HOST, args.port))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    #raise the open-file limit where possible: every session is a socket on both ends
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+    start = time.perf_counter()
+    latencies, failed = asyncio.run(load_test(args.sessions, args.keys, args.think, args.host, args.port if args.host else None, args.ramp))
+    elapsed = time.perf_counter() - start
+    print(f'{args.sessions:,} sessions, {len(latencies):,} keypresses in {elapsed:.1f}s ({failed} sessions failed)')
+    if latencies:
+        print(f'keypress latency  p50 {percentile(latencies, 0.5) * 1000:.2f} ms   p99 {percentile(latencies, 0.99) * 1000:.2f} ms   max {latencies[-1] * 1000:.2f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+'''
+           STATS.PY
+=====================================
+Derived combat stats: what a character's attributes, equipment & skills come to in a fight.  Holds the combat rules' numbers (combat.py resolves duels with them) and precomputed lookup tables, so neither combat nor the chargen preview works a formula out per fighter or per turn.
+
+Attributes are small ints (ATTRIBUTE_MIN..ATTRIBUTE_MAX, four of them), so there are only 4**4 = 256 attribute vectors: every stat's attribute part is a row of a 256-row table.  Equipment & skill modifiers are summed per loadout (memoized) and added on.  The non-linear parts (hit chance & stagger chance) are tables indexed by the integer stats they depend on.
+
+The tables are built from the catalogs and rebuilt whenever a catalog's signature changes (i.e. its file was edited & reloaded); tables() always returns the current ones.
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS: the rules
+    [1] DERIVED-STAT TABLES
+    [2] CURRENT TABLES
+    [3] LIVE PREVIEW: incrementally updated stats for the chargen preview panel
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import resources as rs
+
+#The range an attribute can be at game start.
+ATTRIBUTE_MIN = 1
+ATTRIBUTE_MAX = 4
+LEVELS = ATTRIBUTE_MAX - ATTRIBUTE_MIN + 1
+
+#Column order of attribute vectors, and of modifier vectors.
+ATTRIBUTES = ('REF', 'FOR', 'WIT', 'MOX')
+REF, FOR, WIT, MOX = range(len(ATTRIBUTES))
+MODIFIERS = rs.COMBAT_MODIFIERS
+DAMAGE, ARMOR, HIT, DODGE, PAIN, FAVOR = range(len(MODIFIERS))
+
+#The rules' numbers.  See the top of combat.py for how they're used.
+BASE_HEALTH = 10
+HEALTH_PER_FOR = 3
+HIT_BASE = 0.6
+HIT_PER_POINT = 0.08
+HIT_PER_WIT = 0.03
+HIT_MIN, HIT_MAX = 0.05, 0.95
+UNARMED_DAMAGE = 1
+DAMAGE_ROLL = 2
+PAIN_BASE = 0.45
+PAIN_PER_POINT = 0.06
+MAX_ROUNDS = 60
+
+#Equipment in this catalog category is a weapon: only the best weapon's damage counts.  Any other item's damage adds on, as a skill's does.
+WEAPON_CATEGORY = 'weapon'
+
+'''
+Derived stats, all ints.  Column order of the stat vectors.
+    health: starting health (stamina).  BASE_HEALTH + HEALTH_PER_FOR * FOR
+    accuracy: REF + 'hit'; set against the foe's evasion for hit chance
+    evasion: REF + 'dodge'
+    wit: WIT; the difference in wit shifts hit chance
+    damage: best weapon 'damage' (UNARMED_DAMAGE if none) + every other item's & skill's 'damage'
+    armor: 'armor'; taken off every hit received
+    resistance: FOR + 'pain'; indexes stagger chance
+    favor: MOX + 'favor'; crowd favor earned per hit landed
+'''
+STATS = ('health', 'accuracy', 'evasion', 'wit', 'damage', 'armor', 'resistance', 'favor')
+HEALTH, ACCURACY, EVASION, WIT_STAT, DAMAGE_STAT, ARMOR_STAT, RESISTANCE, FAVOR_STAT = range(len(STATS))
+
+#Which modifier feeds which stat (damage is handled separately: weapons don't stack).
+MODIFIER_STATS = {HIT:ACCURACY, DODGE:EVASION, ARMOR:ARMOR_STAT, PAIN:RESISTANCE, FAVOR:FAVOR_STAT}
+
+
+def hit_chance(points, wit):
+    #points: (accuracy - foe's evasion); wit: (wit - foe's wit)
+    return min(max(HIT_BASE + HIT_PER_POINT * points + HIT_PER_WIT * wit, HIT_MIN), HIT_MAX)
+
+def stagger_chance(resistance):
+    #Chance of losing the next attack after being hit.
+    return min(max(PAIN_BASE - PAIN_PER_POINT * resistance, 0), 1)
+
+
+###############################################################################
+#[1] DERIVED-STAT TABLES
+
+def attribute_code(values):
+    #Row of an attribute vector (values in ATTRIBUTES order) in the 256-row table.
+    code = 0
+    for value in reversed(values):
+        code = code * LEVELS + (value - ATTRIBUTE_MIN)
+    return code
+
+class StatTables:
+    '''
+    Lookup tables for one set of catalogs, built once:
+        signature: the catalogs' signatures these tables were built from
+        base: 256 rows (one per attribute_code) of each stat's attribute part
+        equipment, skills: name > index into the catalog
+        eqp_mods, skl_mods: each entry's COMBAT_MODIFIERS
+        hit: hit chance, indexed [points + hit_offset][wit + wit_offset] over every pairing the catalogs allow
+        stagger: stagger chance, indexed [resistance - resistance_offset]
+    derive() answers one character's stats; arrays() gives the same tables as NumPy arrays for combat.py.
+    '''
+    def __init__(self, equipment, skills, signature=None):
+        self.signature = signature
+        self.equipment = {e['name']:i for i, e in enumerate(equipment)}
+        self.skills = {s['name']:i for i, s in enumerate(skills)}
+        self.eqp_mods = [tuple(e.get(m, 0) for m in MODIFIERS) for e in equipment]
+        self.skl_mods = [tuple(s.get(m, 0) for m in MODIFIERS) for s in skills]
+        self.weapons = [e.get('category') == WEAPON_CATEGORY for e in equipment]
+        self._loadouts = {}
+        self._arrays = None
+
+        self.base = []
+        for code in range(LEVELS ** len(ATTRIBUTES)):
+            att = [ATTRIBUTE_MIN + (code // LEVELS ** i) % LEVELS for i in range(len(ATTRIBUTES))]
+            self.base.append((BASE_HEALTH + HEALTH_PER_FOR * att[FOR], att[REF], att[REF], att[WIT], 0, 0, att[FOR], att[MOX]))
+
+        #The extremes a modifier can reach: every positive (or every negative) entry at once
+        def reach(column, sign):
+            return sum(sign * max(sign * mods[column], 0) for mods in self.eqp_mods + self.skl_mods)
+        low, high = ATTRIBUTE_MIN, ATTRIBUTE_MAX
+        points = (low + reach(HIT, -1)) - (high + reach(DODGE, 1)), (high + reach(HIT, 1)) - (low + reach(DODGE, -1))
+        wit = low - high
+        self.hit_offset, self.wit_offset = -points[0], -wit
+        self.hit = [[hit_chance(p, w) for w in range(wit, -wit + 1)] for p in range(points[0], points[1] + 1)]
+        resistance = low + reach(PAIN, -1), high + reach(PAIN, 1)
+        self.resistance_offset = resistance[0]
+        self.stagger = [stagger_chance(r) for r in range(resistance[0], resistance[1] + 1)]
+
+    def loadout(self, inventory, skills):
+        '''
+        Modifier part of the stats for a set of equipment & skill names, as a stat vector.  Memoized per loadout.
+        '''
+        key = (frozenset(inventory), frozenset(skills))
+        stats = self._loadouts.get(key)
+        if stats is None:
+            stats = [0] * len(STATS)
+            weapon = UNARMED_DAMAGE
+            for mods, is_weapon in [(self.eqp_mods[self.equipment[n]], self.weapons[self.equipment[n]]) for n in key[0]] + [(self.skl_mods[self.skills[n]], False) for n in key[1]]:
+                for modifier, stat in MODIFIER_STATS.items():
+                    stats[stat] += mods[modifier]
+                if is_weapon:
+                    weapon = max(weapon, mods[DAMAGE])
+                else:
+                    stats[DAMAGE_STAT] += mods[DAMAGE]
+            stats[DAMAGE_STAT] += weapon
+            stats = self._loadouts[key] = tuple(stats)
+        return stats
+
+    def derive(self, attributes, inventory=(), skills=()):
+        '''
+        A character's derived stats as {stat: value}, plus 'stagger' (chance) and 'hit' (chance against an identical foe).
+            attributes: {name: value}; inventory & skills: names (the chargen.cast_values shape)
+        '''
+        base = self.base[attribute_code([attributes[a] for a in ATTRIBUTES])]
+        stats = dict(zip(STATS, [b + m for b, m in zip(base, self.loadout(inventory, skills))]))
+        stats['stagger'] = self.stagger[stats['resistance'] - self.resistance_offset]
+        stats['hit'] = self.hit[stats['accuracy'] - stats['evasion'] + self.hit_offset][self.wit_offset]
+        return stats
+
+    def arrays(self):
+        '''
+        The tables as NumPy arrays (built on first use): base (256, stats) int32, eqp_mods & skl_mods (entries, modifiers) int16, weapons (entries,) bool, hit & stagger float64.
+        '''
+        if self._arrays is None:
+            import numpy as np
+            self._arrays = {
+                'base': np.array(self.base, dtype=np.int32),
+                'eqp_mods': np.array(self.eqp_mods, dtype=np.int16).reshape(-1, len(MODIFIERS)),
+                'skl_mods': np.array(self.skl_mods, dtype=np.int16).reshape(-1, len(MODIFIERS)),
+                'weapons': np.array(self.weapons, dtype=bool),
+                'hit': np.array(self.hit, dtype=np.float64),
+                'stagger': np.array(self.stagger, dtype=np.float64),
+            }
+        return self._arrays
+
+
+###############################################################################
+#[2] CURRENT TABLES
+
+TABLES = None
+
+def catalog_signature():
+    return tuple(rs.catalog(kind).signature for kind in ('attributes', 'equipment', 'skills'))
+
+def tables():
+    '''
+    The StatTables for the catalogs as they are now, rebuilt only when a catalog's signature has changed since the last call.
+    '''
+    global TABLES
+    signature = catalog_signature()
+    if TABLES is None or TABLES.signature != signature:
+        TABLES = StatTables(rs.equipment_read_only, rs.skills_read_only, signature)
+    return TABLES
+
+
+###############################################################################
+#[3] LIVE PREVIEW
+
+#Which stats each attribute feeds, and which stats the chances are looked up from.
+ATTRIBUTE_DEPENDENTS = {'REF':('accuracy', 'evasion'), 'FOR':('health', 'resistance'), 'WIT':('wit',), 'MOX':('favor',)}
+CHANCE_INPUTS = {'stagger':('resistance',), 'hit':('accuracy', 'evasion')}
+
+class Preview:
+    '''
+    One character's derived stats (as StatTables.derive() gives them), kept up to date as chargen changes one attribute, item or skill at a time.
+    Each change marks only the stats that depend on it; stats() recomputes just those (and the chances looked up from them) and leaves the rest alone.
+        changed: the stats whose values changed at the last stats() call
+    '''
+    def __init__(self, attributes, inventory=(), skills=(), stat_tables=None):
+        self.tables = stat_tables or tables()
+        self.attributes = dict(attributes)
+        self.inventory = set(inventory)
+        self.skills = set(skills)
+        self.values = self.tables.derive(self.attributes, self.inventory, self.skills)
+        self.dirty = set()
+        self.changed = set(self.values)
+
+    def _mark_modifiers(self, mods):
+        #an entry only touches the stats it has a modifier for
+        for modifier, stat in MODIFIER_STATS.items():
+            if mods[modifier]:
+                self.dirty.add(STATS[stat])
+        if mods[DAMAGE]:
+            self.dirty.add('damage')
+
+    def set_attribute(self, name, value):
+        if self.attributes.get(name) != value:
+            self.attributes[name] = value
+            self.dirty.update(ATTRIBUTE_DEPENDENTS.get(name, ()))
+
+    def set_item(self, name, selected):
+        if (name in self.inventory) != selected:
+            (self.inventory.add if selected else self.inventory.discard)(name)
+            self._mark_modifiers(self.tables.eqp_mods[self.tables.equipment[name]])
+
+    def set_skill(self, name, selected):
+        if (name in self.skills) != selected:
+            (self.skills.add if selected else self.skills.discard)(name)
+            self._mark_modifiers(self.tables.skl_mods[self.tables.skills[name]])
+
+    def stats(self):
+        '''
+        The current stats as {stat: value}, recomputing only what the changes since the last call touched.
+        '''
+        self.changed = set()
+        if not self.dirty:
+            return self.values
+        base = self.tables.base[attribute_code([self.attributes[a] for a in ATTRIBUTES])]
+        loadout = self.tables.loadout(self.inventory, self.skills)
+        for stat in self.dirty:
+            i = STATS.index(stat)
+            value = base[i] + loadout[i]
+            if self.values[stat] != value:
+                self.values[stat] = value
+                self.changed.add(stat)
+        for chance, inputs in CHANCE_INPUTS.items():
+            if self.changed.intersection(inputs):
+                value = self._chance(chance)
+                if self.values[chance] != value:
+                    self.values[chance] = value
+                    self.changed.add(chance)
+        self.dirty.clear()
+        return self.values
+
+    def _chance(self, chance):
+        values, tables = self.values, self.tables
+        if chance == 'stagger':
+            return tables.stagger[values['resistance'] - tables.resistance_offset]
+        return tables.hit[values['accuracy'] - values['evasion'] + tables.hit_offset][tables.wit_offset]
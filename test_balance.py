@@ -0,0 +1,52 @@
+'''
+The build-balance pipeline (balance.py): running statistics & streamed reports.  Run with:  python -m pytest
+'''
+
+import io
+import json
+
+import numpy as np
+
+import balance
+import builds
+
+def reference(members, values):
+    #Two-pass mean & m2 per group over all the data at once.
+    count = members.sum(axis=0)
+    mean = np.zeros((members.shape[1], values.shape[1]))
+    m2 = np.zeros_like(mean)
+    for g in range(members.shape[1]):
+        rows = values[members[:, g]]
+        if len(rows):
+            mean[g] = rows.mean(axis=0)
+            m2[g] = ((rows - mean[g]) ** 2).sum(axis=0)
+    return count, mean, m2
+
+def test_chunks_merge_to_the_two_pass_result():
+    rng = np.random.default_rng(2)
+    n, groups = 5000, 6
+    members = rng.random((n, groups)) < 0.4
+    members[:, 5] = False #a group nothing counts towards
+    values = np.stack([rng.random(n), rng.normal(30, 5, n), rng.normal(1e8, 1, n)], axis=1) #the last would cancel in a one-pass sum of squares
+    stats = balance.RunningStats(groups, 3)
+    for start, size in ((0, 1), (1, 999), (1000, 1), (1001, 2499), (3500, 1500)): #uneven chunks, some of one row
+        stats.update(members[start:start+size], values[start:start+size])
+    count, mean, m2 = reference(members, values)
+    assert np.array_equal(stats.count, count)
+    assert np.allclose(stats.mean, mean, rtol=1e-12, atol=0)
+    assert np.allclose(stats.m2, m2, rtol=1e-8, atol=0) #a one-pass sum of squares is off by thousands on the last column
+    std = stats.std()
+    assert np.allclose(std[:5], np.sqrt(m2[:5] / (count[:5, None] - 1)), rtol=1e-8)
+    assert (std[5] == 0).all()
+
+def test_report_is_reproducible():
+    rules = builds.build_rules()
+    runs = []
+    for _ in range(2):
+        out = io.StringIO()
+        names, stats = balance.balance_report(builds.sample_builds(300, 1, rules), rules, games=4, gauntlet=32, seed=5, chunk=128,
+                                              builds_out=balance.LineWriter(out, ['attributes', 'inventory', 'skills'] + list(balance.METRICS), 'json'))
+        runs.append((list(balance.report_rows(names, stats)), out.getvalue()))
+    assert runs[0] == runs[1]
+    rows = [json.loads(line) for line in runs[0][1].splitlines()]
+    assert len(rows) == 300 and all(0 <= row['win_rate'] <= 1 for row in rows)
@@ -0,0 +1,71 @@
+'''
+The build-space enumerator & counter (builds.py).  Run with:  python -m pytest
+'''
+
+import itertools
+
+import pytest
+
+import builds
+
+#Small enough to check against brute force.
+RULES = {
+    'attributes': ['REF', 'FOR', 'WIT'],
+    'attribute_points': 4,
+    'attribute_range': (1, 3),
+    'equipment': ['gladius', 'net', 'trident', 'helm'],
+    'equipment_costs': [2, 1, 3, 2],
+    'equipment_points': 4,
+    'skills': ['wrestler', 'snipe'],
+    'skill_costs': [1, 1],
+    'skill_points': 1,
+}
+
+def brute_force(rules):
+    #Every combination of values & subsets, kept if it fits the budgets.
+    low, high = rules['attribute_range']
+    atts = [att for att in itertools.product(range(low, high + 1), repeat=len(rules['attributes'])) if sum(att) - low * len(att) <= rules['attribute_points']]
+    def subsets(costs, budget):
+        return [s for n in range(len(costs) + 1) for s in itertools.combinations(range(len(costs)), n) if sum(costs[i] for i in s) <= budget]
+    return atts, subsets(rules['equipment_costs'], rules['equipment_points']), subsets(rules['skill_costs'], rules['skill_points'])
+
+def key(build):
+    attributes, inventory, skills = build
+    return tuple(attributes.items()), tuple(inventory), tuple(skills)
+
+def test_enumeration_matches_brute_force():
+    atts, eqps, skls = brute_force(RULES)
+    found = [key(build) for build in builds.enumerate_builds(RULES)]
+    assert len(found) == len(set(found)) == len(atts) * len(eqps) * len(skls)
+    assert set(builds.attribute_vectors(3, 4, 1, 3)) == set(atts)
+    assert sorted(builds.budget_subsets(RULES['equipment_costs'], 4)) == sorted(eqps)
+
+@pytest.mark.parametrize('rules', [RULES, None]) #None: the real catalogs & chargen budgets
+def test_count_matches_enumeration(rules):
+    counts = builds.count_builds(rules)
+    rules = rules or builds.build_rules()
+    low, high = rules['attribute_range']
+    assert counts['attributes'] == sum(1 for _ in builds.attribute_vectors(len(rules['attributes']), rules['attribute_points'], low, high))
+    assert counts['equipment'] == sum(1 for _ in builds.budget_subsets(rules['equipment_costs'], rules['equipment_points']))
+    assert counts['skills'] == sum(1 for _ in builds.budget_subsets(rules['skill_costs'], rules['skill_points']))
+    assert counts['total'] == sum(1 for _ in builds.enumerate_builds(rules))
+
+def test_builds_are_legal():
+    rules = builds.build_rules()
+    low, high = rules['attribute_range']
+    costs = dict(zip(rules['equipment'], rules['equipment_costs']))
+    for attributes, inventory, skills in itertools.chain(itertools.islice(builds.enumerate_builds(rules), 5000), builds.sample_builds(500, 0, rules)):
+        assert all(low <= value <= high for value in attributes.values())
+        assert sum(attributes.values()) - low * len(attributes) <= rules['attribute_points']
+        assert sum(costs[item] for item in inventory) <= rules['equipment_points']
+        assert len(skills) <= rules['skill_points']
+
+def test_sampling_is_uniform_and_seeded():
+    assert list(builds.sample_builds(50, 7, RULES)) == list(builds.sample_builds(50, 7, RULES))
+    total = builds.count_builds(RULES)['total']
+    draws = total * 100
+    seen = {}
+    for build in builds.sample_builds(draws, 1, RULES):
+        seen[key(build)] = seen.get(key(build), 0) + 1
+    assert len(seen) == total #every build comes up
+    assert max(seen.values()) < 2 * min(seen.values()) #and about equally often (100 expected each)
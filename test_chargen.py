@@ -0,0 +1,72 @@
+'''
+The chargen event loop (chargen.py).  Run with:  python -m pytest
+'''
+
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+from blessed.keyboard import Keystroke
+
+import chargen
+import display as dsp
+
+DOWN = Keystroke('\x1b[B', name='KEY_DOWN')
+TAB = Keystroke('\t', name='KEY_TAB')
+
+def test_import_is_light():
+    #Starting the game shouldn't pay for asyncio (or blessed) before the first screen is drawn.
+    code = 'import sys, main; print(sorted({"asyncio", "blessed"} & set(sys.modules)))'
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    assert out.strip() == '[]'
+
+def test_drive_coalesces_queued_keys():
+    #Keys that are already waiting when a frame comes up are all applied, then drawn once.
+    state = chargen.ChargenState(chargen.build_screens())
+    renders = []
+
+    def render():
+        with dsp.use_screen(dsp.ScreenBuffer(dsp.NullBackend(), dsp.load_frame())):
+            state.render()
+        renders.append(state.screens[0].cursor)
+
+    async def session():
+        keys = asyncio.Queue()
+        for _ in range(3):
+            keys.put_nowait(DOWN)
+        drained = []
+        async def drain():
+            drained.append(len(renders))
+        driving = asyncio.create_task(chargen.drive(state, keys, 0.05, render, drain))
+        await asyncio.sleep(0.2)
+        keys.put_nowait(None)
+        await driving
+        return drained
+
+    drained = asyncio.run(session())
+    assert renders == [0, 3] #the first frame, then one for all three keys
+    assert drained == [1, 2] #drain() follows every render
+    assert state.done
+
+def test_finish_or_quit():
+    #SPACE finishes the character; 'q' quits without one.  Typed into a filter, neither does either.
+    for key, finished in ((' ', True), ('q', False)):
+        state = chargen.ChargenState(chargen.build_screens())
+        state.update(Keystroke(key))
+        assert state.done and state.finished == finished
+    state = chargen.ChargenState(chargen.build_screens())
+    for key in [TAB, Keystroke('/'), Keystroke('q'), Keystroke(' ')]:
+        state.update(key)
+    assert not state.done and state.screens[1].filter.query == 'q '
+
+def test_quitting_keeps_nothing(monkeypatch):
+    #main() only names & saves a character the player finished.
+    import main
+    def no_roster(*args, **kwargs):
+        pytest.fail('a quit session was written to the roster')
+    monkeypatch.setattr(chargen, 'run', lambda: ([], False))
+    monkeypatch.setattr(main.roster, 'open_roster', no_roster)
+    monkeypatch.setattr('builtins.input', no_roster)
+    main.main()
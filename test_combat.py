@@ -0,0 +1,90 @@
+'''
+The vectorized combat resolver (combat.py), checked against the rules at the top of combat.py played out one duel at a time in plain Python.  Run with:  python -m pytest
+'''
+
+import random
+
+import numpy as np
+import pytest
+
+import builds
+import combat
+import resources as rs
+import stats as st
+
+def loadout(inventory, skills):
+    #Totals of every modifier, with damage as the rules have it: the best weapon (or unarmed) plus everything else's.
+    entries = [(rs.catalog('equipment').get(name), True) for name in inventory] + [(rs.catalog('skills').get(name), False) for name in skills]
+    mods = {m:sum(entry.get(m, 0) for entry, _ in entries) for m in rs.COMBAT_MODIFIERS}
+    weapons = [entry.get('damage', 0) for entry, is_item in entries if is_item and entry.get('category') == st.WEAPON_CATEGORY]
+    mods['damage'] = max(weapons + [st.UNARMED_DAMAGE]) + sum(entry.get('damage', 0) for entry, is_item in entries if not (is_item and entry.get('category') == st.WEAPON_CATEGORY))
+    return mods
+
+def scalar_duel(a, b, rng):
+    #One duel by the rules, drawing the same random numbers (in the same order & shapes) as resolve_duels does for a batch of one.
+    fighters = []
+    for attributes, inventory, skills in (a, b):
+        fighters.append((attributes, loadout(inventory, skills)))
+    health = [st.BASE_HEALTH + st.HEALTH_PER_FOR * att['FOR'] for att, mods in fighters]
+    favor = [0, 0]
+    staggered = [False, False]
+    chance, stagger = [], []
+    for k in range(2):
+        (att, mods), (foe, foe_mods) = fighters[k], fighters[1-k]
+        chance.append(st.hit_chance((att['REF'] + mods['hit']) - (foe['REF'] + foe_mods['dodge']), att['WIT'] - foe['WIT']))
+        stagger.append(st.stagger_chance(att['FOR'] + mods['pain']))
+    rounds = 0
+    for round_no in range(1, st.MAX_ROUNDS + 1):
+        if min(health) <= 0:
+            break
+        rolls, damage_rolls = rng.random((1, 2))[0], rng.integers(0, st.DAMAGE_ROLL + 1, (1, 2))[0]
+        hits = [rolls[k] < chance[k] and not staggered[k] for k in range(2)]
+        damage = [max(fighters[k][1]['damage'] + damage_rolls[k] - fighters[1-k][1]['armor'], 1) if hits[k] else 0 for k in range(2)]
+        pain_rolls = rng.random((1, 2))[0]
+        for k in range(2):
+            health[k] -= damage[1-k]
+            if hits[k]:
+                favor[k] += fighters[k][0]['MOX'] + fighters[k][1]['favor']
+            staggered[k] = damage[1-k] > 0 and pain_rolls[k] < stagger[k]
+        rounds = round_no
+    winner = int(health[1] > health[0] or (health[1] == health[0] and favor[1] > favor[0]))
+    return winner, rounds, favor, health
+
+@pytest.fixture(scope='module')
+def sample():
+    return list(builds.sample_builds(60, 3))
+
+def test_duels_follow_the_rules(sample):
+    fighters = combat.encode_fighters(sample)
+    for i in range(0, len(sample), 2):
+        result = combat.resolve_duels(fighters.take(np.array([i])), fighters.take(np.array([i+1])), rng=i)
+        winner, rounds, favor, health = scalar_duel(sample[i], sample[i+1], np.random.default_rng(i))
+        assert (result['winner'][0], result['rounds'][0]) == (winner, rounds)
+        assert result['favor'][0].tolist() == favor and result['health'][0].tolist() == health
+
+def test_encoded_stats_match_derive(sample):
+    fighters = combat.encode_fighters(sample)
+    tables = st.tables()
+    for row, (attributes, inventory, skills) in zip(fighters.stats, sample):
+        derived = tables.derive(attributes, inventory, skills)
+        assert row.tolist() == [derived[stat] for stat in st.STATS]
+
+def test_catalogs_past_64_entries():
+    #Bitsets take as many 64-bit words as the catalog needs.
+    equipment = [{'name':f'item_{i}', 'desc':'', 'value':1, 'category':'weapon' if i % 3 == 0 else 'armor', 'damage':i % 7, 'armor':i % 2} for i in range(150)]
+    skills = [{'name':f'skill_{i}', 'desc':'', 'dodge':1} for i in range(70)]
+    tables = st.StatTables(equipment, skills)
+    rng = random.Random(5)
+    picks = [({a:rng.randint(1, 4) for a in st.ATTRIBUTES}, {f'item_{i}':False for i in rng.sample(range(150), 6)}, [f'skill_{i}' for i in rng.sample(range(70), 3)]) for _ in range(40)]
+    fighters = combat.encode_fighters(picks, tables)
+    assert fighters.equipment.shape == (40, 3) and fighters.skills.shape == (40, 2)
+    for row, (attributes, inventory, skills) in zip(fighters.stats, picks):
+        derived = tables.derive(attributes, inventory, skills)
+        assert row.tolist() == [derived[stat] for stat in st.STATS]
+
+def test_duels_are_reproducible(sample):
+    fighters = combat.encode_fighters(sample)
+    a, b = fighters.take(np.arange(0, 60, 2)), fighters.take(np.arange(1, 60, 2))
+    first, second = combat.resolve_duels(a, b, rng=9), combat.resolve_duels(a, b, rng=9)
+    assert all(np.array_equal(first[key], second[key]) for key in first)
+    assert ((first['health'] <= 0).any(axis=1) | (first['rounds'] == st.MAX_ROUNDS)).all() #every duel ran to an end
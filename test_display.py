@@ -0,0 +1,128 @@
+'''
+Golden snapshots of the chargen screens, drawn headless (display.BufferBackend) by replaying keys through a session (replay.play).  Run with:  python -m pytest
+A snapshot keeps the styles inline, so highlighting & selection are checked along with the text.  After an intended change to the look of a screen (or to the catalogs), rewrite the golden files and review the diff:
+    GLADIATOR_GOLDEN=update python -m pytest test_display.py
+'''
+
+import os
+
+import pytest
+from blessed.keyboard import Keystroke
+
+import chargen
+import display as dsp
+import replay
+import search
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+TAB = Keystroke('\t', name='KEY_TAB')
+DOWN = Keystroke('\x1b[B', name='KEY_DOWN')
+RIGHT = Keystroke('\x1b[C', name='KEY_RIGHT')
+END = Keystroke('\x1b[F', name='KEY_END')
+ENTER = Keystroke('\n', name='KEY_ENTER')
+PAGE_DOWN = Keystroke('\x1b[6~', name='KEY_PGDOWN')
+
+SESSIONS = {
+    'attributes': [DOWN, RIGHT, RIGHT],
+    'equipment': [TAB, DOWN, ENTER, DOWN, DOWN, ENTER],
+    'equipment_filtered': [TAB, Keystroke('/'), Keystroke('s'), Keystroke('h')],
+    'equipment_no_matches': [TAB, Keystroke('/'), Keystroke('z'), Keystroke('q'), Keystroke('x')],
+    'skills': [TAB, TAB, END, ENTER],
+}
+
+def snapshot(keys, screens=None):
+    backend = dsp.BufferBackend()
+    replay.play(keys, backend, screens)
+    return '\n'.join(backend.snapshot(styled=True)) + '\n'
+
+def check(name, text):
+    path = os.path.join(GOLDEN_DIR, name + '.txt')
+    if os.environ.get('GLADIATOR_GOLDEN') == 'update':
+        os.makedirs(GOLDEN_DIR, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return
+    with open(path, encoding='utf-8') as f:
+        assert text == f.read(), f'{name} no longer matches {path}'
+
+@pytest.mark.parametrize('name', SESSIONS)
+def test_golden(name):
+    check(name, snapshot(SESSIONS[name]))
+
+def test_template_background_built_once():
+    #Static parts are drawn into the screen's background on the first render only; later frames reuse it.
+    screen = dsp.set_backend(dsp.BufferBackend())
+    for cursor in range(3):
+        dsp.option_list_display(cursor, chargen.build_screens()[1].res_list, dsp.equipment_row)
+    assert list(screen.bases) == [dsp.LIST_TEMPLATE]
+
+def test_template_unknown_kind():
+    with pytest.raises(ValueError, match='unknown kind'):
+        dsp.compile_template({'panes': {'box': {'kind':'table', 'x':0, 'y':0}}})
+
+def test_list_window():
+    assert dsp.list_window(3, 10, height=20) == (0, 10, None, None)
+    assert dsp.list_window(0, 100, height=20) == (0, 18, ' ', '▼ 82 more')
+    assert dsp.list_window(50, 100, height=20) == (41, 59, '▲ 41 more', '▼ 41 more') #cursor mid-window
+    assert dsp.list_window(99, 100, height=20) == (82, 100, '▲ 82 more', ' ')
+
+def test_scrolled_list():
+    #A catalog four times the size of the pane, scrolled down past the first page.
+    screens = chargen.build_screens()
+    equipment = screens[1]
+    equipment.res_list = equipment.res_list * 4
+    equipment.filter = search.TypeAhead(equipment.res_list)
+    equipment.view = equipment.filter.view()
+    equipment.cursor_range = chargen.list_to_range(equipment.view)
+    check('equipment_scrolled', snapshot([TAB, PAGE_DOWN, PAGE_DOWN, DOWN], screens))
+
+def test_description_pages():
+    #A description too tall for its pane, on its third page.
+    screens = chargen.build_screens()
+    screens[1].res_list[0].desc = ' '.join(['Forged in the fires of the arena, tempered in blood.'] * 12)
+    check('description_page_3', snapshot([TAB, Keystroke(']'), Keystroke(']')], screens))
+
+def test_wrap_limits():
+    #The smallest box still hyphenates & pages; anything smaller is refused up front.
+    smallest = {'width':dsp.WRAP_MIN_WIDTH + 2, 'height':dsp.WRAP_MIN_HEIGHT}
+    pages = dsp.wrap_pages('abcdefg hi', smallest)
+    assert [page[0] for page in pages] == [' ab-', ' cd-', ' ef-', ' g', ' hi']
+    assert pages[-1][-1] == dsp.PAGE_MARKER.format(page=5, pages=5)
+    for limits in ({'width':smallest['width'] - 1, 'height':2}, {'width':20, 'height':1}):
+        with pytest.raises(ValueError, match='Cannot wrap'):
+            dsp.wrap_text('text', limits)
+
+def test_layout_cache_counts():
+    #The same text & limits are laid out once; later calls are hits.
+    dsp.layout_cache_clear()
+    text = ' '.join(['cached'] * 30)
+    first = dsp.wrap_text(text, dsp.DESC_MAX)
+    assert dsp.layout_cache_info()[:2] == (0, 1)
+    first.append('mutated') #callers get a copy, never the cached layout
+    assert dsp.wrap_text(text, dsp.DESC_MAX) == first[:-1]
+    dsp.v_justify(5, ['a', 'b'])
+    dsp.v_justify(5, ['a', 'b'])
+    dsp.h_justify(20, ['a', 'b'])
+    info = dsp.layout_cache_info()
+    assert (info.hits, info.misses, info.currsize) == (2, 3, 3)
+    dsp.layout_cache_clear()
+    assert dsp.layout_cache_info()[:2] == (0, 0)
+
+def test_tab_header_compiled_once():
+    #Every position's header is built up front from a copy of the tabs; the caller's list is left alone.
+    dsp.set_backend(dsp.BufferBackend())
+    tabs = ['ATTRIBUTES', 'EQUIPMENT', 'SKILLS']
+    variants = dsp.compile_tab_header(tabs)
+    assert tabs == ['ATTRIBUTES', 'EQUIPMENT', 'SKILLS']
+    assert len(variants) == 3 and all(len(rows) == 3 for rows in variants)
+    assert len({dsp.text_width(row) for rows in variants for row in rows}) == 1 #every row the same width
+    assert variants[0][0] == variants[2][0] and variants[0][1] != variants[2][1] #only the highlight moves
+    for position in (0, 1, 2, 0):
+        dsp.tab_header(tabs, position)
+    assert list(dsp.TAB_HEADERS) == [tuple(tabs)] and tabs == ['ATTRIBUTES', 'EQUIPMENT', 'SKILLS']
+
+def test_tab_header_too_wide():
+    dsp.set_backend(dsp.BufferBackend())
+    with pytest.raises(Exception, match='exceeds'):
+        dsp.compile_tab_header(['X' * 30, 'Y' * 30])
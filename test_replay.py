@@ -0,0 +1,77 @@
+'''
+The replay log format & playback (replay.py).  Run with:  python -m pytest
+'''
+
+import io
+
+import pytest
+from blessed.keyboard import Keystroke
+
+import display as dsp
+import replay
+
+KEYS = [Keystroke('\t', name='KEY_TAB'), Keystroke('\x1b[B', name='KEY_DOWN'), Keystroke('\n', name='KEY_ENTER'),
+        Keystroke('/'), Keystroke('s'), Keystroke('\x1b', name='KEY_ESCAPE'), Keystroke(']'),
+        Keystroke('é'), Keystroke('\x1b[24~', name='KEY_F12')] #the last two don't have a 1-byte code
+
+def same_keys(a, b):
+    return [(str(key), key.name) for key in a] == [(str(key), key.name) for key in b]
+
+def test_log_round_trip():
+    timed = [(i * 0.25, key) for i, key in enumerate(KEYS)] + [(1000.0, Keystroke('q'))]
+    started, keys = replay.read_log(replay.encode_log(timed, started=12.5))
+    assert started == 12.5
+    assert [at for at, key in keys] == [at for at, key in timed]
+    assert same_keys([key for at, key in keys], [key for at, key in timed])
+
+def test_named_keys_take_one_byte():
+    for name, text in replay.KEYS:
+        assert len(replay.encode_key(Keystroke(text, name=name))) == 1
+
+def test_recorder_matches_encode_log():
+    clock = iter([0.0, 0.1, 0.35, 0.35, 2.0]).__next__
+    stream = io.BytesIO()
+    recorder = replay.Recorder(stream, clock)
+    for key in KEYS[:4]:
+        recorder.record(key)
+    started, keys = replay.read_log(stream.getvalue())
+    assert recorder.count == 4
+    assert [at for at, key in keys] == [0.1, 0.35, 0.35, 2.0]
+    assert same_keys([key for at, key in keys], KEYS[:4])
+
+def test_not_a_recording():
+    with pytest.raises(replay.ReplayError):
+        replay.read_log(b'GL')
+    with pytest.raises(replay.ReplayError):
+        replay.read_log(b'XXXX' + replay.encode_log([])[4:])
+
+def test_newer_version():
+    data = bytearray(replay.encode_log([]))
+    data[4] = replay.VERSION + 1
+    with pytest.raises(replay.ReplayError, match='newer'):
+        replay.read_log(bytes(data))
+
+def test_cut_short():
+    timed = [(0.0, KEYS[-1]), (300.0, KEYS[0])]
+    data = replay.encode_log(timed)
+    boundaries = {len(replay.encode_log(timed[:n])):n for n in range(len(timed) + 1)} #cut between records: a shorter, valid log
+    for cut in range(replay.HEADER.size, len(data)):
+        if cut in boundaries:
+            assert len(replay.read_log(data[:cut])[1]) == boundaries[cut]
+        else:
+            with pytest.raises(replay.ReplayError):
+                replay.read_log(data[:cut])
+
+def test_playback_is_deterministic():
+    keys = KEYS[:3] + [Keystroke('\t', name='KEY_TAB'), Keystroke('\n', name='KEY_ENTER')]
+    screens = []
+    for _ in range(2):
+        backend = dsp.BufferBackend()
+        state = replay.play(keys, backend)
+        screens.append((backend.snapshot(styled=True), replay.choices(state)))
+    assert screens[0] == screens[1]
+    assert screens[0][1][1] #the ENTER on the equipment screen took an item
+
+def test_playback_stops_at_q():
+    state = replay.play([Keystroke('q'), Keystroke('\t', name='KEY_TAB')])
+    assert state.done and state.tab == 0
@@ -0,0 +1,119 @@
+'''
+Catalog loading (resources.py): the precompiled cache & its invalidation, and bad catalog files.  Run with:  python -m pytest
+'''
+
+import os
+import re
+import shutil
+
+import pytest
+
+import resources as rs
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / 'equipment.json')
+    shutil.copy(os.path.join(rs.CONTENT_DIR, 'equipment.json'), path)
+    return path
+
+@pytest.fixture
+def calls(monkeypatch):
+    #How often a load parsed the source (a cache miss) and hashed it (the source's mtime or size moved).
+    counts = {'parsed':0, 'hashed':0}
+    read_catalog_file, file_digest = rs.read_catalog_file, rs._file_digest
+    def counted(name, function):
+        def wrapper(*args):
+            counts[name] += 1
+            return function(*args)
+        return wrapper
+    monkeypatch.setattr(rs, 'read_catalog_file', counted('parsed', read_catalog_file))
+    monkeypatch.setattr(rs, '_file_digest', counted('hashed', file_digest))
+    return counts
+
+def load(path, calls):
+    before = dict(calls)
+    catalog = rs.load_catalog('equipment', path)
+    return catalog, {name:calls[name] - before[name] for name in calls}
+
+def test_cache_hit(source, calls):
+    built, counts = load(source, calls)
+    assert counts['parsed'] == 1 and os.path.exists(source + rs.CACHE_SUFFIX)
+    cached, counts = load(source, calls)
+    assert counts == {'parsed':0, 'hashed':0}
+    assert cached.records == built.records and cached.signature == built.signature
+    assert cached.by_name['gladius'] is cached.records[0] #the indexes share the records
+
+def test_touched_source(source, calls):
+    #A new mtime with the same contents: hashed once, reused, and the cache rewritten so the next load doesn't hash again.
+    load(source, calls)
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load(source, calls)[1] == {'parsed':0, 'hashed':1}
+    assert load(source, calls)[1] == {'parsed':0, 'hashed':0}
+    assert not [name for name in os.listdir(os.path.dirname(source)) if name.endswith('.tmp')]
+
+def edit(path, old, new, keep_mtime=False):
+    stat = os.stat(path)
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text.replace(old, new, 1))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + (0 if keep_mtime else 10**9)))
+
+@pytest.mark.parametrize('old, new, keep_mtime', [
+    ('duhhhh a sword', 'duhhhh a spear', False), #same size, new mtime: the hash decides
+    ('duhhhh a sword', 'duhhhh a big sword', True), #same mtime, new size
+])
+def test_changed_source(source, calls, old, new, keep_mtime):
+    load(source, calls)
+    edit(source, old, new, keep_mtime)
+    catalog, counts = load(source, calls)
+    assert counts['parsed'] == 1
+    assert catalog.by_name['gladius']['desc'] == new
+
+def test_new_build(source, calls, monkeypatch):
+    #A cache written by another schema or validator (or Python) is never used.
+    load(source, calls)
+    monkeypatch.setattr(rs, 'VALIDATOR_VERSION', rs.VALIDATOR_VERSION + 1)
+    assert load(source, calls)[1]['parsed'] == 1
+    monkeypatch.setitem(rs.CATALOG_SCHEMA, 'equipment', {**rs.CATALOG_SCHEMA['equipment'], 'optional':{'category':str}})
+    assert load(source, calls)[1]['parsed'] == 1
+
+def test_damaged_cache(source, calls):
+    load(source, calls)
+    with open(source + rs.CACHE_SUFFIX, 'r+b') as f:
+        f.truncate(rs.CACHE_HEADER.size + 10)
+    catalog, counts = load(source, calls)
+    assert counts['parsed'] == 1 and len(catalog) > 0
+
+def write(tmp_path, name, text):
+    path = str(tmp_path / name)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+@pytest.mark.parametrize('name, text', [
+    ('equipment.json', '{"equipment": [{"name": "gladius",'),
+    ('equipment.toml', '[[equipment]]\nname = "gladius'),
+])
+def test_unparseable_catalog(tmp_path, name, text):
+    #A file that doesn't parse is a CatalogError naming it, like any other bad catalog.
+    path = write(tmp_path, name, text)
+    with pytest.raises(rs.CatalogError, match=re.escape(path)):
+        rs.load_catalog('equipment', path, use_cache=False)
+
+@pytest.mark.parametrize('entries, problem', [
+    ('{"name": "gladius", "desc": "a sword"}', 'missing required field'),
+    ('{"name": "gladius", "desc": "a sword", "value": true}', 'should be int'),
+    ('{"name": "gladius", "desc": "a sword", "value": 2}, {"name": "gladius", "desc": "again", "value": 1}', 'duplicate name'),
+    ('"gladius"', 'expected an object'),
+])
+def test_bad_schema(tmp_path, entries, problem):
+    path = write(tmp_path, 'equipment.json', f'{{"equipment": [{entries}]}}')
+    with pytest.raises(rs.CatalogError, match=problem):
+        rs.load_catalog('equipment', path, use_cache=False)
+
+def test_wrong_top_level(tmp_path):
+    path = write(tmp_path, 'equipment.json', '{"skills": []}')
+    with pytest.raises(rs.CatalogError, match='top-level'):
+        rs.load_catalog('equipment', path, use_cache=False)
@@ -0,0 +1,175 @@
+'''
+The roster store (roster.py): round trips, readers following a writer, catalog growth, crash recovery & damaged files.  Run with:  python -m pytest
+'''
+
+import random
+
+import pytest
+
+import roster
+import saves
+
+def character(name, items=(), skills=()):
+    return name, {'REF':1, 'FOR':2, 'WIT':3, 'MOX':4}, {item:False for item in items}, list(skills)
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'roster')
+
+@pytest.fixture
+def writer(path):
+    with roster.Roster(path, writer=True) as league:
+        yield league
+
+def test_add_get_round_trip(writer):
+    item = writer.codec.equipment[0]
+    id = writer.add(character('Spartacus', [item], writer.codec.skills[:1]), score=5)
+    assert writer.get(id) == character('Spartacus', [item], writer.codec.skills[:1])
+    assert writer.score(id) == 5
+    with pytest.raises(KeyError):
+        writer.get(id + 1)
+
+def test_leaderboard_order(writer):
+    for i, score in enumerate([3, 9, 3, 1]):
+        writer.add(character(f'g{i}'), score)
+    assert writer.top(3) == [(1, 9), (0, 3), (2, 3)] #ties go to the earlier id
+    assert [writer.rank(i) for i in range(4)] == [1, 0, 2, 3]
+    writer.set_score(3, 10)
+    assert writer.top(1) == [(3, 10)]
+    assert writer.get(3) == character('g3')
+
+def test_reader_follows_writer(path, writer):
+    writer.add(character('a'), 1)
+    with roster.Roster(path) as reader:
+        assert reader.top() == [(0, 1)]
+        writer.add(character('b'), 2)
+        writer.set_score(0, 3)
+        reader.refresh()
+        assert reader.top() == writer.top() == [(0, 3), (1, 2)]
+        assert reader.get(1) == character('b')
+        with pytest.raises(roster.RosterError):
+            reader.add(character('c'))
+
+def test_reopen_from_snapshot(path):
+    rng = random.Random(0)
+    with roster.Roster(path, writer=True) as league:
+        for i in range(300):
+            league.add(character(f'g{i}'), rng.randrange(50))
+        for _ in range(300):
+            league.set_score(rng.randrange(300), rng.randrange(50))
+        expected = league.top(300)
+    with roster.Roster(path, writer=True) as league:
+        #changes after the snapshot come from the journal
+        league.set_score(7, 100)
+        expected = [(7, 100)] + [pair for pair in expected if pair[0] != 7]
+        with roster.Roster(path) as reader:
+            assert reader.top(300) == expected
+    with roster.Roster(path) as reader:
+        assert reader.top(300) == expected
+
+def test_catalog_growth(path, writer):
+    #Names the roster's codec has never seen get a new saves header; older records keep theirs.
+    old = writer.add(character('old', writer.codec.equipment[:1]))
+    new = writer.add(character('new', ['laser_sword'], ['flying']))
+    assert writer.get(new) == character('new', ['laser_sword'], ['flying'])
+    with roster.Roster(path) as reader:
+        assert reader.get(old) == character('old', writer.codec.equipment[:1])
+        assert reader.get(new) == character('new', ['laser_sword'], ['flying'])
+
+def test_large_header(path, writer):
+    items = [f'modded_item_with_a_long_name_{i:05d}' for i in range(5000)] #a header well over 64 KB
+    id = writer.add(character('hoarder', items))
+    with roster.Roster(path) as reader:
+        assert reader.get(id) == character('hoarder', items)
+
+def test_unstorable_character(writer):
+    name, attributes, inventory, skills = character('bad')
+    with pytest.raises(roster.RosterError):
+        writer.add((name, {}, inventory, skills))
+    with pytest.raises(roster.RosterError):
+        writer.add((name, dict(attributes, REF=16), inventory, skills))
+    assert len(writer) == 0
+
+@pytest.mark.skipif(roster.fcntl is None, reason='no fcntl: the single-writer rule is up to the caller')
+def test_one_writer(path, writer):
+    with pytest.raises(roster.RosterError):
+        roster.Roster(path, writer=True)
+
+def test_seeded_once(path):
+    with roster.open_roster(path, writer=True) as league:
+        seeded = len(league)
+        assert seeded > 0
+    with roster.open_roster(path, writer=True) as league:
+        assert len(league) == seeded
+    with roster.open_roster(path) as league:
+        assert len(league) == seeded
+
+def test_leaderboard_without_roster(tmp_path):
+    import character as ch
+    path = tmp_path / 'none'
+    assert roster.leaderboard(path=str(path)) == ch.score_seed
+    assert not path.exists()
+
+def test_character_score_reads_the_roster(path, monkeypatch):
+    #character.score is the live leaderboard.
+    import character as ch
+    leaderboard = roster.leaderboard
+    monkeypatch.setattr(roster, 'leaderboard', lambda n=10: leaderboard(n, path))
+    assert ch.score == ch.score_seed
+    with roster.open_roster(path, writer=True) as league:
+        league.add(character('Spartacus'), score=100)
+        assert ch.score[0] == 'Spartacus'
+    assert list(ch.score.values())[1:] == list(ch.score_seed.values())
+
+def test_recovers_from_dead_writer(path, monkeypatch):
+    #A writer killed between publishing steps leaves the sequence number odd: readers give up, the next writer finishes the update.
+    monkeypatch.setattr(roster, 'RETRIES', 5)
+    league = roster.Roster(path, writer=True)
+    league.add(character('a'), 1)
+    offset = league._append(1, character('b'), 2)
+    league.log.seek(league.generation * roster.CHANGE.size)
+    league.log.write(roster.CHANGE.pack(1, 0, 2, offset))
+    league.log.flush()
+    roster.SEQUENCE.pack_into(league.index, roster.SEQUENCE_AT, league.generation * 2 + 1)
+    league.index.flush()
+    league.lock.close()
+    with pytest.raises(roster.RosterError, match='mid-update'):
+        roster.Roster(path)
+    with roster.Roster(path, writer=True) as recovered:
+        assert recovered.top() == [(1, 2), (0, 1)]
+        assert recovered.get(1) == character('b')
+
+def test_not_a_roster(path, writer):
+    with open(writer.index_path, 'r+b') as f:
+        f.write(b'XXXX')
+    with pytest.raises(roster.RosterError):
+        roster.Roster(path)
+
+def test_damaged_record(path, writer):
+    id = writer.add(character('a'))
+    offset, _ = writer._entry(id)
+    writer.data.seek(offset + roster.RECORD.size)
+    writer.data.write(b'\xff')
+    writer.data.flush()
+    with pytest.raises(roster.RosterError):
+        writer.get(id)
+
+def test_ranking_matches_sorted():
+    rng = random.Random(1)
+    ranking = roster.Ranking()
+    pairs = []
+    for i in range(5000):
+        if pairs and rng.random() < 0.4:
+            pair = pairs.pop(rng.randrange(len(pairs)))
+            ranking.remove(pair)
+        else:
+            pair = (-rng.randrange(100), i)
+            pairs.append(pair)
+            ranking.insert(pair)
+    pairs.sort()
+    assert list(ranking) == pairs
+    assert ranking.first(20) == pairs[:20]
+    for pair in pairs[::37]:
+        assert ranking.index(pair) == pairs.index(pair)
+    with pytest.raises(roster.RosterError):
+        ranking.remove((1, -1))
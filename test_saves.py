@@ -0,0 +1,97 @@
+'''
+Round trips & error paths for the binary save format (saves.py).  Run with:  python -m pytest
+'''
+
+import io
+import json
+
+import pytest
+
+import saves
+
+ATTRIBUTES = ['REF', 'FOR', 'WIT', 'MOX']
+EQUIPMENT = [f'item_{i}' for i in range(70)] #more than 64: bitsets span several words
+SKILLS = ['wrestler', 'sprinter', 'snipe']
+
+def character(name='Spartacus', items=('item_0', 'item_69'), skills=('snipe',)):
+    return name, {'REF':1, 'FOR':4, 'WIT':2, 'MOX':15}, {item:False for item in items}, list(skills)
+
+@pytest.fixture
+def codec():
+    return saves.SaveCodec(ATTRIBUTES, EQUIPMENT, SKILLS)
+
+def test_record_round_trip(codec):
+    data = codec.encode(*character())
+    assert codec.decode(data) == (character(), len(data))
+
+def test_many_round_trip(codec):
+    characters = [character(f'Gladiator {i}', EQUIPMENT[i:i+3], SKILLS[:i % 4]) for i in range(50)]
+    assert list(codec.decode_many(codec.encode_many(characters))) == characters
+
+def test_file_round_trip(tmp_path, codec):
+    path = tmp_path / 'league.sav'
+    characters = [character(), character('Crixus', (), ())]
+    assert saves.save_characters(path, characters, codec) == 2
+    assert list(saves.load_characters(path)) == characters
+
+def test_file_keeps_its_own_names(tmp_path, codec):
+    #A save still loads after the catalogs are reordered or grown: it carries the names it was written against.
+    path = tmp_path / 'league.sav'
+    saves.save_characters(path, [character()], codec)
+    header, _ = saves.read_header(path.read_bytes())
+    assert header.names() == codec.names()
+    assert list(saves.load_characters(path)) == [character()]
+
+def test_unicode_name(codec):
+    data = codec.encode(*character('Ἀχιλλεύς'))
+    assert codec.decode(data)[0][0] == 'Ἀχιλλεύς'
+
+def test_name_too_long(codec):
+    with pytest.raises(ValueError):
+        codec.encode(*character('x' * 256))
+
+def test_attribute_out_of_range(codec):
+    name, attributes, inventory, skills = character()
+    with pytest.raises(ValueError):
+        codec.encode(name, dict(attributes, REF=16), inventory, skills)
+
+def test_unknown_names(codec):
+    with pytest.raises(KeyError):
+        codec.encode(*character(items=('laser_sword',)))
+    with pytest.raises(KeyError):
+        codec.encode(*character(skills=('flying',)))
+
+def test_truncated_record(codec):
+    data = codec.encode(*character())
+    for cut in range(1, len(data)):
+        with pytest.raises(saves.SaveError):
+            codec.decode(data[:cut])
+
+def test_truncated_header(codec):
+    header = saves.file_header(codec)
+    with pytest.raises(saves.SaveError):
+        saves.read_header(header[:saves.HEADER.size - 1])
+    with pytest.raises(saves.SaveError):
+        saves.read_header(header[:-1])
+
+def test_not_a_save(codec):
+    with pytest.raises(saves.SaveError, match='not a save'):
+        saves.read_header(b'XXXX' + saves.file_header(codec)[4:])
+
+def test_newer_version(codec):
+    header = bytearray(saves.file_header(codec))
+    header[4] = saves.VERSION + 1
+    with pytest.raises(saves.SaveError, match='newer'):
+        saves.read_header(bytes(header))
+
+def test_json_round_trip():
+    stream = io.StringIO()
+    assert saves.export_json([character(), character('Crixus')], stream) == 2
+    lines = stream.getvalue().splitlines()
+    assert [saves.from_json(json.loads(line)) for line in lines] == [character(), character('Crixus')]
+
+@pytest.mark.parametrize('names', [b'{"attributes": []}', b'[1, 2, 3]', b'{"attributes": 5, "equipment": [], "skills": []}', b'"names"'])
+def test_header_not_names(names):
+    #Valid JSON, but not the name lists a save header holds.
+    with pytest.raises(saves.SaveError, match='damaged'):
+        saves.read_header(saves.HEADER.pack(saves.MAGIC, saves.VERSION, len(names)) + names)
@@ -0,0 +1,124 @@
+'''
+The chargen server (server.py): decoding what telnet clients send into keys, and backpressure from slow clients.  Run with:  python -m pytest
+'''
+
+import asyncio
+
+import pytest
+
+import chargen
+import display as dsp
+import replay
+import server
+
+def decode(*reads):
+    #The keys a session gets from reads arriving one after another, with any ESC still held at the end taken as the ESCAPE key (as after ESCAPE_DELAY).
+    decoder = server.KeyDecoder()
+    keys = [key for data in reads for key in decoder.feed(data)]
+    return keys + decoder.flush()
+
+def test_editing_keys():
+    keys = decode(b'\x7f\x08\x1b[3~')
+    assert [key.name for key in keys] == ['KEY_BACKSPACE', 'KEY_BACKSPACE', 'KEY_DELETE'] #no stray '[' to turn a description page
+
+@pytest.mark.parametrize('reads', [
+    (b'\x1b[', b'B'),
+    (b'\x1b', b'[', b'B'),
+    (b'\x1b[6', b'~'),
+])
+def test_sequence_split_across_reads(reads):
+    assert [key.name for key in decode(*reads)] == [server.KEY_SEQUENCES[b''.join(reads).decode()]]
+
+def test_enter_split_across_reads():
+    #CR LF (or CR NUL) is one ENTER, however the reads fall.
+    assert [key.name for key in decode(b'a\r', b'\nb')] == [None, 'KEY_ENTER', None]
+    assert [key.name for key in decode(b'\r', b'\x00', b'\r')] == ['KEY_ENTER', 'KEY_ENTER']
+    assert [key.name for key in decode(b'\r', b'x')] == ['KEY_ENTER', None]
+
+def test_telnet_commands():
+    #Negotiation is dropped wherever the reads split it; IAC IAC is a literal 255 (not valid UTF-8 alone, so it's dropped too).
+    will_echo, subnegotiation = bytes([server.IAC, 251, 1]), bytes([server.IAC, server.SB, 24, 0, server.IAC, server.SE])
+    assert [str(key) for key in decode(b'a' + will_echo + b'b')] == ['a', 'b']
+    assert [str(key) for key in decode(b'a' + will_echo[:1], will_echo[1:2], will_echo[2:] + b'b')] == ['a', 'b']
+    assert [str(key) for key in decode(b'a' + subnegotiation[:3], subnegotiation[3:] + b'b')] == ['a', 'b']
+    assert [str(key) for key in decode(bytes([server.IAC]), bytes([server.IAC]) + b'c')] == ['c']
+
+def test_lone_escape():
+    decoder = server.KeyDecoder()
+    assert decoder.feed(b'\x1b') == [] #might be the start of an arrow key
+    assert decoder.waiting
+    assert [key.name for key in decoder.flush()] == ['KEY_ESCAPE']
+    assert not decoder.waiting and decoder.flush() == []
+    #followed by something that can't continue a sequence, it's the ESCAPE key straight away
+    assert [(str(key), key.name) for key in decoder.feed(b'\x1bq')] == [('\x1b', 'KEY_ESCAPE'), ('q', None)]
+    assert [key.name for key in decoder.feed(b'\x1b\x1b')] == ['KEY_ESCAPE']
+    assert [key.name for key in decoder.flush()] == ['KEY_ESCAPE']
+
+def test_filter_editing_over_telnet():
+    #Type a filter on the equipment screen, edit it with BACKSPACE & DELETE, then cancel it with ESCAPE.  None of it reaches the description pages.
+    keys = decode(b'\t/sh', b'\x7f', b'ie\x08\x1b[3~', b'ld')
+    state = replay.play(keys)
+    equipment = state.screens[1]
+    assert equipment.filter.query == 'sld' and equipment.filter.typing
+    assert equipment.desc_page == 0
+    state = replay.play(keys + decode(b'\x1b'))
+    equipment = state.screens[1]
+    assert equipment.filter.query == '' and not equipment.filter.typing
+    assert len(equipment.view) == len(equipment.res_list)
+
+class StalledWriter:
+    #A client that stops reading: drain() waits until released.
+    def __init__(self):
+        self.released = asyncio.Event()
+        self.drains = 0
+
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        self.drains += 1
+        await self.released.wait()
+
+def test_stalled_client_is_dropped(monkeypatch):
+    monkeypatch.setattr(server, 'DRAIN_TIMEOUT', 0.05)
+    backend = server.StreamBackend(dsp.headless_terminal(), StalledWriter())
+    backend.write('frame')
+    with pytest.raises(ConnectionError):
+        asyncio.run(backend.drain())
+    assert backend.bytes_written == 5
+
+def test_frames_wait_for_drain():
+    #While a frame is still going out, inputs fold into the next one instead of queueing frames behind it.
+    state = chargen.ChargenState(chargen.build_screens())
+    renders = []
+
+    def render():
+        with dsp.use_screen(dsp.ScreenBuffer(dsp.NullBackend(), dsp.load_frame())):
+            state.render()
+        renders.append(state.screens[0].cursor)
+
+    async def session():
+        writer = StalledWriter()
+        backend = server.StreamBackend(dsp.headless_terminal(), writer)
+        keys = asyncio.Queue()
+        down, = decode(b'\x1b[B')
+        driving = asyncio.create_task(chargen.drive(state, keys, 0.01, render, backend.drain))
+        await asyncio.sleep(0.05)
+        writer.released.set()
+        writer.released.clear() #the first frame went; the next one stalls
+        await asyncio.sleep(0.05)
+        keys.put_nowait(down)
+        await asyncio.sleep(0.05)
+        for _ in range(2):
+            keys.put_nowait(down)
+        await asyncio.sleep(0.05)
+        stalled = list(renders)
+        writer.released.set()
+        await asyncio.sleep(0.05)
+        keys.put_nowait(None)
+        await driving
+        return stalled, writer.drains
+
+    stalled, drains = asyncio.run(session())
+    assert stalled == [0, 1] #the second frame is stuck going out, so the next two keys wait
+    assert renders == [0, 1, 3] and drains == 3
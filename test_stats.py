@@ -0,0 +1,78 @@
+'''
+Derived-stat tables (stats.py).  Run with:  python -m pytest
+'''
+
+import itertools
+import random
+
+import resources as rs
+import stats as st
+
+def by_formula(attributes, inventory, skills):
+    #The derived stats worked out from the rules directly, with no tables.
+    entries = [rs.catalog('equipment').get(name) for name in inventory] + [rs.catalog('skills').get(name) for name in skills]
+    mods = {m:sum(entry.get(m, 0) for entry in entries) for m in rs.COMBAT_MODIFIERS}
+    weapons = [rs.catalog('equipment').get(name) for name in inventory if rs.catalog('equipment').get(name).get('category') == st.WEAPON_CATEGORY]
+    damage = max([w.get('damage', 0) for w in weapons] + [st.UNARMED_DAMAGE]) + mods['damage'] - sum(w.get('damage', 0) for w in weapons)
+    stats = {
+        'health': st.BASE_HEALTH + st.HEALTH_PER_FOR * attributes['FOR'],
+        'accuracy': attributes['REF'] + mods['hit'],
+        'evasion': attributes['REF'] + mods['dodge'],
+        'wit': attributes['WIT'],
+        'damage': damage,
+        'armor': mods['armor'],
+        'resistance': attributes['FOR'] + mods['pain'],
+        'favor': attributes['MOX'] + mods['favor'],
+    }
+    stats['stagger'] = st.stagger_chance(stats['resistance'])
+    stats['hit'] = st.hit_chance(stats['accuracy'] - stats['evasion'], 0)
+    return stats
+
+def test_every_attribute_vector():
+    tables = st.tables()
+    for values in itertools.product(range(st.ATTRIBUTE_MIN, st.ATTRIBUTE_MAX + 1), repeat=len(st.ATTRIBUTES)):
+        attributes = dict(zip(st.ATTRIBUTES, values))
+        assert tables.derive(attributes) == by_formula(attributes, (), ())
+
+def test_loadouts():
+    tables = st.tables()
+    rng = random.Random(1)
+    equipment, skills = [e['name'] for e in rs.equipment_read_only], [s['name'] for s in rs.skills_read_only]
+    for _ in range(300):
+        attributes = {a:rng.randint(st.ATTRIBUTE_MIN, st.ATTRIBUTE_MAX) for a in st.ATTRIBUTES}
+        inventory = rng.sample(equipment, rng.randint(0, len(equipment)))
+        learned = rng.sample(skills, rng.randint(0, 3))
+        assert tables.derive(attributes, inventory, learned) == by_formula(attributes, inventory, learned)
+
+def test_tables_follow_the_catalogs(monkeypatch):
+    #The same tables until a catalog's signature changes.
+    first = st.tables()
+    assert st.tables() is first
+    equipment = rs.catalog('equipment')
+    monkeypatch.setattr(equipment, 'signature', 'edited')
+    rebuilt = st.tables()
+    assert rebuilt is not first and rebuilt.signature == st.catalog_signature()
+
+def test_preview_follows_random_edits():
+    tables = st.tables()
+    rng = random.Random(3)
+    equipment, skills = [e['name'] for e in rs.equipment_read_only], [s['name'] for s in rs.skills_read_only]
+    attributes = {a:st.ATTRIBUTE_MIN for a in st.ATTRIBUTES}
+    inventory, learned = set(), set()
+    preview = st.Preview(attributes, stat_tables=tables)
+    before = dict(preview.stats())
+    for _ in range(2000):
+        kind = rng.randrange(3)
+        if kind == 0:
+            name, value = rng.choice(st.ATTRIBUTES), rng.randint(st.ATTRIBUTE_MIN, st.ATTRIBUTE_MAX)
+            attributes[name] = value
+            preview.set_attribute(name, value)
+        else:
+            names, chosen, setter = (equipment, inventory, preview.set_item) if kind == 1 else (skills, learned, preview.set_skill)
+            name, selected = rng.choice(names), rng.random() < 0.5
+            (chosen.add if selected else chosen.discard)(name)
+            setter(name, selected)
+        expected = tables.derive(attributes, inventory, learned)
+        assert preview.stats() == expected
+        assert preview.changed == {stat for stat in expected if expected[stat] != before[stat]}
+        before = dict(expected)
@@ -0,0 +1,46 @@
+'''
+The tournament simulator (tournament.py): results depend on the seed alone, not on how the work is spread over processes.  Run with:  python -m pytest
+'''
+
+import numpy as np
+import pytest
+
+import builds
+import tournament
+
+@pytest.fixture(scope='module')
+def field():
+    return list(builds.sample_builds(12, 4))
+
+def same(a, b):
+    return all(np.array_equal(getattr(a, name), getattr(b, name)) for name in tournament.Standings.FIELDS)
+
+@pytest.mark.parametrize('run, kwargs', [
+    (tournament.round_robin, {'games':6, 'batch_size':50}),
+    (tournament.bracket, {'runs':40, 'batch_size':7}),
+])
+def test_same_seed_any_workers(field, run, kwargs):
+    results = [run(field, seed=11, workers=workers, **kwargs) for workers in (1, 2, 3)]
+    assert same(results[0], results[1]) and same(results[0], results[2])
+    assert not same(results[0], run(field, seed=12, workers=1, **kwargs))
+
+def test_round_robin_totals(field):
+    games = 4
+    standings = tournament.round_robin(field, games=games, seed=0, workers=1, batch_size=33)
+    assert (standings.games == games * (len(field) - 1)).all()
+    assert standings.wins.sum() == games * len(field) * (len(field) - 1) // 2 #one winner per duel
+    assert standings.titles.sum() == 0
+
+def test_bracket_totals(field):
+    runs = 25
+    standings = tournament.bracket(field, runs=runs, seed=0, workers=1, batch_size=10)
+    assert standings.titles.sum() == runs
+    #12 builds in a 16-slot bracket: 4 byes, so 11 duels per bracket however they're drawn
+    assert standings.wins.sum() == runs * (len(field) - 1)
+    assert standings.games.sum() == 2 * runs * (len(field) - 1)
+
+def test_table_order(field):
+    standings = tournament.round_robin(field, games=2, seed=1, workers=1)
+    rates = [row[2] for row in standings.table()]
+    assert rates == sorted(rates, reverse=True)
+    assert len(standings.table(top=3)) == 3
@@ -0,0 +1,93 @@
+'''
+Keypress tracing (tracing.py): span nesting, the ring buffer & the dumps.  Run with:  python -m pytest
+'''
+
+import io
+import json
+
+import pytest
+
+import tracing
+
+@pytest.fixture
+def clock(monkeypatch):
+    #Tracing on, with no counters but the test's own and a clock that only moves when told to.
+    now = [0]
+    monkeypatch.setattr(tracing, 'perf_counter_ns', lambda: now[0])
+    monkeypatch.setattr(tracing, 'COUNTERS', {})
+    tracing.enable()
+    yield now
+    tracing.disable()
+    tracing.enable(0) #leave nothing recorded behind for other tests
+    tracing.disable()
+
+def frame(now):
+    #render (10) > layout (3) & write (4): render's self time is what its children didn't take
+    with tracing.span('render'):
+        now[0] += 1
+        with tracing.span('layout'):
+            now[0] += 3
+        with tracing.span('write') as write:
+            write.set('bytes', 120)
+            now[0] += 4
+        now[0] += 2
+
+def test_nesting(clock):
+    frame(clock)
+    assert [(s['path'], s['duration_ns'], s['self_ns']) for s in tracing.spans()] == [
+        ('render;layout', 3, 3), ('render;write', 4, 4), ('render', 10, 3)]
+    assert tracing.spans()[1]['bytes'] == 120
+    assert tracing.STACK == []
+
+def test_traced_and_counters(clock):
+    total = [0]
+    tracing.counter('bytes_written', lambda: total[0])
+
+    @tracing.traced('decode')
+    def decode(data):
+        total[0] += len(data)
+        return data.upper()
+
+    with tracing.span('session'):
+        assert decode('abc') == 'ABC'
+    with tracing.span('idle'):
+        pass
+    records = tracing.spans()
+    assert [s['path'] for s in records] == ['session;decode', 'session', 'idle']
+    assert records[0]['bytes_written'] == records[1]['bytes_written'] == 3
+    assert 'bytes_written' not in records[2] #unchanged counters aren't recorded
+
+def test_disabled(clock):
+    tracing.disable()
+    assert tracing.span('render') is tracing.NULL_SPAN
+    frame(clock)
+    assert tracing.spans() == []
+
+def test_ring_keeps_the_latest(clock):
+    tracing.enable(size=5)
+    for i in range(12):
+        with tracing.span(f'key{i}'):
+            clock[0] += 1
+    assert [s['path'] for s in tracing.spans()] == [f'key{i}' for i in range(7, 12)]
+
+def test_dumps(clock):
+    for _ in range(3):
+        frame(clock)
+    clock[0] += 5000
+    with tracing.span('render'):
+        clock[0] += 2000 #a slow frame, to show up in microseconds
+    assert tracing.fold() == {'render': 3 * 3 + 2000, 'render;layout': 9, 'render;write': 12}
+    out = io.StringIO()
+    assert tracing.dump_folded(out) == 3
+    assert out.getvalue() == 'render 2\nrender;layout 0\nrender;write 0\n'
+    out = io.StringIO()
+    assert tracing.dump_jsonl(out) == 10
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == tracing.spans()
+    assert tracing.summary()['render'] == (4, 3 * 10 + 2000, (3 * 10 + 2000) // 4)
+
+def test_dump_by_extension(clock, tmp_path):
+    frame(clock)
+    assert tracing.dump(str(tmp_path / 'trace.folded')) == 3
+    assert (tmp_path / 'trace.folded').read_text().splitlines()[0] == 'render 0'
+    assert tracing.dump(str(tmp_path / 'trace.jsonl')) == 3
+    assert json.loads((tmp_path / 'trace.jsonl').read_text().splitlines()[-1])['path'] == 'render'
@@ -0,0 +1,213 @@
+'''
+           TOURNAMENT.PY
+=====================================
+Monte Carlo tournaments between builds.  A field of builds (the chargen.cast_values shape) is fought either as a round-robin (every pair meets `games` times) or as single-elimination brackets (re-drawn & re-fought `runs` times), and the per-build results are merged into win rates.
+
+The work is cut into fixed batches which are fanned out over a process pool.  Every batch gets its own RNG stream, spawned from one master seed (numpy SeedSequence), so:
+    the same seed gives the same results, however many workers there are & whatever order batches finish in;
+    batches share nothing but the field, which each worker encodes once at startup, so throughput scales with cores.
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] RESULTS
+    [2] WORKERS: run in the pool processes
+    [3] TOURNAMENTS
+    [4] MAIN
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import combat
+
+ROUND_ROBIN_BATCH = 20000  #duels per batch
+BRACKET_BATCH = 500        #brackets per batch
+
+
+###############################################################################
+#[1] RESULTS
+
+class Standings:
+    '''
+    Per-build totals over a tournament, arrays indexed like the field:
+        games, wins: duels fought & won
+        rounds: rounds fought, summed over duels
+        favor: crowd favor earned, summed over duels
+        titles: brackets won (bracket tournaments only)
+    Standings from separate batches are added together with merge().
+    '''
+    FIELDS = ('games', 'wins', 'rounds', 'favor', 'titles')
+
+    def __init__(self, size):
+        for field in self.FIELDS:
+            setattr(self, field, np.zeros(size, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.games)
+
+    def record(self, a, b, result):
+        #Adds one resolve_duels() result, for duels between field indexes a[i] & b[i].
+        size = len(self)
+        winners = np.where(result['winner'] == 0, a, b)
+        for side, index in enumerate([a, b]):
+            self.games += np.bincount(index, minlength=size)
+            self.rounds += np.bincount(index, weights=result['rounds'], minlength=size).astype(np.int64)
+            self.favor += np.bincount(index, weights=result['favor'][:, side], minlength=size).astype(np.int64)
+        self.wins += np.bincount(winners, minlength=size)
+        return winners
+
+    def merge(self, other):
+        for field in self.FIELDS:
+            getattr(self, field).__iadd__(getattr(other, field))
+        return self
+
+    def win_rate(self):
+        return self.wins / np.maximum(self.games, 1)
+
+    def table(self, names=None, top=None):
+        '''
+        Rows of (name, games, win rate, mean rounds, mean favor, titles), best win rate first.
+        '''
+        games = np.maximum(self.games, 1)
+        order = np.argsort(-self.win_rate(), kind='stable')[:top]
+        names = names if names is not None else [str(i) for i in range(len(self))]
+        return [(names[i], int(self.games[i]), float(self.wins[i] / games[i]),
+                 float(self.rounds[i] / games[i]), float(self.favor[i] / games[i]), int(self.titles[i]))
+                for i in order]
+
+
+###############################################################################
+#[2] WORKERS
+
+FIELD = None #the encoded field, set once per worker process by _init_worker
+
+def _init_worker(builds):
+    global FIELD
+    FIELD = combat.encode_fighters(builds)
+
+def _round_robin_batch(pairs, seed):
+    '''
+    Fights every (a, b) row of pairs once, with the batch's own RNG stream.
+    '''
+    rng = np.random.default_rng(seed)
+    a, b = pairs[:, 0], pairs[:, 1]
+    standings = Standings(len(FIELD))
+    standings.record(a, b, combat.resolve_duels(FIELD.take(a), FIELD.take(b), rng))
+    return standings
+
+def _bracket_batch(runs, seed):
+    '''
+    Draws & fights `runs` single-elimination brackets.  All brackets in the batch play each round together, as one resolve_duels() call.
+    The field is padded to a power of two with byes (-1); a build drawn against a bye goes through without a duel.
+    '''
+    rng = np.random.default_rng(seed)
+    size = len(FIELD)
+    slots = 1 << max(size - 1, 0).bit_length()
+    standings = Standings(size)
+
+    entrants = np.full((runs, slots), -1, dtype=np.int64)
+    entrants[:, :size] = np.arange(size)
+    entrants = rng.permuted(entrants, axis=1) #a fresh draw per bracket; byes land anywhere in it
+
+    while entrants.shape[1] > 1:
+        a, b = entrants[:, 0::2], entrants[:, 1::2]
+        winners = np.where(a < 0, b, a) #byes
+        fought = (a >= 0) & (b >= 0)
+        if fought.any():
+            winners[fought] = standings.record(a[fought], b[fought], combat.resolve_duels(
+                FIELD.take(a[fought]), FIELD.take(b[fought]), rng))
+        entrants = winners
+
+    standings.titles += np.bincount(entrants[:, 0], minlength=size)
+    return standings
+
+
+###############################################################################
+#[3] TOURNAMENTS
+
+def _run_batches(builds, func, batches, workers):
+    '''
+    Runs func(work, seed) for each batch's work over a pool of `workers` processes (1 = in this process) and merges the Standings.
+    '''
+    builds = list(builds)
+    standings = Standings(len(builds))
+    if workers == 1:
+        _init_worker(builds)
+        for work, seed in batches:
+            standings.merge(func(work, seed))
+        return standings
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(builds,)) as pool:
+        for result in pool.map(func, *zip(*batches)):
+            standings.merge(result)
+    return standings
+
+def _seeds(seed, count):
+    #One independent child stream per batch, all derived from the master seed.
+    return np.random.SeedSequence(seed).spawn(count)
+
+def round_robin(builds, games=10, seed=0, workers=None, batch_size=ROUND_ROBIN_BATCH):
+    '''
+    Every build fights every other build `games` times (sides alternating).  Returns Standings.
+        seed: master seed; the results depend only on it, the field & batch_size, never on workers
+        workers: pool size (default: every core)
+    '''
+    builds = list(builds)
+    a, b = np.triu_indices(len(builds), k=1)
+    pairs = np.tile(np.stack([a, b], axis=1), (games, 1, 1))
+    pairs[1::2] = pairs[1::2, :, ::-1] #every other game the sides swap, so being fighter A isn't an edge
+    pairs = pairs.reshape(-1, 2)
+    chunks = [pairs[i:i+batch_size] for i in range(0, len(pairs), batch_size)]
+    return _run_batches(builds, _round_robin_batch, list(zip(chunks, _seeds(seed, len(chunks)))), workers or os.cpu_count())
+
+def bracket(builds, runs=1000, seed=0, workers=None, batch_size=BRACKET_BATCH):
+    '''
+    Draws & fights `runs` single-elimination brackets over the field.  Returns Standings, with titles counting bracket wins.
+    Arguments as round_robin().
+    '''
+    counts = [min(batch_size, runs - i) for i in range(0, runs, batch_size)]
+    return _run_batches(builds, _bracket_batch, list(zip(counts, _seeds(seed, len(counts)))), workers or os.cpu_count())
+
+TOURNAMENTS = {'round-robin': round_robin, 'bracket': bracket}
+
+
+###############################################################################
+#[4] MAIN
+
+def describe(build):
+    #One-line summary of a build for the standings table.
+    att, inventory, skills = build
+    return ' '.join([''.join(f'{v}' for v in att.values()), ','.join(inventory) or '-', ','.join(skills) or '-'])
+
+if __name__ == '__main__':
+    import time
+    import builds as bd
+
+    parser = argparse.ArgumentParser(description='Fight a random field of builds against each other.')
+    parser.add_argument('format', choices=TOURNAMENTS, nargs='?', default='round-robin')
+    parser.add_argument('--field', type=int, default=64, help='number of builds, drawn uniformly from the build space')
+    parser.add_argument('--games', type=int, default=10, help='round-robin: games per pair')
+    parser.add_argument('--runs', type=int, default=1000, help='bracket: brackets fought')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    field = list(bd.sample_builds(args.field, args.seed))
+    start = time.perf_counter()
+    if args.format == 'bracket':
+        standings = bracket(field, args.runs, args.seed, args.workers)
+    else:
+        standings = round_robin(field, args.games, args.seed, args.workers)
+    elapsed = time.perf_counter() - start
+
+    duels = int(standings.games.sum()) // 2
+    print(f'{duels:,} duels in {elapsed:.2f}s ({duels / elapsed:,.0f}/sec)\n')
+    print(f'{"BUILD":<60}{"GAMES":>8}{"WIN%":>8}{"ROUNDS":>8}{"FAVOR":>8}{"TITLES":>8}')
+    for name, games, rate, rounds, favor, titles in standings.table([describe(b) for b in field], args.top):
+        print(f'{name[:59]:<60}{games:>8}{rate:>8.1%}{rounds:>8.1f}{favor:>8.1f}{titles:>8}')
@@ -0,0 +1,168 @@
+'''
+           TRACING.PY
+=====================================
+Opt-in timing of each stage of a keypress: reading the key, the screen logic, layout, the tab header and the terminal write.  Off by default; switched on with enable(), or for a whole chargen session with the GLADIATOR_TRACE environment variable:
+    GLADIATOR_TRACE=trace.jsonl python main.py             #spans as JSON lines
+    GLADIATOR_TRACE=trace.folded python main.py            #folded stacks, for flamegraph.pl / speedscope
+    python replay.py play bug.rec --trace trace.folded     #the same, for a recorded session
+
+A span is one timed stage.  Spans nest (render > layout), and each records:
+    path: the names of the spans it is inside, and its own, joined by ';'
+    start & duration (ns, perf_counter), and its self time (duration less its child spans)
+    fields: the change in every registered counter over the span (display.py registers bytes written & layout cache hits/misses), plus anything set() on it
+Finished spans go into a ring buffer (a deque with maxlen), so tracing a long session keeps only the most recent RING_SIZE spans, in constant memory.
+
+Disabled, span() returns a shared do-nothing span and traced() functions make one extra call and a flag check, so the instrumentation can stay in the hot paths.
+
+TABLE OF CONTENTS
+    [0] IMPORTS & INITIALIZATIONS
+    [1] SPANS
+    [2] DUMPS
+'''
+
+###############################################################################
+#[0] IMPORTS & INITIALIZATIONS
+
+import json
+from collections import deque
+from functools import wraps
+from time import perf_counter_ns
+
+RING_SIZE = 100000
+
+ENABLED = False
+RING = deque(maxlen=RING_SIZE)  #finished spans: (path, start ns, duration ns, self ns, fields)
+STACK = []                      #open spans, innermost last
+COUNTERS = {}                   #name: zero-arg callable returning a running total
+
+
+###############################################################################
+#[1] SPANS
+
+class Span:
+    __slots__ = ('name', 'fields', 'start', 'children', 'before')
+    def __init__(self, name):
+        self.name = name
+        self.fields = {}
+
+    def __enter__(self):
+        STACK.append(self)
+        self.children = 0
+        self.before = [read() for read in COUNTERS.values()]
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        duration = perf_counter_ns() - self.start
+        path = ';'.join(span.name for span in STACK)
+        STACK.pop()
+        if STACK:
+            STACK[-1].children += duration
+        for (name, read), before in zip(COUNTERS.items(), self.before):
+            change = read() - before
+            if change:
+                self.fields[name] = change
+        RING.append((path, self.start, duration, duration - self.children, self.fields))
+
+    def set(self, key, value):
+        self.fields[key] = value
+
+class NullSpan:
+    #What span() returns while tracing is off.
+    __slots__ = ()
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def set(self, key, value):
+        pass
+
+NULL_SPAN = NullSpan()
+
+def span(name):
+    '''
+    A span to time a block:
+        with tracing.span('inkey'):
+            inp = term.inkey(timeout=0)
+    '''
+    if not ENABLED:
+        return NULL_SPAN
+    return Span(name)
+
+def traced(name):
+    #Decorator: every call of the function is a span.
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def counter(name, read):
+    '''
+    Registers a running total (e.g. bytes written so far) to record per span: each span gets the change over its duration, when nonzero.  Only read while tracing is on.
+    '''
+    COUNTERS[name] = read
+
+def enable(size=RING_SIZE):
+    #Starts tracing into a fresh ring buffer of `size` spans.
+    global ENABLED, RING
+    RING = deque(maxlen=size)
+    STACK.clear()
+    ENABLED = True
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+def spans():
+    #The recorded spans, oldest first, as dicts.
+    return [{'path': path, 'start_ns': start, 'duration_ns': duration, 'self_ns': own, **fields}
+            for path, start, duration, own, fields in RING]
+
+
+###############################################################################
+#[2] DUMPS
+
+def dump_jsonl(stream):
+    #One JSON object per span.  Returns how many were written.
+    count = 0
+    for count, record in enumerate(spans(), 1):
+        stream.write(json.dumps(record) + '\n')
+    return count
+
+def fold():
+    #{path: total self time in ns}: the spans' self times summed per stack.
+    folded = {}
+    for path, start, duration, own, fields in RING:
+        folded[path] = folded.get(path, 0) + own
+    return folded
+
+def dump_folded(stream):
+    '''
+    Folded stacks ('render;layout 1234', self time in microseconds), the input format of flamegraph.pl and speedscope.  Returns how many stacks were written.
+    '''
+    folded = fold()
+    for path, own in sorted(folded.items()):
+        stream.write(f'{path} {own // 1000}\n')
+    return len(folded)
+
+def dump(path):
+    #Writes the spans to path: folded stacks if it ends in .folded, else JSON lines.
+    with open(path, 'w') as f:
+        if path.endswith('.folded'):
+            return dump_folded(f)
+        return dump_jsonl(f)
+
+def summary():
+    #{path: (count, total ns, mean ns)} per stack, for a quick look without a flame graph.
+    totals = {}
+    for path, start, duration, own, fields in RING:
+        count, total = totals.get(path, (0, 0))
+        totals[path] = (count + 1, total + duration)
+    return {path: (count, total, total // count) for path, (count, total) in totals.items()}